@@ -34,6 +34,11 @@ spec_dir = os.path.dirname(spec_path)
 project_root = os.path.abspath(os.path.join(spec_dir, '..'))
 script_path = os.path.join(project_root, 'main.py')
 
+# Compile the Yobase index (libs/yobase/yobase.idx) so the build ships it prebuilt
+sys.path.insert(0, os.path.join(project_root, 'libs'))
+import yobase_index
+yobase_index.build_index()
+print(f"[OK] Yobase index: {yobase_index.INDEX_PATH}")
 
 added_files = [
     (os.path.join(project_root, 'xray.exe'), '.'),
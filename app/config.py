@@ -43,6 +43,8 @@ class AppConfig:
     gemini_api_key: str
     gemini_enabled: bool  # Использовать Gemini для ё-фикации
     thinking_mode: bool   # Включить режим размышления (Gemini 2.5)
+    gemini_timeout: int   # Бюджет времени Gemini-стадии на один текст/набор реплик (с)
+    gemini_stream: bool   # Потоковый режим Gemini для текста (синтез начинается до конца ответа)
     base_path: Path = None # Путь к папке приложения
 
     @classmethod
@@ -84,6 +86,8 @@ class AppConfig:
         gemini_api_key = os.getenv("GEMINI_API_KEY", "")
         gemini_enabled = True  # По умолчанию включён
         thinking_mode = False  # По умолчанию выключен
+        gemini_timeout = _clamp(int(os.getenv("GEMINI_TIMEOUT", "180")), 10, 1800)
+        gemini_stream = os.getenv("GEMINI_STREAM", "false").lower() in {"1", "true", "yes"}
 
         # 2. Override from edge_tts_settings.json if it exists
         try:
@@ -125,6 +129,14 @@ class AppConfig:
                     if "thinking_mode" in data:
                         thinking_mode = bool(data["thinking_mode"])
 
+                    # Override Gemini time budget (hidden setting)
+                    if "gemini_timeout" in data:
+                        gemini_timeout = _clamp(int(data["gemini_timeout"]), 10, 1800)
+
+                    # Override Gemini streaming mode (hidden setting)
+                    if "gemini_stream" in data:
+                        gemini_stream = bool(data["gemini_stream"])
+
         except Exception:
             # If JSON loading fails, just stick to env defaults
             pass
@@ -143,6 +155,8 @@ class AppConfig:
             gemini_api_key=gemini_api_key,
             gemini_enabled=gemini_enabled,
             thinking_mode=thinking_mode,
+            gemini_timeout=gemini_timeout,
+            gemini_stream=gemini_stream,
             base_path=base_path,
         )
 
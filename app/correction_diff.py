@@ -0,0 +1,146 @@
+"""Выравнивание исходного и исправленного Gemini текста по словам.
+
+Слова сравниваются без учёта регистра и «ё», тег <phoneme> считается
+одним словом (словом внутри тега), поэтому исправления Gemini не
+нарушают выравнивание, а вставленное или пропущенное слово не сдвигает
+сравнение остальных. Общие начало и конец отрезаются за линейное время,
+оставшаяся середина выравнивается алгоритмом Майерса (O(ND)).
+
+Сравнение со старым попарным zip-сравнением:
+    python benchmarks/bench_correction_diff.py [число_слов]
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.homograph_memory import tokenize, word_key
+
+logger = logging.getLogger(__name__)
+
+# Предел числа вставок и удалений в середине текста: при большем расхождении
+# (ответ Gemini не соответствует тексту) середина не выравнивается
+MAX_EDIT_DISTANCE = 2000
+
+
+@dataclass
+class TokenEdit:
+    """Исправление одного слова."""
+    type: str               # 'yo' или 'ipa'
+    original: str           # слово в исходном тексте
+    corrected: str          # слово в исправленном тексте (для 'ipa' — слово внутри тега)
+    start: int              # позиция слова в исходном тексте
+    end: int
+    corrected_start: int    # позиция слова (или тега) в исправленном тексте
+    corrected_end: int
+    ipa: Optional[str] = None
+
+
+def _myers(a: Sequence[str], b: Sequence[str], max_distance: int) -> Optional[List[Tuple[int, int]]]:
+    """Совпавшие пары индексов (i, j) кратчайшего редакционного пути или None, если путь длиннее max_distance."""
+    n, m = len(a), len(b)
+    v: Dict[int, int] = {1: 0}
+    trace: List[Dict[int, int]] = []
+    for d in range(max_distance + 1):
+        current: Dict[int, int] = {}
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            current[k] = x
+            if x >= n and y >= m:
+                trace.append(current)
+                return _backtrack(trace, a, b)
+        trace.append(current)
+        v = current
+    return None
+
+
+def _backtrack(trace: List[Dict[int, int]], a: Sequence[str], b: Sequence[str]) -> List[Tuple[int, int]]:
+    x, y = len(a), len(b)
+    pairs: List[Tuple[int, int]] = []
+    for d in range(len(trace) - 1, 0, -1):
+        v = trace[d - 1]
+        k = x - y
+        if k == -d or (k != d and v[k - 1] < v[k + 1]):
+            previous_k = k + 1
+        else:
+            previous_k = k - 1
+        previous_x = v[previous_k]
+        previous_y = previous_x - previous_k
+        while x > previous_x and y > previous_y:
+            x -= 1
+            y -= 1
+            pairs.append((x, y))
+        x, y = previous_x, previous_y
+    while x > 0 and y > 0:
+        x -= 1
+        y -= 1
+        pairs.append((x, y))
+    pairs.reverse()
+    return pairs
+
+
+def align_words(a: Sequence[str], b: Sequence[str], max_distance: int = MAX_EDIT_DISTANCE) -> List[Tuple[int, int]]:
+    """Совпадающие слова двух последовательностей: пары индексов по возрастанию.
+
+    Args:
+        a: Ключи слов исходного текста
+        b: Ключи слов исправленного текста
+        max_distance: Предел числа вставок и удалений
+
+    Returns:
+        List[Tuple[int, int]]: Пары (i, j) с a[i] == b[j]; при расхождении
+        больше max_distance — только общие начало и конец
+    """
+    n, m = len(a), len(b)
+    prefix = 0
+    while prefix < n and prefix < m and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < n - prefix and suffix < m - prefix and a[n - 1 - suffix] == b[m - 1 - suffix]:
+        suffix += 1
+
+    pairs = [(i, i) for i in range(prefix)]
+    middle = _myers(a[prefix:n - suffix], b[prefix:m - suffix], max_distance)
+    if middle is None:
+        logger.debug(f"Тексты расходятся больше чем на {max_distance} слов: середина не выровнена")
+    else:
+        pairs.extend((prefix + i, prefix + j) for i, j in middle)
+    pairs.extend((n - suffix + i, m - suffix + i) for i in range(suffix))
+    return pairs
+
+
+def diff_corrections(original: str, corrected: str) -> List[TokenEdit]:
+    """Исправления «ё» и IPA в ответе Gemini с позициями слов.
+
+    Args:
+        original: Текст, отправленный в Gemini
+        corrected: Ответ Gemini
+
+    Returns:
+        List[TokenEdit]: Исправления в порядке следования (слова, которые Gemini
+        вставил, удалил или переписал иначе, не учитываются)
+    """
+    if original == corrected:
+        return []
+    before, after = tokenize(original), tokenize(corrected)
+    keys_before = [word_key(token[2]) for token in before]
+    keys_after = [word_key(token[2]) for token in after]
+
+    edits: List[TokenEdit] = []
+    for i, j in align_words(keys_before, keys_after):
+        start, end, word, ipa = before[i]
+        corrected_start, corrected_end, new_word, new_ipa = after[j]
+        if new_ipa is not None and new_ipa != ipa:
+            edits.append(TokenEdit('ipa', word, new_word, start, end, corrected_start, corrected_end, new_ipa))
+        elif new_ipa is None and ipa is None and new_word.lower().count('ё') > word.lower().count('ё'):
+            edits.append(TokenEdit('yo', word, new_word, start, end, corrected_start, corrected_end))
+    return edits
@@ -5,6 +5,9 @@ Supports two types of replacements:
 2. Wildcard: "Конечн*=Конечън*" (matches "Конечная", "Конечной", etc.)
 
 Priority: Exact matches are applied first, then wildcard patterns.
+
+All entries are compiled into one character trie, so the text is scanned once
+regardless of the dictionary size.
 """
 
 import re
@@ -12,8 +15,27 @@ import logging
 from pathlib import Path
 from typing import Dict, Optional, Tuple, List
 
+from app.file_watch import WatchedFile
+
 logger = logging.getLogger(__name__)
 
+# Trie node key holding the entry stored at that node
+_TERMINAL = ''
+
+# Zero-width match at every word boundary (same semantics as \b in the patterns)
+_BOUNDARY_RE = re.compile(r'\b')
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+def _is_boundary(text: str, pos: int) -> bool:
+    """Equivalent of regex \b at position `pos`."""
+    before = pos > 0 and _is_word_char(text[pos - 1])
+    after = pos < len(text) and _is_word_char(text[pos])
+    return before != after
+
 
 class CustomDictionary:
     """Manages custom word replacements for TTS pronunciation fixes."""
@@ -29,13 +51,19 @@ class CustomDictionary:
         
         # Exact matches (no wildcards)
         self.exact_replacements: Dict[str, str] = {}
-        self._exact_patterns: Dict[str, re.Pattern] = {}
         
         # Wildcard matches (contain *)
         self.wildcard_replacements: List[Tuple[str, str, re.Pattern]] = []
         
-        if self.dictionary_path and self.dictionary_path.exists():
-            self.load()
+        # Compiled tries (exact sources, wildcard prefixes) with the wildcard list
+        # they index into; swapped as one object, rebuilt lazily after edits
+        self._matcher: Optional[Tuple[dict, dict, list]] = None
+        
+        # Incremented on every content change; caches can key on it
+        self.version = 0
+        
+        self._watch = WatchedFile(dictionary_path) if dictionary_path else None
+        self.refresh()
     
     @property
     def replacements(self) -> Dict[str, str]:
@@ -45,6 +73,31 @@ class CustomDictionary:
             result[source] = target
         return result
     
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reload the dictionary if its file content changed since the last check.
+        
+        The file is polled by mtime/size (at most once per second) and re-parsed
+        only when its content hash differs. A deleted file empties the dictionary.
+        
+        Args:
+            force: Check the file now, ignoring the poll interval
+        
+        Returns:
+            True if the dictionary was reloaded
+        """
+        if self._watch is None or not self._watch.check(force=force):
+            return False
+        if self.dictionary_path.exists():
+            self.load()
+        elif self._matcher is not None or self.exact_replacements or self.wildcard_replacements:
+            self.exact_replacements = {}
+            self.wildcard_replacements = []
+            self._matcher = self._build_matcher({}, [])
+            self.version += 1
+            logger.info(f"Dictionary file removed, replacements cleared: {self.dictionary_path}")
+        return True
+    
     def load(self) -> None:
         """Load dictionary from file."""
         if not self.dictionary_path or not self.dictionary_path.exists():
@@ -55,9 +108,10 @@ class CustomDictionary:
             with open(self.dictionary_path, 'r', encoding='utf-8') as f:
                 lines = f.readlines()
             
-            self.exact_replacements.clear()
-            self._exact_patterns.clear()
-            self.wildcard_replacements.clear()
+            # Parse into new containers and swap them in at the end, so that
+            # a concurrent apply_replacements sees either the old or the new dictionary
+            exact_replacements: Dict[str, str] = {}
+            wildcard_replacements: List[Tuple[str, str, re.Pattern]] = []
             
             for line_num, line in enumerate(lines, start=1):
                 line = line.strip()
@@ -83,9 +137,17 @@ class CustomDictionary:
                 
                 # Check if this is a wildcard pattern
                 if '*' in source_word:
-                    self._add_wildcard_replacement(source_word, target_word)
+                    wildcard_replacements.append(
+                        (source_word, target_word, self._compile_wildcard(source_word))
+                    )
                 else:
-                    self._add_exact_replacement(source_word, target_word)
+                    exact_replacements[source_word] = target_word
+            
+            matcher = self._build_matcher(exact_replacements, wildcard_replacements)
+            self.exact_replacements = exact_replacements
+            self.wildcard_replacements = wildcard_replacements
+            self._matcher = matcher
+            self.version += 1
             
             total = len(self.exact_replacements) + len(self.wildcard_replacements)
             logger.info(f"Loaded {total} replacements ({len(self.exact_replacements)} exact, {len(self.wildcard_replacements)} wildcard) from {self.dictionary_path}")
@@ -96,16 +158,12 @@ class CustomDictionary:
     def _add_exact_replacement(self, source_word: str, target_word: str) -> None:
         """Add an exact match replacement."""
         self.exact_replacements[source_word] = target_word
-        
-        # Compile regex pattern for case-insensitive whole-word matching
-        pattern = re.compile(
-            r'\b' + re.escape(source_word) + r'\b',
-            flags=re.IGNORECASE
-        )
-        self._exact_patterns[source_word] = pattern
+        self._matcher = None
+        self.version += 1
     
-    def _add_wildcard_replacement(self, source_word: str, target_word: str) -> None:
-        """Add a wildcard replacement."""
+    @staticmethod
+    def _compile_wildcard(source_word: str) -> re.Pattern:
+        """Compile a wildcard source into a regex."""
         # Convert wildcard to regex
         # "Конечн*" -> r"\b(Конечн.*?)\b"
         # We need to capture the matched part to preserve case
@@ -114,8 +172,84 @@ class CustomDictionary:
         escaped = re.escape(source_word).replace(r'\*', '(.*?)')
         pattern_str = r'\b' + escaped + r'\b'
         
-        pattern = re.compile(pattern_str, flags=re.IGNORECASE)
+        return re.compile(pattern_str, flags=re.IGNORECASE)
+    
+    def _add_wildcard_replacement(self, source_word: str, target_word: str) -> None:
+        """Add a wildcard replacement."""
+        pattern = self._compile_wildcard(source_word)
         self.wildcard_replacements.append((source_word, target_word, pattern))
+        self._matcher = None
+        self.version += 1
+    
+    @staticmethod
+    def _build_matcher(
+        exact_replacements: Dict[str, str],
+        wildcard_replacements: List[Tuple[str, str, re.Pattern]]
+    ) -> Tuple[dict, dict, list]:
+        """
+        Compile the dictionary into two character tries (lower case).
+        
+        Exact sources are stored whole: a terminal node holds the target word.
+        Wildcards are stored by their prefix before the first '*': a terminal node
+        holds the indices of the wildcard entries to try, in dictionary order.
+        """
+        exact_trie: dict = {}
+        for source_word, target_word in exact_replacements.items():
+            node = exact_trie
+            for char in source_word.lower():
+                node = node.setdefault(char, {})
+            # The first entry wins if sources differ only by case
+            node.setdefault(_TERMINAL, target_word)
+        
+        wildcard_trie: dict = {}
+        for index, (source_word, _, _) in enumerate(wildcard_replacements):
+            node = wildcard_trie
+            for char in source_word.split('*', 1)[0].lower():
+                node = node.setdefault(char, {})
+            node.setdefault(_TERMINAL, []).append(index)
+        
+        return exact_trie, wildcard_trie, list(wildcard_replacements)
+    
+    @staticmethod
+    def _match_exact(trie: dict, lowered: str, text: str, start: int) -> Optional[Tuple[int, str]]:
+        """Longest exact source starting at `start` that ends on a word boundary."""
+        node = trie
+        best = None
+        for pos in range(start, len(lowered)):
+            node = node.get(lowered[pos])
+            if node is None:
+                break
+            if _TERMINAL in node and _is_boundary(text, pos + 1):
+                best = (pos + 1, node[_TERMINAL])
+        return best
+    
+    @staticmethod
+    def _match_wildcard(
+        trie: dict,
+        wildcards: List[Tuple[str, str, re.Pattern]],
+        lowered: str,
+        text: str,
+        start: int
+    ) -> Optional[Tuple[int, str]]:
+        """First wildcard entry (in dictionary order) matching at `start`."""
+        candidates: List[int] = list(trie.get(_TERMINAL, ()))
+        node = trie
+        for pos in range(start, len(lowered)):
+            node = node.get(lowered[pos])
+            if node is None:
+                break
+            candidates.extend(node.get(_TERMINAL, ()))
+        
+        for index in sorted(candidates):
+            _, target_pattern, compiled_pattern = wildcards[index]
+            match = compiled_pattern.match(text, start)
+            if match and match.end() > start:
+                # Get the wildcard part (captured group)
+                wildcard_part = match.group(1) if match.lastindex and match.lastindex >= 1 else ''
+                
+                # Replace * in target with the captured part
+                return match.end(), target_pattern.replace('*', wildcard_part)
+        return None
     
     def apply_replacements(self, text: str) -> str:
         """
@@ -134,51 +268,46 @@ class CustomDictionary:
         Returns:
             Text with replacements applied
         """
-        if not self.exact_replacements and not self.wildcard_replacements:
+        matcher = self._matcher
+        if matcher is None:
+            matcher = self._build_matcher(self.exact_replacements, self.wildcard_replacements)
+            self._matcher = matcher
+        exact_trie, wildcard_trie, wildcards = matcher
+        
+        if not exact_trie and not wildcards:
             return text
         
-        result = text
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Rare characters whose lower case is longer: keep indices aligned
+            lowered = ''.join(c.lower() if len(c.lower()) == 1 else c for c in text)
+        
+        parts: List[str] = []
+        copied = 0
         
-        # 1. Apply exact matches first (higher priority)
-        for source_word, target_word in self.exact_replacements.items():
-            pattern = self._exact_patterns.get(source_word)
-            if not pattern:
+        # Single pass: candidate matches start only at word boundaries
+        for boundary in _BOUNDARY_RE.finditer(text):
+            start = boundary.start()
+            if start < copied:
                 continue
             
-            # Find all matches
-            matches = list(pattern.finditer(result))
+            # 1. Exact matches first (higher priority), then wildcard patterns
+            match = self._match_exact(exact_trie, lowered, text, start)
+            if match is None and wildcards:
+                match = self._match_wildcard(wildcard_trie, wildcards, lowered, text, start)
+            if match is None:
+                continue
             
-            # Replace in reverse order to preserve indices
-            for match in reversed(matches):
-                matched_text = match.group(0)
-                
-                # Preserve case of the matched text
-                replacement = self._preserve_case(matched_text, target_word)
-                
-                # Replace the matched text
-                result = result[:match.start()] + replacement + result[match.end():]
+            end, target_word = match
+            parts.append(text[copied:start])
+            # Preserve case of the matched text
+            parts.append(self._preserve_case(text[start:end], target_word))
+            copied = end
         
-        # 2. Apply wildcard patterns
-        for source_pattern, target_pattern, compiled_pattern in self.wildcard_replacements:
-            matches = list(compiled_pattern.finditer(result))
-            
-            # Replace in reverse order to preserve indices
-            for match in reversed(matches):
-                matched_text = match.group(0)
-                
-                # Get the wildcard part (captured group)
-                wildcard_part = match.group(1) if match.lastindex and match.lastindex >= 1 else ''
-                
-                # Replace * in target with the captured part
-                target_replacement = target_pattern.replace('*', wildcard_part)
-                
-                # Preserve case
-                replacement = self._preserve_case(matched_text, target_replacement)
-                
-                # Replace the matched text
-                result = result[:match.start()] + replacement + result[match.end():]
-        
-        return result
+        if not parts:
+            return text
+        parts.append(text[copied:])
+        return ''.join(parts)
     
     @staticmethod
     def _preserve_case(original: str, replacement: str) -> str:
@@ -230,12 +359,18 @@ class CustomDictionary:
                     f.write(f"{source_word}={target_word}\n")
             
             logger.info(f"Saved {len(all_replacements)} replacements to {self.dictionary_path}")
+            
+            # Our own write is not an external edit: keep the watcher in sync
+            if self._watch is not None:
+                self._watch.check(force=True)
         
         except Exception as e:
             logger.error(f"Error saving dictionary: {e}")
     
     def reload(self) -> None:
         """Reload dictionary from file."""
+        if self._watch is not None:
+            self._watch.check(force=True)
         self.load()
     
     def add_replacement(self, source_word: str, target_word: str) -> None:
@@ -263,14 +398,14 @@ class CustomDictionary:
         """
         if source_word in self.exact_replacements:
             del self.exact_replacements[source_word]
-            if source_word in self._exact_patterns:
-                del self._exact_patterns[source_word]
         
         # Remove from wildcard list
         self.wildcard_replacements = [
             (src, tgt, pat) for src, tgt, pat in self.wildcard_replacements
             if src != source_word
         ]
+        self._matcher = None
+        self.version += 1
 
 
 # Global dictionary instance
@@ -310,5 +445,7 @@ def apply_custom_dictionary(text: str) -> str:
         Text with replacements applied, or original text if no dictionary is loaded
     """
     if _global_dictionary:
+        # Picks up edits of the dictionary file (cheap mtime check, parse only on change)
+        _global_dictionary.refresh()
         return _global_dictionary.apply_replacements(text)
     return text
@@ -0,0 +1,202 @@
+"""Модель длительности речи для подгонки реплик субтитров под тайминги.
+
+Для каждого голоса хранится линейная модель:
+
+    длительность_мс(rate) = (a·символы + b·слоги + c·пунктуация + d) / (1 + rate/100)
+
+Коэффициенты калибруются по фактической длительности озвученных фрагментов
+(накопление нормальных уравнений МНК с регуляризацией к стартовым значениям)
+и сохраняются в JSON между запусками.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import re
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = Path("duration_model.json")
+
+# Границы скорости Edge TTS (как у слайдера в UI)
+MIN_RATE = -50
+MAX_RATE = 50
+
+# Стартовые коэффициенты (мс): символ, слог, знак препинания, свободный член
+_PRIOR = [10.0, 170.0, 180.0, 250.0]
+# Вес априорных коэффициентов (эквивалент количества "виртуальных" наблюдений)
+_PRIOR_WEIGHT = 5.0
+# Коэффициент забывания: новые наблюдения важнее старых (голос/сервер могут меняться)
+_FORGETTING = 0.995
+
+_VOWELS_RE = re.compile(r'[аеёиоуыэюяaeiouy]', re.IGNORECASE)
+_PUNCT_RE = re.compile(r'[,.;:!?…—–]+')
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def text_features(text: str) -> List[float]:
+    """Признаки текста для модели: [символы, слоги, пунктуация, 1].
+
+    SSML-теги (например, <phoneme>) не произносятся и не учитываются.
+    """
+    plain = _TAG_RE.sub('', text)
+    chars = sum(1 for ch in plain if not ch.isspace())
+    syllables = len(_VOWELS_RE.findall(plain))
+    punct = len(_PUNCT_RE.findall(plain))
+    return [float(chars), float(syllables), float(punct), 1.0]
+
+
+def rate_factor(rate: int) -> float:
+    """Множитель скорости Edge TTS: rate=+50 → речь в 1.5 раза быстрее."""
+    return 1.0 + rate / 100.0
+
+
+def _solve(matrix: List[List[float]], vector: List[float]) -> Optional[List[float]]:
+    """Решает систему линейных уравнений методом Гаусса (4x4)."""
+    n = len(vector)
+    a = [row[:] + [vector[i]] for i, row in enumerate(matrix)]
+
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        if abs(a[pivot][col]) < 1e-12:
+            return None
+        a[col], a[pivot] = a[pivot], a[col]
+        for r in range(col + 1, n):
+            factor = a[r][col] / a[col][col]
+            for c in range(col, n + 1):
+                a[r][c] -= factor * a[col][c]
+
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (a[r][n] - sum(a[r][c] * x[c] for c in range(r + 1, n))) / a[r][r]
+    return x
+
+
+@dataclass
+class VoiceDurationModel:
+    """Модель длительности для одного голоса."""
+
+    # Накопленные X^T·X и X^T·y (y — длительность, приведённая к rate=0)
+    xtx: List[List[float]] = field(default_factory=lambda: [[0.0] * 4 for _ in range(4)])
+    xty: List[float] = field(default_factory=lambda: [0.0] * 4)
+    samples: int = 0
+    coefficients: List[float] = field(default_factory=lambda: list(_PRIOR))
+
+    def predict_ms(self, text: str, rate: int = 0) -> float:
+        """Предсказать длительность озвучки текста в миллисекундах."""
+        features = text_features(text)
+        base = sum(c * x for c, x in zip(self.coefficients, features))
+        return max(0.0, base) / rate_factor(rate)
+
+    def observe(self, text: str, rate: int, duration_ms: float) -> None:
+        """Учесть фактическую длительность озвученного фрагмента."""
+        if duration_ms <= 0:
+            return
+
+        features = text_features(text)
+        target = duration_ms * rate_factor(rate)
+
+        for i in range(4):
+            self.xty[i] = self.xty[i] * _FORGETTING + features[i] * target
+            for j in range(4):
+                self.xtx[i][j] = self.xtx[i][j] * _FORGETTING + features[i] * features[j]
+        self.samples += 1
+        self._refit()
+
+    def _refit(self) -> None:
+        """Пересчитать коэффициенты: (XᵀX + λI)·w = Xᵀy + λ·w₀."""
+        matrix = [
+            [self.xtx[i][j] + (_PRIOR_WEIGHT if i == j else 0.0) for j in range(4)]
+            for i in range(4)
+        ]
+        vector = [self.xty[i] + _PRIOR_WEIGHT * _PRIOR[i] for i in range(4)]
+
+        solution = _solve(matrix, vector)
+        if solution and all(math.isfinite(v) for v in solution):
+            self.coefficients = solution
+
+
+class DurationModel:
+    """Набор моделей длительности по голосам с сохранением в JSON."""
+
+    def __init__(self, path: Path = MODEL_FILE) -> None:
+        self.path = path
+        self.voices: Dict[str, VoiceDurationModel] = {}
+
+    def _voice(self, voice: str) -> VoiceDurationModel:
+        if voice not in self.voices:
+            self.voices[voice] = VoiceDurationModel()
+        return self.voices[voice]
+
+    def predict_ms(self, voice: str, text: str, rate: int = 0) -> float:
+        """Предсказать длительность озвучки текста голосом voice."""
+        return self._voice(voice).predict_ms(text, rate)
+
+    def observe(self, voice: str, text: str, rate: int, duration_ms: float) -> None:
+        """Откалибровать модель голоса по фактической длительности фрагмента."""
+        self._voice(voice).observe(text, rate, duration_ms)
+
+    def fit_rate(self, voice: str, text: str, slot_ms: float, base_rate: int = 0) -> int:
+        """Подобрать скорость, при которой реплика уложится в окно slot_ms.
+
+        Скорость не опускается ниже base_rate (выбранной пользователем):
+        модель только ускоряет реплики, которые не помещаются в своё окно.
+
+        Args:
+            voice: Voice ID
+            text: Текст реплики
+            slot_ms: Длительность окна реплики в миллисекундах
+            base_rate: Скорость, выбранная пользователем (-50..+50)
+
+        Returns:
+            int: Скорость для <prosody rate> в процентах
+        """
+        if slot_ms <= 0:
+            return base_rate
+
+        base_ms = self.predict_ms(voice, text, 0)
+        if base_ms <= slot_ms * rate_factor(base_rate):
+            return base_rate
+
+        needed = math.ceil((base_ms / slot_ms - 1.0) * 100)
+        return max(base_rate, min(MAX_RATE, needed))
+
+    def save(self) -> None:
+        """Сохранить коэффициенты в JSON."""
+        data = {voice: asdict(model) for voice, model in self.voices.items()}
+        try:
+            self.path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+        except Exception as e:
+            logger.error(f"Failed to save duration model: {e}")
+
+    @classmethod
+    def load(cls, path: Path = MODEL_FILE) -> DurationModel:
+        """Загрузить модели из JSON (или создать пустые)."""
+        model = cls(path)
+        if not path.exists():
+            return model
+
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            for voice, values in data.items():
+                model.voices[voice] = VoiceDurationModel(**values)
+        except Exception as e:
+            logger.error(f"Failed to load duration model: {e}")
+        return model
+
+
+# Глобальный экземпляр
+_model: Optional[DurationModel] = None
+
+
+def get_duration_model() -> DurationModel:
+    """Получить глобальный экземпляр модели длительности."""
+    global _model
+    if _model is None:
+        _model = DurationModel.load()
+    return _model
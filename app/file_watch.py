@@ -0,0 +1,75 @@
+"""Отслеживание изменений пользовательских файлов (словарь, триггеры).
+
+Файл опрашивается не чаще poll_interval секунд: сначала сравниваются
+mtime и размер, и только при их изменении читается содержимое и
+считается хеш. Версия увеличивается, лишь когда изменилось содержимое,
+поэтому на неё можно опираться как на ключ кешей.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+class WatchedFile:
+    """Файл, изменения которого отслеживаются по mtime/размеру и хешу содержимого."""
+
+    def __init__(self, path: Path, poll_interval: float = 1.0) -> None:
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        self.version = 0
+        self._signature: Optional[Tuple[int, int]] = None
+        self._digest: Optional[str] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _hash(self) -> Optional[str]:
+        try:
+            return hashlib.sha1(self.path.read_bytes()).hexdigest()
+        except OSError:
+            return None
+
+    def check(self, force: bool = False) -> bool:
+        """Проверить, изменилось ли содержимое файла с прошлой проверки.
+
+        Args:
+            force: Не учитывать интервал опроса
+
+        Returns:
+            bool: True при первой проверке и при каждом изменении содержимого
+            (в том числе при появлении или удалении файла)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if (
+                not force
+                and self._checked_at is not None
+                and now - self._checked_at < self.poll_interval
+            ):
+                return False
+            self._checked_at = now
+
+            signature = self._stat()
+            if self.version and signature == self._signature:
+                return False
+            self._signature = signature
+
+            digest = self._hash() if signature is not None else None
+            if self.version and digest == self._digest:
+                # Файл пересохранён без изменений
+                return False
+            self._digest = digest
+
+            self.version += 1
+            return True
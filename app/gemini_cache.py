@@ -0,0 +1,179 @@
+"""Постоянный кеш исправлений Gemini.
+
+Ответы хранятся в SQLite под ключом (нормализованный текст, отсортированные
+подсказки, модель, хеш промпта, режим размышлений), поэтому повторная
+обработка того же абзаца или реплики не вызывает Gemini. Записи старше TTL
+не используются, а при превышении лимита удаляются давно не читавшиеся.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = Path("gemini_cache.sqlite3")
+
+# Срок жизни записи и максимальное число записей
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 20_000
+
+# Как часто (в записях) проверять лимит размера
+_EVICT_EVERY = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS corrections (
+    key TEXT PRIMARY KEY,
+    corrected TEXT NOT NULL,
+    latency_ms REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS corrections_last_used ON corrections (last_used);
+"""
+
+
+@dataclass
+class CachedCorrection:
+    """Сохранённый ответ Gemini."""
+    text: str
+    latency_ms: float  # время исходного вызова (сэкономлено при попадании)
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация текста для ключа: пробельные символы схлопываются."""
+    return ' '.join(text.split())
+
+
+class GeminiCache:
+    """Кеш исправлений Gemini в файле SQLite."""
+
+    def __init__(
+        self,
+        path: Path = CACHE_FILE,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES
+    ) -> None:
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._puts = 0
+        # Соединение используется из GUI и из потока TtsWorker
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        text: str,
+        hints: List[str] | None,
+        model: str,
+        prompt_hash: str,
+        thinking_mode: bool
+    ) -> str:
+        """Ключ записи: меняется при изменении текста, подсказок, модели или промпта."""
+        payload = json.dumps(
+            [normalize_text(text), sorted(set(hints or [])), model, prompt_hash, bool(thinking_mode)],
+            ensure_ascii=False
+        )
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            self._evict(conn)
+        return self._conn
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Удалить просроченные записи и лишние сверх лимита (давно не читавшиеся)."""
+        conn.execute(
+            "DELETE FROM corrections WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,)
+        )
+        conn.execute(
+            "DELETE FROM corrections WHERE key IN ("
+            "SELECT key FROM corrections ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        conn.commit()
+
+    def get(self, key: str) -> Optional[CachedCorrection]:
+        """Вернуть сохранённое исправление или None (нет записи, истёк TTL, ошибка БД)."""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT corrected, latency_ms FROM corrections "
+                    "WHERE key = ? AND created_at >= ?",
+                    (key, now - self.ttl_seconds)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE corrections SET last_used = ? WHERE key = ?", (now, key))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Кеш Gemini недоступен: {e}")
+            return None
+        return CachedCorrection(text=row[0], latency_ms=row[1])
+
+    def put(self, key: str, corrected: str, latency_ms: float) -> None:
+        """Сохранить исправление (ошибки БД только логируются)."""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO corrections VALUES (?, ?, ?, ?, ?)",
+                    (key, corrected, latency_ms, now, now)
+                )
+                conn.commit()
+                self._puts += 1
+                if self._puts % _EVICT_EVERY == 0:
+                    self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось сохранить ответ Gemini в кеш: {e}")
+
+    def clear(self) -> None:
+        """Удалить все записи."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("DELETE FROM corrections")
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось очистить кеш Gemini: {e}")
+
+    def __len__(self) -> int:
+        try:
+            with self._lock:
+                return self._connect().execute("SELECT COUNT(*) FROM corrections").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Глобальный экземпляр
+_cache: Optional[GeminiCache] = None
+
+
+def get_cache() -> GeminiCache:
+    """Получить глобальный экземпляр кеша."""
+    global _cache
+    if _cache is None:
+        _cache = GeminiCache()
+    return _cache
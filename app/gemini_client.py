@@ -1,15 +1,37 @@
+import asyncio
+import logging
 import os
 from google import genai
 from google.genai import types
 
+logger = logging.getLogger(__name__)
+
 # Store configuration globally
 _api_key: str | None = None
 _proxy: str | None = None
+# Bumped whenever the key or proxy changes: pooled clients of older generations are rebuilt
+_generation = 0
+
+# Long-lived async client, owned by the TtsWorker loop
+_async_client: genai.Client | None = None
+_async_loop: asyncio.AbstractEventLoop | None = None
+_async_generation = -1
+# Replaced async clients: requests in flight may still use them, so they are closed on shutdown
+_retired_clients: list[genai.Client] = []
+
+# Separate sync client for IPA lookups (ipa_helper, called from the IpaLookupWorker thread)
+_sync_client: genai.Client | None = None
+# HTTP timeout of the sync client, s: a blocking call must not outlive the lookup thread's shutdown
+SYNC_REQUEST_TIMEOUT = 30.0
+_sync_generation = -1
 
 def init_client(api_key: str, http_proxy: str | None = None):
     """Initialize the Gemini configuration."""
-    global _api_key, _proxy
+    global _api_key, _proxy, _generation
     
+    if api_key != _api_key or http_proxy != _proxy:
+        _generation += 1
+
     _api_key = api_key
     _proxy = http_proxy
     
@@ -20,21 +42,107 @@ def init_client(api_key: str, http_proxy: str | None = None):
         # Also set for aiohttp/httpx specifically if needed, but env vars are usually enough
         # for libraries that support standard proxy env vars.
 
-def create_client() -> genai.Client | None:
-    """Create a new Gemini client instance using stored config."""
+def create_client(timeout: float | None = None) -> genai.Client | None:
+    """Create a new Gemini client instance using stored config.
+
+    Args:
+        timeout: HTTP timeout of every request, s (None — the SDK default)
+    """
     if not _api_key:
         return None
         
     # Create a fresh client. This ensures any internal session/loop binding 
     # happens in the current context (e.g. inside TtsWorker's loop).
-    return genai.Client(api_key=_api_key)
+    if timeout is None:
+        return genai.Client(api_key=_api_key)
+    return genai.Client(api_key=_api_key, http_options=types.HttpOptions(timeout=int(timeout * 1000)))
+
+def get_async_client() -> genai.Client | None:
+    """Return the pooled client for the running event loop (TtsWorker's loop).
+
+    The client (and its HTTP connection) is created lazily and reused across
+    requests. It is rebuilt only when the API key or proxy changes or when
+    called from a different loop (e.g. after the worker was restarted).
+
+    Returns:
+        Client to use via `client.aio`, or None if no API key is set
+    """
+    global _async_client, _async_loop, _async_generation
+
+    if not _api_key:
+        return None
+
+    loop = asyncio.get_running_loop()
+    if _async_client is not None and _async_loop is loop and _async_generation == _generation:
+        return _async_client
+
+    if _async_client is not None:
+        if _async_loop is loop:
+            _retired_clients.append(_async_client)
+        else:
+            # The old loop is gone: only the sync transport can still be released
+            _close_sync(_async_client)
+
+    _async_client = create_client()
+    _async_loop = loop
+    _async_generation = _generation
+    logger.info("Gemini async client created")
+    return _async_client
+
+async def close_async_client() -> None:
+    """Close the pooled async client (and replaced ones). Call on worker shutdown."""
+    global _async_client, _async_loop, _async_generation
+
+    clients = _retired_clients[:]
+    _retired_clients.clear()
+    if _async_client is not None:
+        clients.append(_async_client)
+    _async_client = None
+    _async_loop = None
+    _async_generation = -1
+
+    for client in clients:
+        try:
+            aclose = getattr(client.aio, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        except Exception as e:
+            logger.warning(f"Error closing Gemini async client: {e}")
+        _close_sync(client)
+
+def get_sync_client() -> genai.Client | None:
+    """Return the pooled client for synchronous calls (IPA lookups).
+
+    Requests of this client time out after SYNC_REQUEST_TIMEOUT seconds.
+
+    Returns:
+        Client to use via `client.models`, or None if no API key is set
+    """
+    global _sync_client, _sync_generation
+
+    if not _api_key:
+        return None
+
+    if _sync_client is None or _sync_generation != _generation:
+        if _sync_client is not None:
+            _close_sync(_sync_client)
+        _sync_client = create_client(timeout=SYNC_REQUEST_TIMEOUT)
+        _sync_generation = _generation
+    return _sync_client
+
+def _close_sync(client: genai.Client) -> None:
+    try:
+        client.close()
+    except Exception as e:
+        logger.warning(f"Error closing Gemini client: {e}")
 
 def reset_client():
     """Reset the Gemini configuration and environment."""
-    global _api_key, _proxy
+    global _api_key, _proxy, _generation
     
     _api_key = None
     _proxy = None
+    _generation += 1
     
     # Clean up environment variables
     os.environ.pop("HTTP_PROXY", None)
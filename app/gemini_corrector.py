@@ -1,6 +1,15 @@
 from google.genai import types
+import asyncio
+import hashlib
+import json
 import logging
-from typing import List
+import re
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.gemini_cache import CachedCorrection, get_cache
+from app.gemini_rate_limit import estimate_tokens, get_rate_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -23,66 +32,584 @@ _SYSTEM_PROMPT = (
     "3. Верни ТОЛЬКО обработанный текст.\n"
 )
 
-async def fix_text_with_gemini_async(text: str, triggers: List[str] = None, thinking_mode: bool = False) -> str:
+_CUES_PROMPT = (
+    "\nТЕКСТ НИЖЕ — ПРОНУМЕРОВАННЫЕ РЕПЛИКИ СУБТИТРОВ, по одной на строку в формате «[N] текст».\n"
+    "Обработай каждую реплику отдельно по тем же правилам и верни ВСЕ реплики в том же формате "
+    "и порядке, сохранив номера. Не объединяй и не разбивай строки, ничего не добавляй.\n"
+)
+
+_SENTENCES_PROMPT = (
+    "\nТЕКСТ НИЖЕ — ОТДЕЛЬНЫЕ ПРЕДЛОЖЕНИЯ ИЗ БОЛЬШОГО ТЕКСТА. Предложения для обработки пронумерованы "
+    "в формате «[N] текст». Строки вида «(контекст) текст» — соседние предложения, они даны только "
+    "для понимания смысла: НЕ обрабатывай и НЕ возвращай их.\n"
+    "Верни ВСЕ пронумерованные предложения в том же формате и порядке, сохранив номера. "
+    "Не объединяй и не разбивай строки, ничего не добавляй.\n"
+)
+
+# Строка ответа для пакета реплик: "[N] текст"
+_NUMBERED_LINE_RE = re.compile(r'^\s*\[(\d+)\]\s?(.*)$')
+
+GEMINI_MODEL = "gemini-2.5-flash"
+
+# Таймаут одной попытки запроса (с); при превышении часть текста остаётся без изменений.
+# Всю Gemini-стадию текста ограничивает GEMINI_JOB_TIMEOUT в text_pipeline
+GEMINI_REQUEST_TIMEOUT = 90.0
+
+_EDITS_PROMPT = (
+    "\nФОРМАТ ОТВЕТА: НЕ возвращай текст. Верни ТОЛЬКО JSON-массив правок (пустой массив [], если правок нет):\n"
+    '[{"line": N, "token": K, "original": "слово", "replacement": "замена", "type": "yo"}]\n'
+    "- line — номер строки [N] (если строки не пронумерованы — 0);\n"
+    "- token — порядковый номер слова в строке, считая с 0 (слово — буквы и цифры подряд, "
+    "слова через дефис считаются одним словом; знаки препинания и теги не считаются);\n"
+    "- original — слово точно как в тексте;\n"
+    "- replacement — слово с «ё» (type \"yo\") или IPA-тег <phoneme alphabet='ipa' ph='...'>слово</phoneme> "
+    "(type \"ipa\").\n"
+)
+
+# Слово для адресации правок: буквы/цифры, части через дефис — одно слово
+_EDIT_TOKEN_RE = re.compile(r'\w+(?:-\w+)*')
+_PHONEME_TAG_RE = re.compile(r"<phoneme alphabet=(['\"])ipa\1 ph=(['\"])[^'\"<>]+\2>([^<]+)</phoneme>")
+
+# Версии промптов для ключа кеша: правка промпта делает старые ответы недействительными
+_PROMPTS = {
+    "text": _SYSTEM_PROMPT,
+    "cue": _SYSTEM_PROMPT + _CUES_PROMPT,
+    "sentence": _SYSTEM_PROMPT + _SENTENCES_PROMPT,
+}
+
+
+def _prompt_hash(kind: str, edit_mode: bool) -> str:
+    prompt = _PROMPTS[kind] + (_EDITS_PROMPT if edit_mode else "")
+    return hashlib.sha1(prompt.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class TextEdit:
+    """Правка из ответа Gemini в режиме списка правок."""
+    line: int          # номер строки запроса ([N]; 0 для ненумерованного текста)
+    token: int         # номер слова в строке (с 0)
+    original: str      # слово в исходном тексте
+    replacement: str   # форма с «ё» или тег <phoneme>
+    type: str          # 'yo' или 'ipa'
+
+
+def _yo_neutral(word: str) -> str:
+    return word.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def parse_edits(raw: str) -> Optional[List[TextEdit]]:
+    """Разбирает JSON-список правок из ответа модели.
+
+    Args:
+        raw: Текст ответа (допускается обёртка ```json ... ```)
+
+    Returns:
+        Список правок (некорректные элементы пропускаются) или None,
+        если ответ не является JSON-массивом
+    """
+    start, end = raw.find('['), raw.rfind(']')
+    if start < 0 or end < start:
+        return None
+    try:
+        data = json.loads(raw[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, list):
+        return None
+
+    edits: List[TextEdit] = []
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        try:
+            edits.append(TextEdit(
+                line=int(item.get('line', 0)),
+                token=int(item['token']),
+                original=str(item['original']),
+                replacement=str(item['replacement']),
+                type=str(item.get('type', '')),
+            ))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return edits
+
+
+def _adds_yo(word: str, replacement: str) -> bool:
+    """Замена только ставит «ё» на место «е» (остальные буквы и регистр не меняются)."""
+    return (
+        len(replacement) == len(word)
+        and replacement.lower().count('ё') > word.lower().count('ё')
+        and all(
+            new == old or (old, new) in (('е', 'ё'), ('Е', 'Ё'))
+            for old, new in zip(word, replacement)
+        )
+    )
+
+
+def _edit_type(word: str, replacement: str) -> Optional[str]:
+    """Тип допустимой замены слова ('yo' / 'ipa') или None, если замена меняет слово."""
+    match = _PHONEME_TAG_RE.fullmatch(replacement)
+    if match:
+        return 'ipa' if _yo_neutral(match.group(3)) == _yo_neutral(word) else None
+    if _adds_yo(word, replacement):
+        return 'yo'
+    return None
+
+
+def apply_edits(text: str, edits: List[TextEdit]) -> Tuple[str, List[TextEdit]]:
+    """Применяет правки к тексту, проверив каждую по исходному слову.
+
+    Правка принимается, если слово с номером token совпадает с original
+    (иначе — если original встречается в тексте ровно один раз) и замена
+    либо только ставит «ё» на место «е» (в замене больше «ё», чем в слове,
+    остальные буквы и регистр те же; снятие «ё» не принимается), либо
+    оборачивает слово в тег <phoneme>.
+
+    Args:
+        text: Исходный текст (одна строка запроса)
+        edits: Правки этой строки
+
+    Returns:
+        Tuple[str, List[TextEdit]]: Исправленный текст и принятые правки
+    """
+    tokens = list(_EDIT_TOKEN_RE.finditer(text))
+    spans: Dict[int, Tuple[int, int, TextEdit]] = {}
+
+    for edit in edits:
+        if 0 <= edit.token < len(tokens) and tokens[edit.token].group(0) == edit.original:
+            position = edit.token
+        else:
+            same = [i for i, token in enumerate(tokens) if token.group(0) == edit.original]
+            if len(same) != 1:
+                logger.debug(f"Gemini: правка не совпала с текстом: {edit}")
+                continue
+            position = same[0]
+
+        edit_type = _edit_type(edit.original, edit.replacement)
+        if edit_type is None or position in spans:
+            logger.debug(f"Gemini: недопустимая правка: {edit}")
+            continue
+        edit.token, edit.type = position, edit_type
+        spans[position] = (tokens[position].start(), tokens[position].end(), edit)
+
+    if not spans:
+        return text, []
+
+    parts: List[str] = []
+    last = 0
+    for start, end, edit in sorted(spans.values(), key=lambda span: span[0]):
+        parts.append(text[last:start])
+        parts.append(edit.replacement)
+        last = end
+    parts.append(text[last:])
+    return ''.join(parts), [span[2] for span in sorted(spans.values(), key=lambda span: span[0])]
+
+
+def is_safe_correction(original: str, corrected: str) -> bool:
+    """Исправление отличается от исходного текста только буквой «ё» и тегами <phoneme>."""
+    def plain(text: str) -> List[str]:
+        return _yo_neutral(_PHONEME_TAG_RE.sub(lambda match: match.group(3), text)).split()
+    return plain(original) == plain(corrected)
+
+
+class NumberedCorrections(dict):
+    """Исправленные строки по номерам; в режиме правок также принятые правки (edits)."""
+
+    def __init__(self, *args, edits: Optional[Dict[int, List[TextEdit]]] = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.edits = edits
+
+
+def _generation_config(thinking_mode: bool) -> types.GenerateContentConfig:
+    """Детерминированные настройки генерации (+ режим размышлений)."""
+    gen_config = types.GenerateContentConfig(
+        temperature=0.0,
+        top_p=0.1,
+        top_k=1,
+    )
+
+    if thinking_mode:
+        try:
+            # Try to set thinking config if supported by the SDK version
+            if hasattr(types, 'ThinkingConfig'):
+                gen_config.thinking_config = types.ThinkingConfig(include_thoughts=True)
+            else:
+                logger.warning("types.ThinkingConfig not found. Thinking mode might not work as expected.")
+        except Exception as e:
+            logger.warning(f"Could not set thinking_config: {e}")
+
+    return gen_config
+
+
+async def _generate(client, prompt: str, thinking_mode: bool):
+    """Запрос к модели с учётом лимитов RPM/TPM, повторами при 429 и таймаутом.
+
+    Raises:
+        asyncio.TimeoutError: Попытка не уложилась в GEMINI_REQUEST_TIMEOUT
+        Exception: Ошибка API (429 — после исчерпания повторов)
+    """
+    config = _generation_config(thinking_mode)
+    return await get_rate_limiter().call(
+        lambda: asyncio.wait_for(
+            client.aio.models.generate_content(model=GEMINI_MODEL, contents=prompt, config=config),
+            GEMINI_REQUEST_TIMEOUT,
+        ),
+        tokens=estimate_tokens(prompt),
+    )
+
+
+def _count_timeout() -> None:
+    from app.gemini_stats import get_stats
+    get_stats().increment_timeout()
+
+
+def _triggers_hint(triggers: List[str] | None) -> str:
+    # Если есть список триггеров, можно добавить их в промпт для акцента
+    if not triggers:
+        return ""
+    return (
+        f"\n\nВАЖНО: Обрати особое внимание на эти слова: {', '.join(triggers)}.\n"
+        "Если в этом списке слово указано с ударением (например, 'Се́лигман'), "
+        "ОБЯЗАТЕЛЬНО используй это ударение при генерации IPA тега для этого слова!"
+    )
+
+
+def _cache_key(text: str, triggers: List[str] | None, thinking_mode: bool, kind: str, edit_mode: bool) -> str:
+    return get_cache().make_key(text, triggers, GEMINI_MODEL, _prompt_hash(kind, edit_mode), thinking_mode)
+
+
+def get_cached_correction(
+    text: str,
+    triggers: List[str] = None,
+    thinking_mode: bool = False,
+    kind: str = "text",
+    edit_mode: bool = False
+) -> Optional[CachedCorrection]:
+    """Ищет сохранённый ответ Gemini для текста.
+
+    Args:
+        text: Исходный текст (абзац, реплика или предложение с соседями)
+        triggers: Подсказки, с которыми текст отправлялся бы в Gemini
+        thinking_mode: Режим размышлений модели
+        kind: Промпт, которым обрабатывается текст: "text", "cue" или "sentence"
+        edit_mode: Ответ запрашивается списком правок (см. parse_edits)
+
+    Returns:
+        CachedCorrection или None, если ответа нет в кеше
+    """
+    return get_cache().get(_cache_key(text, triggers, thinking_mode, kind, edit_mode))
+
+
+def store_correction(
+    text: str,
+    corrected: str,
+    latency_ms: float,
+    triggers: List[str] = None,
+    thinking_mode: bool = False,
+    kind: str = "text",
+    edit_mode: bool = False
+) -> None:
+    """Сохраняет ответ Gemini в кеш (параметры как у get_cached_correction)."""
+    get_cache().put(_cache_key(text, triggers, thinking_mode, kind, edit_mode), corrected, latency_ms)
+
+
+async def fix_text_with_gemini_async(
+    text: str,
+    triggers: List[str] = None,
+    thinking_mode: bool = False,
+    edit_mode: bool = False
+) -> str:
+    """Исправляет текст одним запросом к Gemini.
+
+    В режиме правок (edit_mode) модель возвращает не весь текст, а JSON-список
+    правок, которые проверяются по исходным словам и применяются локально.
+
+    Успешный ответ сохраняется в кеш (см. get_cached_correction); при ошибке
+    или подозрительном ответе возвращается исходный текст и кеш не меняется.
+    """
     if not text:
         return text
     
-    from app.gemini_client import create_client
+    from app.gemini_client import get_async_client
     
-    client = create_client()
+    client = get_async_client()
     if not client:
         logger.warning("Gemini client not initialized. Skipping AI correction.")
         return text
 
-    # Если есть список триггеров, можно добавить их в промпт для акцента
-    triggers_hint = ""
-    if triggers:
-        triggers_hint = (
-            f"\n\nВАЖНО: Обрати особое внимание на эти слова: {', '.join(triggers)}.\n"
-            "Если в этом списке слово указано с ударением (например, 'Се́лигман'), "
-            "ОБЯЗАТЕЛЬНО используй это ударение при генерации IPA тега для этого слова!"
-        )
-
-    prompt = f"{_SYSTEM_PROMPT}{triggers_hint}\n\nВОТ ТЕКСТ ДЛЯ ОБРАБОТКИ:\n{text}"
+    edits_prompt = _EDITS_PROMPT if edit_mode else ""
+    prompt = f"{_SYSTEM_PROMPT}{edits_prompt}{_triggers_hint(triggers)}\n\nВОТ ТЕКСТ ДЛЯ ОБРАБОТКИ:\n{text}"
 
     try:
-        # Configure thinking mode if enabled
-        gen_config = types.GenerateContentConfig(
-            temperature=0.0,
-            top_p=0.1,
-            top_k=1,
-        )
+        start = time.perf_counter()
+        resp = await _generate(client, prompt, thinking_mode)
         
-        if thinking_mode:
-            try:
-                # Try to set thinking config if supported by the SDK version
-                if hasattr(types, 'ThinkingConfig'):
-                    gen_config.thinking_config = types.ThinkingConfig(include_thoughts=True)
-                else:
-                    logger.warning("types.ThinkingConfig not found. Thinking mode might not work as expected.")
-            except Exception as e:
-                logger.warning(f"Could not set thinking_config: {e}")
-
-        resp = await client.aio.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config=gen_config,
-        )
-        
-        result = (resp.text or "").strip()
-        
-        # Basic validation
-        if not result or len(result) < len(text) * 0.5:
-            logger.warning("Gemini returned suspiciously short text. Returning original.")
-            return text
+        if edit_mode:
+            edits = parse_edits(resp.text or "")
+            if edits is None:
+                logger.warning("Gemini returned no valid edit list. Returning original.")
+                return text
+            result, applied = apply_edits(text, [edit for edit in edits if edit.line == 0])
+            logger.info(f"Gemini: применено правок {len(applied)} из {len(edits)}")
+        else:
+            result = (resp.text or "").strip()
+            
+            # Basic validation
+            if not result or len(result) < len(text) * 0.5:
+                logger.warning("Gemini returned suspiciously short text. Returning original.")
+                return text
         
+        store_correction(
+            text, result, (time.perf_counter() - start) * 1000, triggers, thinking_mode,
+            edit_mode=edit_mode
+        )
         return result
         
+    except asyncio.TimeoutError:
+        logger.error(f"Gemini text correction timed out after {GEMINI_REQUEST_TIMEOUT:.0f}s. Returning original.")
+        _count_timeout()
+        return text
     except Exception as e:
         logger.error(f"Error calling Gemini for text correction: {e}")
         return text
-    finally:
+
+
+async def stream_text_with_gemini_async(
+    text: str,
+    triggers: List[str] = None,
+    thinking_mode: bool = False
+) -> AsyncIterator[str]:
+    """Исправляет текст потоковым запросом: части ответа возвращаются по мере прихода.
+
+    Промпт тот же, что у fix_text_with_gemini_async без режима правок (модель
+    возвращает весь исправленный текст). Повтор при 429 возможен только до
+    первой части ответа; дальше таймаут GEMINI_REQUEST_TIMEOUT действует на
+    ожидание каждой следующей части. Проверка и кеширование — на стороне вызывающего.
+
+    Yields:
+        Фрагменты исправленного текста (границы произвольные)
+
+    Raises:
+        asyncio.TimeoutError: Ответ (или его очередная часть) не пришёл вовремя
+        Exception: Ошибка API или клиент не инициализирован
+    """
+    from app.gemini_client import get_async_client
+
+    client = get_async_client()
+    if not client:
+        raise RuntimeError("Gemini client not initialized")
+
+    prompt = f"{_SYSTEM_PROMPT}{_triggers_hint(triggers)}\n\nВОТ ТЕКСТ ДЛЯ ОБРАБОТКИ:\n{text}"
+    config = _generation_config(thinking_mode)
+
+    async def open_stream():
+        # Ошибка запроса (в том числе 429) приходит с первой частью ответа
+        stream = await client.aio.models.generate_content_stream(
+            model=GEMINI_MODEL, contents=prompt, config=config
+        )
+        iterator = stream.__aiter__()
         try:
-            client.close()
-        except Exception:
-            pass
+            first = await iterator.__anext__()
+        except StopAsyncIteration:
+            first = None
+        return iterator, first
+
+    iterator, chunk = await get_rate_limiter().call(
+        lambda: asyncio.wait_for(open_stream(), GEMINI_REQUEST_TIMEOUT),
+        tokens=estimate_tokens(prompt),
+    )
+    try:
+        while chunk is not None:
+            if chunk.text:
+                yield chunk.text
+            try:
+                chunk = await asyncio.wait_for(iterator.__anext__(), GEMINI_REQUEST_TIMEOUT)
+            except StopAsyncIteration:
+                chunk = None
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+async def _fix_numbered_async(
+    items: List[Tuple[int, str]],
+    body: str,
+    instructions: str,
+    header: str,
+    triggers: List[str] | None,
+    thinking_mode: bool,
+    edit_mode: bool = False
+) -> NumberedCorrections:
+    """Отправляет пронумерованные строки одним запросом и разбирает ответ по номерам.
+
+    Args:
+        items: Пары (номер, исходный текст) — для проверки ответа
+        body: Текст запроса (строки «[N] текст», возможно с контекстом)
+        instructions: Дополнение к системному промпту
+        header: Заголовок перед текстом запроса
+        triggers: Подсказки (слова-триггеры с ударениями)
+        thinking_mode: Режим размышлений модели
+        edit_mode: Запросить JSON-список правок вместо текста строк
+
+    Returns:
+        NumberedCorrections: Исправленные тексты по номерам (без несопоставленных и
+        подозрительных); в режиме правок — все строки и принятые правки в edits
+    """
+    from app.gemini_client import get_async_client
+
+    client = get_async_client()
+    if not client:
+        logger.warning("Gemini client not initialized. Skipping AI correction.")
+        return NumberedCorrections()
+
+    originals = dict(items)
+    edits_prompt = _EDITS_PROMPT if edit_mode else ""
+    prompt = f"{_SYSTEM_PROMPT}{instructions}{edits_prompt}{_triggers_hint(triggers)}\n\n{header}\n{body}"
+
+    try:
+        resp = await _generate(client, prompt, thinking_mode)
+
+        if edit_mode:
+            return _apply_numbered_edits(originals, resp.text or "")
+
+        fixed = NumberedCorrections()
+        for line in (resp.text or "").splitlines():
+            match = _NUMBERED_LINE_RE.match(line)
+            if not match:
+                continue
+            index = int(match.group(1))
+            result = match.group(2).strip()
+            original = originals.get(index)
+            # Basic validation (per line)
+            if original is None or not result or len(result) < len(original) * 0.5:
+                continue
+            fixed[index] = result
+
+        missing = len(items) - len(fixed)
+        if missing:
+            logger.warning(f"Gemini: {missing} из {len(items)} строк не сопоставлены, оставлены без изменений")
+
+        return fixed
+
+    except asyncio.TimeoutError:
+        logger.error(f"Gemini numbered correction timed out after {GEMINI_REQUEST_TIMEOUT:.0f}s. Lines left unchanged.")
+        _count_timeout()
+        return NumberedCorrections()
+    except Exception as e:
+        logger.error(f"Error calling Gemini for numbered correction: {e}")
+        return NumberedCorrections()
+
+
+def _apply_numbered_edits(originals: Dict[int, str], raw: str) -> NumberedCorrections:
+    """Применяет список правок к пронумерованным строкам запроса."""
+    edits = parse_edits(raw)
+    if edits is None:
+        logger.warning("Gemini returned no valid edit list. Lines left unchanged.")
+        return NumberedCorrections()
+
+    by_line: Dict[int, List[TextEdit]] = {}
+    for edit in edits:
+        if edit.line in originals:
+            by_line.setdefault(edit.line, []).append(edit)
+
+    # Строка без правок — тоже ответ («менять нечего»), поэтому возвращаются все строки.
+    # Правки адресованы номерами слов, которые не зависят от пробелов, поэтому
+    # применяются к исходной строке: переводы строк в репликах сохраняются
+    fixed = NumberedCorrections(edits={})
+    for index, original in originals.items():
+        fixed[index], applied = apply_edits(original, by_line.get(index, []))
+        if applied:
+            fixed.edits[index] = applied
+
+    accepted = sum(len(applied) for applied in fixed.edits.values())
+    if accepted != len(edits):
+        logger.warning(f"Gemini: принято правок {accepted} из {len(edits)}")
+    return fixed
+
+
+def _one_line(text: str) -> str:
+    # Перевод строки внутри строки запроса сломал бы нумерацию
+    return ' '.join(text.split())
+
+
+async def fix_cues_with_gemini_async(
+    cues: List[Tuple[int, str]],
+    triggers: List[str] = None,
+    thinking_mode: bool = False,
+    edit_mode: bool = False
+) -> NumberedCorrections:
+    """Исправляет пакет реплик субтитров одним запросом к Gemini.
+
+    Реплики отправляются пронумерованными строками «[N] текст», ответ
+    разбирается обратно по номерам.
+
+    Args:
+        cues: Пары (индекс реплики, текст)
+        triggers: Подсказки (слова-триггеры с ударениями)
+        thinking_mode: Режим размышлений модели
+        edit_mode: Запросить JSON-список правок вместо текста реплик
+
+    Returns:
+        NumberedCorrections: Исправленные тексты по индексам; реплики, которые не удалось
+        сопоставить или которые выглядят подозрительно, не попадают в результат
+    """
+    if not cues:
+        return NumberedCorrections()
+
+    numbered = "\n".join(f"[{index}] {_one_line(text)}" for index, text in cues)
+    return await _fix_numbered_async(
+        cues, numbered, _CUES_PROMPT, "ВОТ РЕПЛИКИ ДЛЯ ОБРАБОТКИ:", triggers, thinking_mode, edit_mode
+    )
+
+
+async def fix_sentences_with_gemini_async(
+    sentences: List[Tuple[int, str]],
+    context: Dict[int, str] = None,
+    triggers: List[str] = None,
+    thinking_mode: bool = False,
+    edit_mode: bool = False
+) -> NumberedCorrections:
+    """Исправляет выбранные предложения текста одним запросом к Gemini.
+
+    Предложения отправляются строками «[N] текст»; соседние предложения
+    из context добавляются строками «(контекст) текст» и в ответе не
+    ожидаются. Остальной текст в запрос не попадает.
+
+    Args:
+        sentences: Пары (индекс предложения в тексте, текст) по возрастанию индекса
+        context: Тексты соседних предложений по индексам
+        triggers: Подсказки (слова-триггеры с ударениями)
+        thinking_mode: Режим размышлений модели
+        edit_mode: Запросить JSON-список правок вместо текста предложений
+
+    Returns:
+        NumberedCorrections: Исправленные предложения по индексам; несопоставленные
+        и подозрительные не попадают в результат
+    """
+    if not sentences:
+        return NumberedCorrections()
+
+    context = context or {}
+    selected = dict(sentences)
+    # Выбранные предложения и их соседи по порядку; разрывы — пустой строкой
+    shown = sorted({
+        neighbour
+        for index in selected
+        for neighbour in (index - 1, index, index + 1)
+        if neighbour in selected or neighbour in context
+    })
+
+    lines: List[str] = []
+    for position, index in enumerate(shown):
+        if position and index != shown[position - 1] + 1:
+            lines.append("")
+        if index in selected:
+            lines.append(f"[{index}] {_one_line(selected[index])}")
+        else:
+            lines.append(f"(контекст) {_one_line(context[index])}")
+
+    return await _fix_numbered_async(
+        sentences, "\n".join(lines), _SENTENCES_PROMPT, "ВОТ ПРЕДЛОЖЕНИЯ ДЛЯ ОБРАБОТКИ:",
+        triggers, thinking_mode, edit_mode
+    )
@@ -0,0 +1,212 @@
+"""Ограничение частоты запросов к Gemini (RPM/TPM) и повторы при 429.
+
+Два «ведра токенов» — запросов в минуту и входных токенов в минуту —
+пополняются непрерывно; запрос ждёт, пока в обоих хватит ёмкости.
+Ответ 429 (RESOURCE_EXHAUSTED) приостанавливает все запросы на время
+отката, после чего запрос повторяется.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Лимиты аккаунта для gemini-2.5-flash (бесплатный уровень)
+GEMINI_RPM = 10
+GEMINI_TPM = 250_000
+
+# Повторы при 429: число попыток и откат (с), если сервер не указал задержку
+MAX_RETRIES = 4
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+# Грубая оценка: символов на токен для кириллицы
+_CHARS_PER_TOKEN = 3
+
+_STATUS_429_RE = re.compile(r'\b429\b')
+# "retryDelay": "17s" в теле ошибки 429
+_RETRY_DELAY_RE = re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+class TokenBucket:
+    """Ведро токенов: capacity единиц, пополняется на capacity за period секунд."""
+
+    def __init__(self, capacity: float, period: float = 60.0) -> None:
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Сколько секунд ждать, пока в ведре наберётся amount (0 — можно сразу)."""
+        self._refill()
+        # Запрос больше ёмкости ведра пропускается, когда ведро полное
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка числа токенов текста."""
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Ошибка квоты Gemini (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    if getattr(error, "code", None) == 429:
+        return True
+    message = str(error)
+    return "RESOURCE_EXHAUSTED" in message or bool(_STATUS_429_RE.search(message))
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    match = _RETRY_DELAY_RE.search(str(error))
+    if match:
+        return float(match.group(1))
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.8, 1.2)
+
+
+class GeminiRateLimiter:
+    """Общий для всех запросов ограничитель RPM/TPM."""
+
+    def __init__(self, rpm: int = GEMINI_RPM, tpm: int = GEMINI_TPM) -> None:
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Вёдра используются и из фоновых потоков (try_acquire)
+        self._buckets_lock = threading.Lock()
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Worker создаёт свой цикл событий: блокировка привязана к текущему
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    async def acquire(self, tokens: int) -> None:
+        """Дождаться ёмкости для одного запроса на tokens входных токенов."""
+        async with self._get_lock():
+            while True:
+                with self._buckets_lock:
+                    delay = max(
+                        self._paused_until - time.monotonic(),
+                        self.requests.wait_time(1),
+                        self.tokens.wait_time(tokens),
+                    )
+                    if delay <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        break
+                await asyncio.sleep(delay)
+
+    def try_acquire(self, tokens: int, reserve: int = 0) -> bool:
+        """Занять ёмкость для запроса без ожидания (для фоновых запросов из любого потока).
+
+        Args:
+            tokens: Оценка входных токенов запроса
+            reserve: Сколько запросов в минуту оставить свободными для основных задач
+
+        Returns:
+            bool: True, если ёмкость занята и запрос можно выполнять
+        """
+        with self._buckets_lock:
+            if (
+                self._paused_until > time.monotonic()
+                or self.requests.wait_time(1 + reserve) > 0
+                or self.tokens.wait_time(tokens) > 0
+            ):
+                return False
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            return True
+
+    def acquire_blocking(self, tokens: int, cancel: Optional[threading.Event] = None) -> bool:
+        """Дождаться ёмкости для запроса в фоновом потоке (без цикла событий).
+
+        Args:
+            tokens: Оценка входных токенов запроса
+            cancel: Событие, прерывающее ожидание (например, остановка потока)
+
+        Returns:
+            bool: True, если ёмкость занята; False, если ожидание прервано cancel
+        """
+        while True:
+            with self._buckets_lock:
+                delay = max(
+                    self._paused_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(tokens),
+                )
+                if delay <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    return True
+            if cancel is None:
+                time.sleep(delay)
+            elif cancel.wait(delay):
+                return False
+
+    def pause(self, seconds: float) -> None:
+        """Приостановить все запросы (после 429)."""
+        with self._buckets_lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def call(self, request: Callable[[], Awaitable[T]], tokens: int) -> T:
+        """Выполнить запрос с учётом лимитов, повторяя его при 429.
+
+        Args:
+            request: Фабрика корутины запроса (вызывается на каждую попытку)
+            tokens: Оценка входных токенов запроса
+
+        Returns:
+            Результат запроса
+
+        Raises:
+            Exception: Ошибка запроса (в том числе 429 после MAX_RETRIES повторов)
+        """
+        attempt = 0
+        while True:
+            await self.acquire(tokens)
+            try:
+                return await request()
+            except Exception as e:
+                if attempt >= MAX_RETRIES or not is_rate_limit_error(e):
+                    raise
+                delay = _retry_delay(e, attempt)
+                logger.warning(f"Gemini: превышена квота (429), повтор через {delay:.1f} с")
+                self.pause(delay)
+                attempt += 1
+
+
+# Глобальный экземпляр
+_limiter: Optional[GeminiRateLimiter] = None
+
+
+def get_rate_limiter() -> GeminiRateLimiter:
+    """Получить глобальный ограничитель запросов."""
+    global _limiter
+    if _limiter is None:
+        _limiter = GeminiRateLimiter()
+    return _limiter
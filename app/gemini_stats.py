@@ -1,14 +1,54 @@
-"""Статистика вызовов Gemini AI."""
+"""Статистика вызовов Gemini AI.
+
+Итоги и детальные исправления хранятся в SQLite. Счётчики в памяти
+обновляются сразу (их показывает UI), а в файл записываются только
+приращения: пакетами, в фоновом потоке, одной транзакцией. Поэтому
+сохранение не дорожает с ростом истории и не занимает цикл событий
+TtsWorker.
+"""
 
 from __future__ import annotations
 
+import atexit
 import json
-from dataclasses import dataclass, asdict
+import logging
+import sqlite3
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
 
+STATS_DB = Path("gemini_stats.sqlite3")
+# Прежний формат (весь объект в JSON): переносится в базу при первом запуске
 STATS_FILE = Path("gemini_stats.json")
 
+# Задержка записи после save(): изменения за это время уходят одной транзакцией, с
+FLUSH_INTERVAL = 2.0
+
+# Сохраняемые итоги (сессионные счётчики не сохраняются); max_time_ms — максимум, остальные — суммы
+_SUMMED = (
+    "total_calls", "total_corrections", "total_time_ms", "cache_hits",
+    "cache_saved_ms", "timeouts", "offline_lookups", "offline_hits",
+)
+_FLOAT_TOTALS = {"total_time_ms", "cache_saved_ms", "max_time_ms"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS totals (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS corrections (
+    key TEXT PRIMARY KEY,
+    original TEXT NOT NULL,
+    corrected TEXT NOT NULL,
+    type TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+"""
+
 
 @dataclass
 class CorrectionEntry:
@@ -28,6 +68,15 @@ class GeminiStats:
     total_corrections: int = 0     # Всего исправлений (добавлено ё)
     total_time_ms: float = 0.0     # Общее время обработки (мс)
     max_time_ms: float = 0.0       # Максимальное время одного вызова
+    cache_hits: int = 0            # Ответов из кеша за всё время
+    session_cache_hits: int = 0    # Ответов из кеша за текущую сессию
+    cache_saved_ms: float = 0.0    # Сэкономлено кешем (время исходных вызовов, мс)
+    timeouts: int = 0              # Запросов/задач, не уложившихся в бюджет времени
+    session_timeouts: int = 0      # То же за текущую сессию
+    offline_lookups: int = 0       # Фрагментов с триггерами, проверенных по памяти омографов
+    offline_hits: int = 0          # Из них разрешено локально (без вызова Gemini)
+    session_offline_lookups: int = 0
+    session_offline_hits: int = 0
     
     # Детальная статистика: "original->corrected" -> CorrectionEntry
     detailed_corrections: Dict[str, CorrectionEntry] = None
@@ -35,17 +84,22 @@ class GeminiStats:
     def __post_init__(self):
         if self.detailed_corrections is None:
             self.detailed_corrections = {}
-        # Convert dicts back to dataclasses if loaded from JSON
-        elif self.detailed_corrections and isinstance(next(iter(self.detailed_corrections.values())), dict):
-            self.detailed_corrections = {
-                k: CorrectionEntry(**v) for k, v in self.detailed_corrections.items()
-            }
     
     @property
     def avg_time_ms(self) -> float:
         """Среднее время обработки одного вызова."""
         return self.total_time_ms / self.total_calls if self.total_calls > 0 else 0.0
     
+    @property
+    def offline_hit_rate(self) -> float:
+        """Доля фрагментов, разрешённых памятью омографов без Gemini."""
+        return self.offline_hits / self.offline_lookups if self.offline_lookups > 0 else 0.0
+    
+    @property
+    def session_offline_hit_rate(self) -> float:
+        """То же за текущую сессию."""
+        return self.session_offline_hits / self.session_offline_lookups if self.session_offline_lookups > 0 else 0.0
+    
     def increment_call(self, time_ms: float, corrections: int = 0, details: List[CorrectionEntry] = None) -> None:
         """Увеличить счётчики после вызова Gemini.
         
@@ -64,42 +118,249 @@ class GeminiStats:
             for entry in details:
                 key = f"{entry.original}->{entry.corrected}"
                 if key in self.detailed_corrections:
-                    self.detailed_corrections[key].count += 1
+                    self.detailed_corrections[key].count += entry.count
                 else:
-                    self.detailed_corrections[key] = entry
+                    self.detailed_corrections[key] = CorrectionEntry(entry.original, entry.corrected, entry.type, entry.count)
         
-        # Debug print
-        print(f"Stats updated: {self.total_calls} calls, {len(self.detailed_corrections)} details")
+        get_store().add(
+            {"total_calls": 1, "total_corrections": corrections, "total_time_ms": time_ms},
+            max_time_ms=time_ms,
+            corrections=details or ()
+        )
     
-    def save(self) -> None:
-        """Сохранить статистику в JSON (без session_calls)."""
-        data = asdict(self)
-        data.pop('session_calls')  # Сессионные данные не сохраняем
+    def increment_cache_hit(self, saved_ms: float) -> None:
+        """Учесть ответ, взятый из кеша вместо вызова Gemini.
         
-        try:
-            STATS_FILE.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
-        except Exception as e:
-            print(f"Failed to save stats: {e}")
+        Args:
+            saved_ms: Время исходного вызова, которое сэкономлено
+        """
+        self.cache_hits += 1
+        self.session_cache_hits += 1
+        self.cache_saved_ms += saved_ms
+        get_store().add({"cache_hits": 1, "cache_saved_ms": saved_ms})
+    
+    def increment_timeout(self) -> None:
+        """Учесть запрос (или всю Gemini-стадию), прерванный по таймауту."""
+        self.timeouts += 1
+        self.session_timeouts += 1
+        get_store().add({"timeouts": 1})
+    
+    def increment_offline(self, resolved: bool) -> None:
+        """Учесть проверку фрагмента по памяти омографов.
+        
+        Args:
+            resolved: Все триггеры фрагмента разрешены локально
+        """
+        self.offline_lookups += 1
+        self.session_offline_lookups += 1
+        if resolved:
+            self.offline_hits += 1
+            self.session_offline_hits += 1
+        get_store().add({"offline_lookups": 1, "offline_hits": int(resolved)})
+    
+    def save(self) -> None:
+        """Записать накопленные приращения (в фоновом потоке, не дожидаясь записи)."""
+        get_store().flush_soon()
     
     @classmethod
     def load(cls) -> GeminiStats:
-        """Загрузить статистику из JSON."""
-        if not STATS_FILE.exists():
-            return cls()
-        
+        """Загрузить статистику из базы (сессионные счётчики остаются 0)."""
+        totals, corrections = get_store().load()
+        stats = cls(**{
+            name: value if name in _FLOAT_TOTALS else int(value)
+            for name, value in totals.items()
+        })
+        stats.detailed_corrections = {
+            f"{entry.original}->{entry.corrected}": entry for entry in corrections
+        }
+        return stats
+
+
+class StatsStore:
+    """Итоги и детальные исправления в файле SQLite; запись пакетами из фонового потока."""
+
+    def __init__(self, path: Path = STATS_DB, flush_interval: float = FLUSH_INTERVAL) -> None:
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        # Приращения, ещё не записанные в базу
+        self._totals: Dict[str, float] = defaultdict(float)
+        self._max_time_ms = 0.0
+        self._corrections: Dict[str, List] = {}
+        self._pending_lock = threading.Lock()
+        # Соединение используется фоновым потоком и потоком, вызвавшим load/clear/close
+        self._db_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closing = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def add(
+        self,
+        totals: Dict[str, float],
+        max_time_ms: float = 0.0,
+        corrections: Iterable[CorrectionEntry] = ()
+    ) -> None:
+        """Добавить приращения итогов и исправления (запишутся при следующей записи)."""
+        with self._pending_lock:
+            for name, value in totals.items():
+                self._totals[name] += value
+            self._max_time_ms = max(self._max_time_ms, max_time_ms)
+            for entry in corrections:
+                key = f"{entry.original}->{entry.corrected}"
+                pending = self._corrections.get(key)
+                if pending is None:
+                    self._corrections[key] = [entry.original, entry.corrected, entry.type, entry.count]
+                else:
+                    pending[3] += entry.count
+
+    def flush_soon(self) -> None:
+        """Запросить запись: фоновый поток соберёт изменения за flush_interval и запишет их разом."""
+        if self._closing.is_set():
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="gemini-stats-writer", daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._closing.is_set():
+            self._wakeup.wait()
+            # Копим изменения, пока идут вызовы, — одна транзакция на пакет
+            self._closing.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Записать накопленные приращения одной транзакцией."""
+        with self._pending_lock:
+            totals = [(name, value) for name, value in self._totals.items() if value]
+            max_time_ms = self._max_time_ms
+            corrections = [(key, *values) for key, values in self._corrections.items()]
+            self._totals = defaultdict(float)
+            self._max_time_ms = 0.0
+            self._corrections = {}
+        if not totals and not max_time_ms and not corrections:
+            return
+
+        try:
+            with self._db_lock:
+                conn = self._connect()
+                conn.executemany(
+                    "INSERT INTO totals VALUES (?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                    totals
+                )
+                if max_time_ms:
+                    conn.execute(
+                        "INSERT INTO totals VALUES ('max_time_ms', ?) "
+                        "ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)",
+                        (max_time_ms,)
+                    )
+                conn.executemany(
+                    "INSERT INTO corrections VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET count = count + excluded.count",
+                    corrections
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось сохранить статистику Gemini: {e}")
+
+    def load(self) -> Tuple[Dict[str, float], List[CorrectionEntry]]:
+        """Итоги и исправления из базы (при первом запуске — перенос из gemini_stats.json)."""
+        try:
+            with self._db_lock:
+                conn = self._connect()
+                totals = dict(conn.execute("SELECT name, value FROM totals").fetchall())
+                if not totals and STATS_FILE.exists():
+                    self._migrate_json(conn)
+                    totals = dict(conn.execute("SELECT name, value FROM totals").fetchall())
+                corrections = [
+                    CorrectionEntry(original, corrected, kind, count)
+                    for original, corrected, kind, count in conn.execute(
+                        "SELECT original, corrected, type, count FROM corrections"
+                    )
+                ]
+        except sqlite3.Error as e:
+            logger.warning(f"Статистика Gemini недоступна: {e}")
+            return {}, []
+        known = set(_SUMMED) | {"max_time_ms"}
+        return {name: value for name, value in totals.items() if name in known}, corrections
+
+    @staticmethod
+    def _migrate_json(conn: sqlite3.Connection) -> None:
+        """Перенести статистику из gemini_stats.json и переименовать файл в .bak."""
         try:
             data = json.loads(STATS_FILE.read_text(encoding='utf-8'))
-            # session_calls не загружается, остаётся 0
-            return cls(**data)
-        except Exception as e:
-            print(f"Failed to load stats: {e}")
-            return cls()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать {STATS_FILE}: {e}")
+            return
+        conn.executemany(
+            "INSERT OR REPLACE INTO totals VALUES (?, ?)",
+            [(name, data[name]) for name in (*_SUMMED, "max_time_ms") if isinstance(data.get(name), (int, float))]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO corrections VALUES (?, ?, ?, ?, ?)",
+            [
+                (key, entry["original"], entry["corrected"], entry["type"], entry.get("count", 1))
+                for key, entry in (data.get("detailed_corrections") or {}).items()
+            ]
+        )
+        conn.commit()
+        try:
+            STATS_FILE.replace(STATS_FILE.with_name(STATS_FILE.name + ".bak"))
+        except OSError as e:
+            logger.warning(f"Не удалось переименовать {STATS_FILE}: {e}")
+        logger.info(f"Статистика Gemini перенесена из {STATS_FILE} в {STATS_DB}")
+
+    def clear(self) -> None:
+        """Удалить всю статистику (в том числе ещё не записанную)."""
+        with self._pending_lock:
+            self._totals = defaultdict(float)
+            self._max_time_ms = 0.0
+            self._corrections = {}
+        try:
+            with self._db_lock:
+                conn = self._connect()
+                conn.execute("DELETE FROM totals")
+                conn.execute("DELETE FROM corrections")
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось очистить статистику Gemini: {e}")
+
+    def close(self) -> None:
+        """Остановить фоновую запись и записать оставшееся."""
+        self._closing.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
 
 
-# Глобальный экземпляр
+# Глобальные экземпляры
+_store: Optional[StatsStore] = None
 _stats: Optional[GeminiStats] = None
 
 
+def get_store() -> StatsStore:
+    """Получить хранилище статистики (оставшиеся изменения записываются при выходе)."""
+    global _store
+    if _store is None:
+        _store = StatsStore()
+        atexit.register(_store.close)
+    return _store
+
+
 def get_stats() -> GeminiStats:
     """Получить глобальный экземпляр статистики."""
     global _stats
@@ -111,5 +372,5 @@ def get_stats() -> GeminiStats:
 def reset_stats() -> None:
     """Сбросить статистику (для тестирования)."""
     global _stats
+    get_store().clear()
     _stats = GeminiStats()
-    _stats.save()
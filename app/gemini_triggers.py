@@ -11,7 +11,9 @@
 import re
 import logging
 from pathlib import Path
-from typing import List, Pattern
+from typing import Iterator, List, NamedTuple, Pattern
+
+from app.file_watch import WatchedFile
 
 logger = logging.getLogger(__name__)
 
@@ -20,8 +22,11 @@ TRIGGERS_FILE = Path(__file__).parent.parent / "gemini_triggers.txt"
 
 # Глобальная переменная с текущими триггерами
 _triggers: List[str] = []
-_trigger_map: dict[str, str] = {} # clean -> original (stressed)
-_compiled_regex: Pattern | None = None
+_index: "TriggerIndex | None" = None
+
+# Отслеживание изменений файла: индекс пересобирается только при изменении содержимого
+_watch = WatchedFile(TRIGGERS_FILE)
+_version = 0
 
 
 def strip_stress(text: str) -> str:
@@ -42,14 +47,11 @@ def load_triggers() -> List[str]:
         - Поддержка wildcards: звезд* → ловит все формы
         - Поддержка ударений: Се́лигман (сохраняется для подсказки)
     """
-    global _trigger_map
-    
     if not TRIGGERS_FILE.exists():
         logger.warning(f"Файл триггеров не найден: {TRIGGERS_FILE}")
         return []
     
     triggers = []
-    _trigger_map = {}
     
     try:
         with open(TRIGGERS_FILE, 'r', encoding='utf-8') as f:
@@ -60,16 +62,9 @@ def load_triggers() -> List[str]:
                 if not line or line.startswith('#'):
                     continue
                 
-                # Сохраняем оригинал (возможно с ударением)
-                original = line
-                # Создаем чистую версию для поиска
-                clean = strip_stress(original)
-                
-                triggers.append(original)
-                
-                # Сохраняем маппинг: clean (lowercase) -> original
-                # Если wildcard, маппинг сложнее, но для подсказки нам нужен сам паттерн
-                _trigger_map[clean.lower()] = original
+                # Сохраняем оригинал (возможно с ударением):
+                # TriggerIndex ищет по чистой форме и отдаёт оригинал как подсказку
+                triggers.append(line)
         
         logger.info(f"Загружено {len(triggers)} триггеров из {TRIGGERS_FILE}")
         
@@ -111,16 +106,122 @@ def save_triggers(triggers: List[str]) -> bool:
         return False
 
 
-def compile_triggers_regex() -> Pattern:
-    """Компилирует regex паттерн из списка триггеров.
+class TriggerMatch(NamedTuple):
+    """Найденный триггер: позиция в тексте, слово и подсказка для Gemini."""
+    start: int
+    end: int
+    word: str
+    hint: str  # оригинальная форма триггера (возможно с ударением)
+
+
+class TriggerIndex:
+    """Индекс триггеров для поиска за один проход по словам текста.
     
-    Returns:
-        Скомпилированный regex паттерн
+    Точные триггеры хранятся в хеш-таблице (ключ — нижний регистр), wildcards
+    вида «корень*» — в префиксном дереве. Текст разбивается на слова один раз,
+    и для каждого слова поиск занимает O(длины слова) независимо от числа
+    триггеров. Редкие триггеры, которые не сводятся к одному слову
+    (с пробелами, дефисами или * в середине), проверяются отдельным regex.
+    """
+    
+    _TOKEN_RE = re.compile(r'\w+')
+    
+    def __init__(self, triggers: List[str]) -> None:
+        self._exact: dict[str, str] = {}
+        self._prefix_trie: dict = {}
+        self._complex: List[tuple[Pattern, str]] = []
         
-    Wildcards конвертируются:
-        звезд* → звезд\\w*
+        for trigger in triggers:
+            clean = strip_stress(trigger).lower()
+            
+            if '*' not in clean:
+                if self._TOKEN_RE.fullmatch(clean):
+                    # Первый триггер выигрывает (как в alternation-regex)
+                    self._exact.setdefault(clean, trigger)
+                    continue
+            else:
+                prefix, _, rest = clean.partition('*')
+                if (not rest or rest == '*') and self._TOKEN_RE.fullmatch(prefix):
+                    node = self._prefix_trie
+                    for char in prefix:
+                        node = node.setdefault(char, {})
+                    node.setdefault('', trigger)
+                    continue
+            
+            # Заменяем * на \w* (любые буквы)
+            pattern = r'\w*'.join(re.escape(part) for part in clean.split('*'))
+            self._complex.append((re.compile(r'\b' + pattern + r'\b', re.IGNORECASE), trigger))
+    
+    def __len__(self) -> int:
+        return len(self._exact) + len(self._complex) + self._count_prefixes(self._prefix_trie)
+    
+    @classmethod
+    def _count_prefixes(cls, node: dict) -> int:
+        return sum(1 if key == '' else cls._count_prefixes(child) for key, child in node.items())
+    
+    def _lookup(self, word: str) -> str | None:
+        """Подсказка для слова или None, если слово не является триггером."""
+        hint = self._exact.get(word)
+        if hint is not None:
+            return hint
+        
+        node = self._prefix_trie
+        if not node:
+            return None
+        # Самый короткий подходящий префикс (порядок в файле для wildcards не важен)
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return None
+            if '' in node:
+                return node['']
+        return None
+    
+    def finditer(self, text: str) -> Iterator[TriggerMatch]:
+        """Все вхождения триггеров в тексте (по порядку для словных триггеров)."""
+        lowered = text.lower()
+        aligned = len(lowered) == len(text)
+        
+        for token in self._TOKEN_RE.finditer(text):
+            word = lowered[token.start():token.end()] if aligned else token.group(0).lower()
+            hint = self._lookup(word)
+            if hint is not None:
+                yield TriggerMatch(token.start(), token.end(), token.group(0), hint)
+        
+        for pattern, hint in self._complex:
+            for match in pattern.finditer(text):
+                yield TriggerMatch(match.start(), match.end(), match.group(0), hint)
+    
+    def find(self, text: str) -> List[TriggerMatch]:
+        """Список вхождений триггеров."""
+        return list(self.finditer(text))
+    
+    def search(self, text: str) -> TriggerMatch | None:
+        """Первое найденное вхождение или None."""
+        return next(self.finditer(text), None)
+    
+    def findall(self, text: str) -> List[str]:
+        """Найденные слова (как re.findall для прежнего regex)."""
+        return [match.word for match in self.finditer(text)]
+    
+    def hint_for(self, word: str) -> str | None:
+        """Подсказка для отдельного слова."""
+        clean = strip_stress(word).lower()
+        hint = self._lookup(clean)
+        if hint is None:
+            for pattern, complex_hint in self._complex:
+                if pattern.fullmatch(clean):
+                    return complex_hint
+        return hint
+
+
+def build_trigger_index() -> TriggerIndex:
+    """Строит индекс триггеров из текущего списка.
+    
+    Returns:
+        Индекс для поиска триггеров в тексте
     """
-    global _triggers, _compiled_regex
+    global _triggers, _index
     
     # Загружаем триггеры если ещё не загружены
     if not _triggers:
@@ -131,109 +232,75 @@ def compile_triggers_regex() -> Pattern:
         logger.warning("Используются дефолтные триггеры")
         _triggers = ["все", "еще", "ещё", "нес", "шел", "шёл", "вел", "вёл", "звезд*"]
     
-    # Конвертируем wildcards в regex
-    regex_parts = []
-    for trigger in _triggers:
-        # Trigger might have stress, so strip it for regex
-        clean_trigger = strip_stress(trigger)
-        
-        if '*' in clean_trigger:
-            # Заменяем * на \w* (любые буквы)
-            pattern = clean_trigger.replace('*', r'\w*')
-            regex_parts.append(pattern)
-        else:
-            # Точное совпадение
-            regex_parts.append(re.escape(clean_trigger))
-    
-    # Объединяем все паттерны через |
-    full_pattern = r'\b(' + '|'.join(regex_parts) + r')\b'
-    
-    _compiled_regex = re.compile(full_pattern, re.IGNORECASE)
+    _index = TriggerIndex(_triggers)
     
-    logger.info(f"Скомпилирован regex для {len(_triggers)} триггеров")
+    logger.info(f"Построен индекс для {len(_triggers)} триггеров")
     
-    return _compiled_regex
+    return _index
 
 
-def reload_triggers() -> Pattern:
-    """Перезагружает триггеры из файла и перекомпилирует regex.
+def reload_triggers() -> TriggerIndex:
+    """Перезагружает триггеры из файла и перестраивает индекс.
     
     Returns:
-        Новый скомпилированный regex паттерн
+        Новый индекс триггеров
     """
     global _triggers
     
     _triggers = load_triggers()
-    return compile_triggers_regex()
+    return build_trigger_index()
 
 
-def get_triggers() -> List[str]:
-    """Возвращает текущий список триггеров (чистых).
+def refresh_triggers() -> TriggerIndex:
+    """Возвращает актуальный индекс, пересобирая его только при изменении файла.
+    
+    Файл опрашивается по mtime/размеру (не чаще раза в секунду), перечитывается
+    и индекс перестраивается лишь при изменении хеша содержимого.
     
     Returns:
-        Список триггеров
+        Индекс для поиска триггеров
     """
-    global _triggers
+    global _version
     
-    if not _triggers:
-        _triggers = load_triggers()
+    if _watch.check() or _index is None:
+        reload_triggers()
+        _version += 1
     
-    return _triggers.copy()
+    return _index
 
 
-def get_regex() -> Pattern:
-    """Возвращает текущий скомпилированный regex.
+def get_version() -> int:
+    """Версия набора триггеров (растёт при каждом изменении файла).
     
     Returns:
-        Regex паттерн для проверки триггеров
+        Номер версии для ключей кешей
     """
-    global _compiled_regex
+    return _version
+
+
+def get_triggers() -> List[str]:
+    """Возвращает текущий список триггеров (чистых).
     
-    if _compiled_regex is None:
-        _compiled_regex = compile_triggers_regex()
+    Returns:
+        Список триггеров
+    """
+    global _triggers
     
-    return _compiled_regex
+    if not _triggers:
+        _triggers = load_triggers()
+    
+    return _triggers.copy()
 
 
-def get_hints_for_matches(matches: List[str]) -> List[str]:
-    """Возвращает оригинальные (возможно с ударениями) формы для найденных совпадений.
+def get_index() -> TriggerIndex:
+    """Возвращает текущий индекс триггеров.
     
-    Args:
-        matches: Список слов, найденных в тексте (без ударений)
-        
     Returns:
-        Список уникальных подсказок (слов с ударениями из словаря)
+        Индекс для поиска триггеров
     """
-    global _trigger_map
+    global _index
     
-    hints = set()
+    if _index is None:
+        _index = build_trigger_index()
     
-    for match in matches:
-        match_lower = match.lower()
-        
-        # 1. Прямое совпадение
-        if match_lower in _trigger_map:
-            hints.add(_trigger_map[match_lower])
-            continue
-            
-        # 2. Поиск по wildcard (если не нашли прямого)
-        # Это сложнее, так как map хранит clean -> original.
-        # Если match="звездами", а trigger="звезд*", то в map лежит "звезд*" -> "звезд*".
-        # Но если trigger="Се́лигман*", то clean="Селигман*", original="Се́лигман*".
-        # Нам нужно найти, какой ключ из map матчится с match.
-        
-        found = False
-        for clean_key, original_val in _trigger_map.items():
-            if '*' in clean_key:
-                # Превращаем ключ в regex
-                pattern = '^' + re.escape(clean_key).replace(r'\*', r'.*') + '$'
-                if re.match(pattern, match_lower):
-                    hints.add(original_val)
-                    found = True
-                    break # Берем первое совпадение
-        
-        if not found:
-            # Если не нашли в словаре (странно, если regex сработал), возвращаем как есть
-            hints.add(match)
-            
-    return list(hints)
+    return _index
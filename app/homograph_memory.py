@@ -0,0 +1,314 @@
+"""Локальная память разрешения омографов.
+
+Каждое принятое исправление Gemini и каждый ручной выбор IPA-варианта
+записываются как наблюдение: слово-триггер (без учёта регистра и «ё»),
+его контекст и выбранная форма — без изменений, с «ё» или с тегом
+<phoneme>. Контекст хранится на нескольких уровнях точности: два слова
+слева и справа, по одному слову с каждой стороны, только левая или только
+правая пара слов. Слово без контекста не решает: омограф и есть слово,
+форма которого зависит от контекста.
+
+При обработке нового текста слово разрешается по самому точному уровню,
+на котором набралось достаточно наблюдений, и только если одна форма
+явно преобладает. Предложения, все триггеры которых разрешены локально,
+в Gemini не отправляются (кроме выборочной проверки, см.
+text_pipeline.OFFLINE_AUDIT_RATE).
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MEMORY_FILE = Path("homograph_memory.sqlite3")
+
+# Уровни контекста (слов слева, слов справа) и минимальный вес наблюдений на уровне
+_LEVELS: Tuple[Tuple[str, int, int, float], ...] = (
+    ("l2r2", 2, 2, 2.0),
+    ("l1r1", 1, 1, 3.0),
+    ("l2", 2, 0, 4.0),
+    ("r2", 0, 2, 4.0),
+)
+# Доля веса, которую должна набрать форма, чтобы разрешать слово без Gemini
+MIN_CONFIDENCE = 0.9
+# Ручной выбор IPA-варианта весит больше ответа Gemini
+MANUAL_PICK_WEIGHT = 3.0
+
+KEEP = "keep"
+
+# Слово (части через дефис — одно слово) или тег <phoneme> целиком; прочие теги пропускаются
+# (слово первым: в обычном тексте оно совпадает сразу, без попыток разобрать тег)
+_TOKEN_RE = re.compile(
+    r"(\w+(?:-\w+)*)|(<phoneme alphabet=(['\"])ipa\3 ph=(['\"])([^'\"<>]+)\4>([^<]+)</phoneme>)|<[^>]*>"
+)
+_PHONEME_RE = re.compile(r"<phoneme alphabet=(['\"])ipa\1 ph=(['\"])([^'\"<>]+)\2>([^<]+)</phoneme>")
+_SENTENCE_END_RE = re.compile(r'[.!?…\n]')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    word TEXT NOT NULL,
+    context TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    weight REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (word, context, resolution)
+);
+"""
+
+
+def tokenize(text: str) -> List[Tuple[int, int, str, Optional[str]]]:
+    """Слова текста: (начало, конец, слово, IPA из тега <phoneme> или None)."""
+    result = []
+    append = result.append
+    for match in _TOKEN_RE.finditer(text):
+        word = match.group(1)
+        if word is not None:
+            append((match.start(), match.end(), word, None))
+        elif match.group(2):
+            append((match.start(), match.end(), match.group(6), match.group(5)))
+    return result
+
+
+def word_key(word: str) -> str:
+    """Слово для ключа: нижний регистр, «ё» → «е»."""
+    return word.lower().replace('ё', 'е')
+
+
+def _contexts(words: Sequence[str], position: int) -> List[Tuple[str, float, str]]:
+    """Ключи контекста слова на каждом уровне: (уровень, мин. вес, ключ)."""
+    padded = ["^", "^"] + [word_key(word) for word in words] + ["$", "$"]
+    at = position + 2
+    result = []
+    for level, left, right, support in _LEVELS:
+        before = " ".join(padded[at - left:at])
+        after = " ".join(padded[at + 1:at + 1 + right])
+        result.append((level, support, f"{level}:{before}|{after}"))
+    return result
+
+
+def resolution_for(word: str, ipa: Optional[str]) -> str:
+    """Форма слова в исправленном тексте: 'keep', 'yo:всё' или 'ipa:<транскрипция>'."""
+    if ipa:
+        return f"ipa:{ipa}"
+    if 'ё' in word.lower():
+        return f"yo:{word.lower()}"
+    return KEEP
+
+
+def apply_resolution(word: str, resolution: str) -> str:
+    """Применяет сохранённую форму к слову текста (регистр исходного слова сохраняется)."""
+    if resolution.startswith("ipa:"):
+        return f"<phoneme alphabet='ipa' ph='{resolution[4:]}'>{word}</phoneme>"
+    if resolution.startswith("yo:"):
+        form = resolution[3:]
+        if len(form) != len(word) or word_key(form) != word_key(word):
+            return word
+        return ''.join(
+            ('Ё' if char.isupper() else 'ё') if target == 'ё' and char in 'еЕ' else char
+            for char, target in zip(word, form)
+        )
+    return word
+
+
+class HomographMemory:
+    """Наблюдения за разрешением омографов в файле SQLite."""
+
+    def __init__(self, path: Path = MEMORY_FILE) -> None:
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        # Соединение используется из GUI (ручной выбор) и из потока TtsWorker
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _record(self, words: Sequence[str], position: int, resolution: str, weight: float) -> None:
+        now = time.time()
+        word = word_key(words[position])
+        conn = self._connect()
+        conn.executemany(
+            "INSERT INTO observations VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (word, context, resolution) "
+            "DO UPDATE SET weight = weight + excluded.weight, updated_at = excluded.updated_at",
+            [(word, context, resolution, weight, now) for _, _, context in _contexts(words, position)]
+        )
+
+    def learn(self, original: str, corrected: str, spans: Sequence[Tuple[int, int]], weight: float = 1.0) -> int:
+        """Запоминает, как исправлены слова-триггеры.
+
+        Args:
+            original: Текст, отправленный в Gemini (предложение, реплика или абзац)
+            corrected: Принятый ответ (отличается только «ё» и тегами <phoneme>)
+            spans: Позиции слов-триггеров в original
+            weight: Вес наблюдения
+
+        Returns:
+            int: Число записанных наблюдений (0, если ответ не сопоставлен с текстом)
+        """
+        before, after = tokenize(original), tokenize(corrected)
+        if len(before) != len(after) or any(
+            word_key(old[2]) != word_key(new[2]) for old, new in zip(before, after)
+        ):
+            return 0
+
+        positions = {(start, end): i for i, (start, end, _, ipa) in enumerate(before) if ipa is None}
+        words = [token[2] for token in before]
+        learned = 0
+        try:
+            with self._lock:
+                for span in spans:
+                    i = positions.get(tuple(span))
+                    if i is None:
+                        continue
+                    self._record(words, i, resolution_for(after[i][2], after[i][3]), weight)
+                    learned += 1
+                self._connect().commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось сохранить наблюдения омографов: {e}")
+            return 0
+        return learned
+
+    def record_pick(self, text: str, start: int, end: int, tag: str) -> bool:
+        """Запоминает ручной выбор IPA-варианта для слова text[start:end].
+
+        Args:
+            text: Текст редактора до вставки тега
+            start: Начало выделения
+            end: Конец выделения
+            tag: Вставленный тег <phoneme>
+
+        Returns:
+            bool: True, если выбор записан
+        """
+        match = _PHONEME_RE.fullmatch(tag.strip())
+        if not match:
+            return False
+
+        # Контекст — предложение, в котором стоит слово (как при обработке текста)
+        left = max((m.end() for m in _SENTENCE_END_RE.finditer(text, 0, start)), default=0)
+        right_match = _SENTENCE_END_RE.search(text, end)
+        right = right_match.start() + 1 if right_match else len(text)
+        tokens = tokenize(text[left:right])
+        positions = [i for i, token in enumerate(tokens) if token[0] < end - left and token[1] > start - left]
+        if len(positions) != 1 or tokens[positions[0]][3] is not None:
+            return False
+
+        words = [token[2] for token in tokens]
+        try:
+            with self._lock:
+                self._record(words, positions[0], f"ipa:{match.group(3)}", MANUAL_PICK_WEIGHT)
+                self._connect().commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось сохранить выбор ударения: {e}")
+            return False
+        return True
+
+    def resolve(self, text: str, spans: Sequence[Tuple[int, int]]) -> List[Optional[str]]:
+        """Разрешает слова-триггеры по накопленным наблюдениям.
+
+        Args:
+            text: Текст (предложение, реплика или абзац)
+            spans: Позиции слов-триггеров
+
+        Returns:
+            List[Optional[str]]: Для каждой позиции — слово в итоговой форме
+            (без изменений, с «ё» или в теге <phoneme>) или None, если
+            уверенного решения нет
+        """
+        tokens = tokenize(text)
+        positions = {(start, end): i for i, (start, end, _, ipa) in enumerate(tokens) if ipa is None}
+        words = [token[2] for token in tokens]
+        result: List[Optional[str]] = []
+        try:
+            with self._lock:
+                conn = self._connect()
+                for span in spans:
+                    i = positions.get(tuple(span))
+                    resolution = None if i is None else self._decide(conn, words, i)
+                    result.append(None if resolution is None else apply_resolution(words[i], resolution))
+        except sqlite3.Error as e:
+            logger.warning(f"Память омографов недоступна: {e}")
+            return [None] * len(spans)
+        return result
+
+    @staticmethod
+    def _decide(conn: sqlite3.Connection, words: Sequence[str], position: int) -> Optional[str]:
+        """Форма слова по самому точному уровню контекста с достаточным числом наблюдений."""
+        word = word_key(words[position])
+        for _, support, context in _contexts(words, position):
+            rows = conn.execute(
+                "SELECT resolution, weight FROM observations WHERE word = ? AND context = ?",
+                (word, context)
+            ).fetchall()
+            total = sum(weight for _, weight in rows)
+            if total < support:
+                continue
+            resolution, weight = max(rows, key=lambda row: row[1])
+            # Самый точный уровень с данными решает: при разногласии — к Gemini
+            return resolution if weight / total >= MIN_CONFIDENCE else None
+        return None
+
+    def observations(self, level: str) -> List[Tuple[str, str, str, float]]:
+        """Наблюдения одного уровня контекста: (слово, ключ контекста, форма, вес).
+
+        Args:
+            level: Уровень контекста ("l2r2", "l1r1", "l2" или "r2")
+        """
+        try:
+            with self._lock:
+                return self._connect().execute(
+                    "SELECT word, context, resolution, weight FROM observations WHERE context LIKE ?",
+                    (f"{level}:%",)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Память омографов недоступна: {e}")
+            return []
+
+    def clear(self) -> None:
+        """Удалить все наблюдения."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("DELETE FROM observations")
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось очистить память омографов: {e}")
+
+    def __len__(self) -> int:
+        """Число запомненных слов."""
+        try:
+            with self._lock:
+                return self._connect().execute(
+                    "SELECT COUNT(DISTINCT word) FROM observations"
+                ).fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Глобальный экземпляр
+_memory: Optional[HomographMemory] = None
+
+
+def get_memory() -> HomographMemory:
+    """Получить глобальный экземпляр памяти омографов."""
+    global _memory
+    if _memory is None:
+        _memory = HomographMemory()
+    return _memory
@@ -1,27 +1,105 @@
+import json
 import logging
-from typing import List, Tuple
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
 from google.genai import types
-from app.gemini_client import create_client
+from app.gemini_client import get_sync_client
 
 logger = logging.getLogger(__name__)
 
-def generate_ipa_variants(word: str) -> List[Tuple[str, str]]:
-    """
-    Asks Gemini to generate IPA variants for a Russian word.
-    Returns a list of tuples: (IPA_tag, description).
-    
-    Example return:
-    [
-        ("<phoneme alphabet='ipa' ph='ˈza.mək'>замок</phoneme>", "Дворец / Building"),
-        ("<phoneme alphabet='ipa' ph='zɐ.ˈmok'>замок</phoneme>", "Запирающее устройство / Lock")
-    ]
-    """
-    client = create_client()
-    if not client:
-        logger.warning("Gemini client not initialized. Cannot generate IPA.")
-        return []
+IPA_MODEL = "gemini-2.5-flash"
+
+# Persistent per-word cache of IPA variants (pronunciations do not go stale)
+VARIANTS_FILE = Path("ipa_variants.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS variants (
+    word TEXT PRIMARY KEY,
+    variants TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def make_ipa_tag(word: str, ipa: str) -> str:
+    """Build the SSML phoneme tag for a word."""
+    return f"<phoneme alphabet='ipa' ph='{ipa}'>{word}</phoneme>"
+
+
+class IpaVariantCache:
+    """IPA variants per word (lower case, 'ё' kept) in an SQLite file."""
+
+    def __init__(self, path: Path = VARIANTS_FILE) -> None:
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        # Used from the UI thread and from the lookup thread
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get(self, word: str) -> Optional[List[Tuple[str, str]]]:
+        """Return cached (IPA, description) pairs or None if the word was never looked up."""
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT variants FROM variants WHERE word = ?", (word.lower(),)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"IPA variant cache unavailable: {e}")
+            return None
+        if row is None:
+            return None
+        return [tuple(pair) for pair in json.loads(row[0])]
+
+    def put(self, word: str, variants: List[Tuple[str, str]]) -> None:
+        """Store (IPA, description) pairs for a word (database errors are only logged)."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO variants VALUES (?, ?, ?)",
+                    (word.lower(), json.dumps(variants, ensure_ascii=False), time.time())
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to cache IPA variants for '{word}': {e}")
+
+    def __len__(self) -> int:
+        try:
+            with self._lock:
+                return self._connect().execute("SELECT COUNT(*) FROM variants").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Global instance
+_cache: Optional[IpaVariantCache] = None
+
+
+def get_variant_cache() -> IpaVariantCache:
+    """Return the global IPA variant cache."""
+    global _cache
+    if _cache is None:
+        _cache = IpaVariantCache()
+    return _cache
+
 
-    prompt = (
+def build_ipa_prompt(word: str) -> str:
+    return (
         f"Analyze the Russian word '{word}'. "
         "It is a homograph (or suspected homograph). "
         "Provide IPA pronunciations ONLY for meanings that match this EXACT spelling (case-insensitive). "
@@ -40,29 +118,73 @@ def generate_ipa_variants(word: str) -> List[Tuple[str, str]]:
         "Strictly follow the format. No extra text."
     )
 
-    try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.1,
-            )
+
+def request_ipa_variants(word: str) -> List[Tuple[str, str]]:
+    """Ask Gemini for the IPA variants of a word and cache a non-empty answer.
+
+    Blocks for the length of a Gemini call: use from a background thread
+    (see app.ipa_lookup.IpaLookupWorker).
+
+    Returns:
+        List of (IPA, description) pairs (empty if Gemini gave none)
+
+    Raises:
+        RuntimeError: If the Gemini client is not initialized
+        Exception: Any error of the Gemini request
+    """
+    client = get_sync_client()
+    if not client:
+        raise RuntimeError("Gemini client not initialized")
+
+    response = client.models.generate_content(
+        model=IPA_MODEL,
+        contents=build_ipa_prompt(word),
+        config=types.GenerateContentConfig(
+            temperature=0.1,
         )
-        
-        result = []
-        if response.text:
-            lines = response.text.strip().split('\n')
-            for line in lines:
-                parts = line.split('|')
-                if len(parts) == 2:
-                    ipa = parts[0].strip()
-                    desc = parts[1].strip()
-                    # Construct the SSML tag
-                    tag = f"<phoneme alphabet='ipa' ph='{ipa}'>{word}</phoneme>"
-                    result.append((tag, desc))
-        
-        return result
+    )
+
+    result = []
+    if response.text:
+        lines = response.text.strip().split('\n')
+        for line in lines:
+            parts = line.split('|')
+            if len(parts) == 2:
+                result.append((parts[0].strip(), parts[1].strip()))
+
+    if result:
+        get_variant_cache().put(word, result)
+    return result
+
+
+def get_cached_ipa_variants(word: str) -> Optional[List[Tuple[str, str]]]:
+    """Return cached variants as (IPA_tag, description) or None if not cached yet."""
+    cached = get_variant_cache().get(word)
+    if cached is None:
+        return None
+    return [(make_ipa_tag(word, ipa), desc) for ipa, desc in cached]
+
 
+def generate_ipa_variants(word: str) -> List[Tuple[str, str]]:
+    """
+    Asks Gemini to generate IPA variants for a Russian word (cached per word).
+    Returns a list of tuples: (IPA_tag, description).
+
+    Example return:
+    [
+        ("<phoneme alphabet='ipa' ph='ˈza.mək'>замок</phoneme>", "Дворец / Building"),
+        ("<phoneme alphabet='ipa' ph='zɐ.ˈmok'>замок</phoneme>", "Запирающее устройство / Lock")
+    ]
+    """
+    cached = get_cached_ipa_variants(word)
+    if cached is not None:
+        return cached
+
+    try:
+        return [(make_ipa_tag(word, ipa), desc) for ipa, desc in request_ipa_variants(word)]
+    except RuntimeError as e:
+        logger.warning(f"{e}. Cannot generate IPA.")
+        return []
     except Exception as e:
         logger.error(f"Error generating IPA for '{word}': {e}")
         return []
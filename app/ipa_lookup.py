@@ -0,0 +1,153 @@
+"""Background IPA variant lookup, so the editor never waits for Gemini."""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import queue
+import threading
+from typing import Dict, Iterable, Optional, Set
+
+from PySide6.QtCore import QThread, Signal
+
+from app.gemini_rate_limit import estimate_tokens, get_rate_limiter, is_rate_limit_error
+from app.ipa_helper import build_ipa_prompt, get_cached_ipa_variants, make_ipa_tag, request_ipa_variants
+
+# Lookup priorities: the word the user asked for, trigger matches in the editor, the triggers file
+PRIORITY_USER = 0
+PRIORITY_EDITOR = 1
+PRIORITY_TRIGGERS = 2
+
+# Prefetch uses spare Gemini quota only: this many requests per minute stay free for TTS jobs
+PREFETCH_RESERVE_RPM = 3
+# Pause before the next prefetch attempt when there is no spare quota, s
+PREFETCH_RETRY_DELAY = 5.0
+
+
+class IpaLookupWorker(QThread):
+    variants_ready = Signal(str, list)  # word, [(IPA_tag, description)] for a user lookup
+    lookup_failed = Signal(str, str)  # word, error message for a user lookup
+
+    def __init__(self, logger: Optional[logging.Logger] = None) -> None:
+        super().__init__()
+        self.logger = logger or logging.getLogger(__name__)
+        self._queue: "queue.PriorityQueue[tuple]" = queue.PriorityQueue()
+        self._order = itertools.count()
+        # Best queued priority per word: duplicate prefetch requests are dropped
+        self._queued: Dict[str, int] = {}
+        # Words Gemini gave nothing for (or failed on) during prefetch; not retried
+        self._failed: Set[str] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+    def lookup(self, word: str) -> None:
+        """Look up a word for the user; the result arrives via variants_ready or lookup_failed."""
+        self._enqueue(word, PRIORITY_USER)
+        self._wakeup.set()
+
+    def prefetch(self, words: Iterable[str], priority: int = PRIORITY_EDITOR, retry_failed: bool = False) -> int:
+        """Queue words whose variants are not cached yet.
+
+        Args:
+            words: Words to look up in the background
+            priority: PRIORITY_EDITOR or PRIORITY_TRIGGERS
+            retry_failed: Retry words that failed before (e.g. after the API key changed)
+
+        Returns:
+            int: Number of queued words
+        """
+        if retry_failed:
+            with self._lock:
+                self._failed.clear()
+        queued = 0
+        for word in dict.fromkeys(words):
+            key = word.lower()
+            with self._lock:
+                if key in self._failed or self._queued.get(key, priority + 1) <= priority:
+                    continue
+            if get_cached_ipa_variants(word) is not None:
+                continue
+            self._enqueue(word, priority)
+            queued += 1
+        return queued
+
+    def _enqueue(self, word: str, priority: int) -> None:
+        with self._lock:
+            key = word.lower()
+            self._queued[key] = min(priority, self._queued.get(key, priority))
+        self._queue.put((priority, next(self._order), word))
+
+    def stop(self) -> None:
+        """Stop the lookup thread and wait for it to finish.
+
+        A request in flight is not interrupted: the wait is bounded by the
+        HTTP timeout of the sync Gemini client (SYNC_REQUEST_TIMEOUT).
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        self._queue.put((-1, -1, ""))
+        if not self.wait(3000):
+            self.logger.info("Waiting for the IPA request in flight to finish...")
+            self.wait()
+
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            priority, _, word = self._queue.get()
+            if self._stopping.is_set():
+                break
+            key = word.lower()
+            with self._lock:
+                best = self._queued.get(key)
+                if best is not None and best < priority:
+                    # A more urgent request for the same word is queued
+                    continue
+                self._queued.pop(key, None)
+
+            if priority == PRIORITY_USER:
+                self._lookup_for_user(word)
+            else:
+                self._prefetch_one(word, priority)
+
+    def _lookup_for_user(self, word: str) -> None:
+        cached = get_cached_ipa_variants(word)
+        if cached is not None:
+            self.variants_ready.emit(word, cached)
+            return
+        # Shares the quota with TTS jobs: wait for capacity instead of risking 429s
+        if not get_rate_limiter().acquire_blocking(estimate_tokens(build_ipa_prompt(word)), self._stopping):
+            return
+        try:
+            variants = request_ipa_variants(word)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                get_rate_limiter().pause(PREFETCH_RETRY_DELAY)
+            self.logger.error(f"Error generating IPA for '{word}': {e}")
+            self.lookup_failed.emit(word, str(e))
+            return
+        self.variants_ready.emit(word, [(make_ipa_tag(word, ipa), desc) for ipa, desc in variants])
+
+    def _prefetch_one(self, word: str, priority: int) -> None:
+        if get_cached_ipa_variants(word) is not None:
+            return
+        if not get_rate_limiter().try_acquire(estimate_tokens(build_ipa_prompt(word)), PREFETCH_RESERVE_RPM):
+            # No spare quota: wait (a user lookup wakes the thread up) and retry later
+            self._wakeup.wait(PREFETCH_RETRY_DELAY)
+            self._wakeup.clear()
+            if not self._stopping.is_set():
+                self._enqueue(word, priority)
+            return
+        try:
+            variants = request_ipa_variants(word)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                get_rate_limiter().pause(PREFETCH_RETRY_DELAY)
+                self._enqueue(word, priority)
+                return
+            self.logger.debug(f"IPA prefetch for '{word}' failed: {e}")
+            variants = []
+        if not variants:
+            with self._lock:
+                self._failed.add(word.lower())
+            return
+        self.logger.debug(f"IPA variants prefetched: {word} ({len(variants)})")
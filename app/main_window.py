@@ -49,12 +49,17 @@ from .tts_worker import TtsWorker
 from .version import __version__
 from .voices import VOICE_CHOICES, VoiceOption
 from vless_manager import VLESSManager
-from app.srt_parser import parse_srt_file
+from app.subtitle_table import CueTable
 from app.voice_markers import generate_marked_text, parse_marked_text
-from app.ipa_helper import generate_ipa_variants
+from app.ipa_helper import get_cached_ipa_variants
+from app.ipa_lookup import PRIORITY_EDITOR, PRIORITY_TRIGGERS, IpaLookupWorker
+from app.homograph_memory import get_memory
 from PySide6.QtGui import QAction, QCursor
 from PySide6.QtWidgets import QMenu
-from PySide6.QtCore import QObject, Signal
+from PySide6.QtCore import QObject, QTimer, Signal
+
+# Pause after the last edit before trigger words of the editor are prefetched, ms
+IPA_PREFETCH_DELAY_MS = 1500
 
 class LogSignaler(QObject):
     """Helper class to emit signals from logging handler."""
@@ -137,8 +142,25 @@ class MainWindow(QMainWindow):
         if icon_path.exists():
             self.setWindowIcon(QIcon(str(icon_path)))
             
+        # Background IPA lookup for "✨ Исправить ударение": variants of trigger words
+        # (triggers file and matches in the editors) are prefetched into a persistent cache
+        self._pending_stress_fix: Optional[tuple] = None
+        self._gemini_ready = False
+        self._ipa_prefetch_retry = False
+        self._ipa_triggers_version: Optional[int] = None
+        self._ipa_prefetch_timer = QTimer(self)
+        self._ipa_prefetch_timer.setSingleShot(True)
+        self._ipa_prefetch_timer.setInterval(IPA_PREFETCH_DELAY_MS)
+        self._ipa_prefetch_timer.timeout.connect(self._prefetch_ipa_variants)
+        self.ipa_lookup = IpaLookupWorker(logger=self.logger)
+        self.ipa_lookup.variants_ready.connect(self._on_ipa_variants_ready)
+        self.ipa_lookup.lookup_failed.connect(self._on_ipa_lookup_failed)
+        self.ipa_lookup.start()
+
         self.resize(900, 700)
         self._build_ui()
+        self.text_edit.textChanged.connect(self._ipa_prefetch_timer.start)
+        self.srt_preview.textChanged.connect(self._ipa_prefetch_timer.start)
         self._flush_log_buffer()
         self._apply_styles()
         self._load_settings()
@@ -199,6 +221,11 @@ class MainWindow(QMainWindow):
         try:
             init_client(api_key, http_proxy=proxy_url)
             self._info(f"Gemini клиент инициализирован (ключ: {api_key[:10]}...)")
+            # New key or proxy: prefetch again, including words that failed before
+            self._gemini_ready = True
+            self._ipa_prefetch_retry = True
+            self._ipa_triggers_version = None
+            self._ipa_prefetch_timer.start()
         except Exception as e:
             self._error(f"Ошибка инициализации Gemini: {e}")
 
@@ -251,7 +278,12 @@ class MainWindow(QMainWindow):
             f"Вызовов: <b>{stats.total_calls}</b> (сессия: <b>{stats.session_calls}</b>)<br>"
             f"Исправлений: <b>{stats.total_corrections}</b><br>"
             f"Среднее время: <b>{stats.avg_time_ms:.0f}</b> мс<br>"
-            f"Макс время: <b>{stats.max_time_ms:.0f}</b> мс"
+            f"Макс время: <b>{stats.max_time_ms:.0f}</b> мс<br>"
+            f"Из кеша: <b>{stats.cache_hits}</b> (сессия: <b>{stats.session_cache_hits}</b>, "
+            f"сэкономлено <b>{stats.cache_saved_ms / 1000:.0f}</b> с)<br>"
+            f"Таймаутов: <b>{stats.timeouts}</b> (сессия: <b>{stats.session_timeouts}</b>)<br>"
+            f"Без Gemini (память омографов): <b>{stats.offline_hits}</b> из <b>{stats.offline_lookups}</b> "
+            f"(<b>{stats.offline_hit_rate:.0%}</b>, сессия: <b>{stats.session_offline_hit_rate:.0%}</b>)"
         )
         
         if hasattr(self, 'stats_label'):
@@ -327,7 +359,7 @@ class MainWindow(QMainWindow):
             # Auto-sort dictionary before opening
             dictionary = get_dictionary()
             if dictionary:
-                dictionary.reload()  # Reload from file
+                dictionary.refresh(force=True)  # Pick up external edits
                 dictionary.save()    # Save with auto-sort
                 self._info("Словарь автоматически отсортирован")
             
@@ -346,14 +378,15 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Ошибка", f"Не удалось открыть файл словаря:\n{e}")
     
     def _reload_dictionary(self) -> None:
-        """Перезагрузить словарь замен."""
+        """Перезагрузить словарь замен, если файл изменился с прошлой проверки."""
         from app.custom_dictionary import get_dictionary
         
         try:
             dictionary = get_dictionary()
-            if dictionary:
-                dictionary.reload()
-                self.logger.debug(f"Словарь перезагружен: {len(dictionary.replacements)} пар")
+            if dictionary and dictionary.refresh():
+                self.logger.debug(
+                    f"Словарь перезагружен: {len(dictionary.replacements)} пар (версия {dictionary.version})"
+                )
         except Exception as e:
             self.logger.error(f"Ошибка перезагрузки словаря: {e}")
     
@@ -1064,7 +1097,9 @@ class MainWindow(QMainWindow):
             output_format=quality,
             gemini_enabled=self.config.gemini_enabled,
             use_stress=use_stress,
-            thinking_mode=thinking_mode
+            thinking_mode=thinking_mode,
+            gemini_stream=self.config.gemini_stream,
+            gemini_timeout=self.config.gemini_timeout
         )
 
     def on_preview(self) -> None:
@@ -1587,13 +1622,14 @@ class MainWindow(QMainWindow):
     # --- SRT Handlers ---
     def _on_load_srt(self) -> None:
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Выберите .srt файл", str(self.config.output_dir), "SRT Files (*.srt)"
+            self, "Выберите файл субтитров", str(self.config.output_dir),
+            "Subtitle Files (*.srt *.vtt *.ass *.ssa)"
         )
         if not file_path:
             return
 
         try:
-            self.srt_entries = parse_srt_file(file_path)
+            self.srt_entries = CueTable.from_file(file_path)
             self.current_srt_path = Path(file_path)
             
             # Generate marked text
@@ -1693,7 +1729,11 @@ class MainWindow(QMainWindow):
             quality=quality,
             rate=rate,
             voice_id=voice_id,
-            use_stress=use_stress
+            use_stress=use_stress,
+            project_path=self.current_srt_path,
+            gemini_enabled=self.config.gemini_enabled,
+            thinking_mode=self.config.thinking_mode,
+            gemini_timeout=self.config.gemini_timeout
         )
 
     # --- Gemini Stats Handlers ---
@@ -1711,6 +1751,8 @@ class MainWindow(QMainWindow):
         if not initial:
             self.config.gemini_enabled = is_checked
             self._info(f"Gemini AI {'включен' if is_checked else 'выключен'}")
+            if is_checked:
+                self._ipa_prefetch_timer.start()
         
     def _on_gemini_key_changed(self, text: str) -> None:
         self.config.gemini_api_key = text.strip()
@@ -1757,23 +1799,52 @@ class MainWindow(QMainWindow):
 
     def _handle_stress_fix(self, editor: QTextEdit | QPlainTextEdit, word: str) -> None:
         """
-        Fetch IPA variants and show selection menu.
+        Show IPA variants for the selected word (looked up in the background if not cached yet).
         """
-        # Show loading indicator (cursor)
-        QApplication.setOverrideCursor(Qt.WaitCursor)
-        try:
-            variants = generate_ipa_variants(word)
-        except Exception as e:
-            self._error(f"Ошибка AI помощника: {e}")
-            variants = []
-        finally:
-            QApplication.restoreOverrideCursor()
-            
+        variants = get_cached_ipa_variants(word)
+        if variants is not None:
+            self._show_ipa_menu(editor, variants)
+            return
+
+        cursor = editor.textCursor()
+        self._pending_stress_fix = (editor, word, cursor.selectionStart(), cursor.selectionEnd())
+        self.statusBar().showMessage(f"Поиск вариантов ударения для '{word}'...")
+        self.ipa_lookup.lookup(word)
+
+    def _take_pending_stress_fix(self, word: str) -> Optional[tuple]:
+        """Pending stress fix for the word, if it is still the last one requested."""
+        pending = self._pending_stress_fix
+        if pending is None or pending[1] != word:
+            return None
+        self._pending_stress_fix = None
+        self.statusBar().clearMessage()
+        return pending
+
+    def _on_ipa_variants_ready(self, word: str, variants: list) -> None:
+        pending = self._take_pending_stress_fix(word)
+        if pending is None:
+            return
+        editor, _, start, end = pending
+
         if not variants:
             QMessageBox.warning(self, "AI Помощник", f"Не удалось найти варианты ударений для '{word}'.\nПроверьте API ключ Gemini.")
             return
-            
-        # Show menu with variants
+
+        # The user may have moved on while Gemini was answering
+        cursor = editor.textCursor()
+        if (cursor.selectionStart(), cursor.selectionEnd()) != (start, end) or cursor.selectedText().strip() != word:
+            self.statusBar().showMessage(f"Варианты ударения для '{word}' готовы: выделите слово снова", 5000)
+            return
+        self._show_ipa_menu(editor, variants)
+
+    def _on_ipa_lookup_failed(self, word: str, message: str) -> None:
+        if self._take_pending_stress_fix(word) is None:
+            return
+        self._error(f"Ошибка AI помощника: {message}")
+        QMessageBox.warning(self, "AI Помощник", f"Не удалось найти варианты ударений для '{word}'.\nПроверьте API ключ Gemini.")
+
+    def _show_ipa_menu(self, editor: QTextEdit | QPlainTextEdit, variants: list) -> None:
+        """Show the IPA variants menu and insert the chosen tag in place of the selection."""
         menu = QMenu(self)
         for ipa_tag, desc in variants:
             # ipa_tag looks like: <phoneme alphabet='ipa' ph='...'>word</phoneme>
@@ -1790,8 +1861,40 @@ class MainWindow(QMainWindow):
         if selected_action:
             tag = selected_action.data()
             cursor = editor.textCursor()
+            # Remember the pick with its context (used to resolve the word offline next time)
+            text = editor.toPlainText()
+            start, end = cursor.selectionStart(), cursor.selectionEnd()
             cursor.insertText(tag)
             self._info(f"Вставлен IPA тег: {tag}")
+            get_memory().record_pick(text, start, end, tag)
+
+    def _prefetch_ipa_variants(self) -> None:
+        """Queue background IPA lookups for trigger words in the editors and in the triggers file."""
+        if not self._gemini_ready or not self.config.gemini_enabled:
+            return
+        from app.gemini_triggers import get_triggers, get_version, refresh_triggers
+
+        try:
+            index = refresh_triggers()
+            words = [
+                match.word
+                for editor in (self.text_edit, self.srt_preview)
+                for match in index.finditer(editor.toPlainText())
+            ]
+            queued = self.ipa_lookup.prefetch(words, PRIORITY_EDITOR, retry_failed=self._ipa_prefetch_retry)
+            self._ipa_prefetch_retry = False
+
+            if self._ipa_triggers_version != get_version():
+                self._ipa_triggers_version = get_version()
+                # Wildcard and multi-word triggers are not single words
+                queued += self.ipa_lookup.prefetch(
+                    [trigger for trigger in get_triggers() if '*' not in trigger and ' ' not in trigger],
+                    PRIORITY_TRIGGERS
+                )
+            if queued:
+                self.logger.debug(f"IPA: в очереди предзагрузки {queued} слов")
+        except Exception as e:
+            self.logger.error(f"Ошибка предзагрузки IPA вариантов: {e}")
 
     def _on_fix_stress_btn_click(self, editor: QTextEdit | QPlainTextEdit) -> None:
         """Handle 'Fix Stress' button click."""
@@ -1979,6 +2082,9 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'worker') and self.worker.isRunning():
             self.worker.stop()
             self.worker.wait(1000)
+
+        if self.ipa_lookup.isRunning():
+            self.ipa_lookup.stop()
             
         event.accept()
 
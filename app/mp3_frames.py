@@ -0,0 +1,349 @@
+"""Покадровая работа с MP3 без декодирования.
+
+Разбор заголовков кадров MPEG Audio Layer III, разрезание MP3 по границам
+кадров, генерация «пустого» кадра тишины для заданного формата и склейка
+готовых MP3-фрагментов с паузами из повторяющихся кадров тишины. Аудио не декодируется и не кодируется
+повторно, поэтому склейка не добавляет потерь качества.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Версии MPEG (биты VV заголовка)
+_MPEG1, _MPEG2, _MPEG25 = 3, 2, 0
+
+# Битрейты Layer III, кбит/с
+_BITRATES = {
+    _MPEG1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    _MPEG2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_BITRATES[_MPEG25] = _BITRATES[_MPEG2]
+
+_SAMPLE_RATES = {
+    _MPEG1: (44100, 48000, 32000),
+    _MPEG2: (22050, 24000, 16000),
+    _MPEG25: (11025, 12000, 8000),
+}
+
+_CHANNEL_MODE_MONO = 3
+
+_KHZ_TO_SAMPLE_RATE = {
+    8: 8000, 11: 11025, 12: 12000, 16: 16000, 22: 22050,
+    24: 24000, 32: 32000, 44: 44100, 48: 48000,
+}
+
+# Формат Edge TTS: "audio-24khz-96kbitrate-mono-mp3"
+_QUALITY_RE = re.compile(r'(\d+)khz-(\d+)kbitrate-(mono|stereo)-mp3')
+
+
+@dataclass(frozen=True)
+class Mp3FrameHeader:
+    """Заголовок кадра MPEG Audio Layer III."""
+    version: int
+    bitrate_kbps: int
+    sample_rate: int
+    padding: int
+    channels: int
+    protected: bool
+
+    @property
+    def samples_per_frame(self) -> int:
+        return 1152 if self.version == _MPEG1 else 576
+
+    @property
+    def frame_size(self) -> int:
+        """Размер кадра в байтах (вместе с заголовком)."""
+        factor = 144 if self.version == _MPEG1 else 72
+        return factor * self.bitrate_kbps * 1000 // self.sample_rate + self.padding
+
+    @property
+    def duration_ms(self) -> float:
+        return self.samples_per_frame * 1000 / self.sample_rate
+
+    @property
+    def side_info_size(self) -> int:
+        if self.version == _MPEG1:
+            return 17 if self.channels == 1 else 32
+        return 9 if self.channels == 1 else 17
+
+    @property
+    def side_info_offset(self) -> int:
+        """Смещение побочной информации в кадре (после заголовка и CRC)."""
+        return 6 if self.protected else 4
+
+    @property
+    def main_data_size(self) -> int:
+        """Размер области основных данных кадра в байтах."""
+        return self.frame_size - self.side_info_offset - self.side_info_size
+
+
+def parse_frame_header(data: bytes, offset: int = 0) -> Optional[Mp3FrameHeader]:
+    """Разбирает заголовок кадра Layer III по смещению или возвращает None."""
+    if offset + 4 > len(data):
+        return None
+
+    b0, b1, b2, b3 = data[offset:offset + 4]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+
+    # Только Layer III; отбрасываем зарезервированные и «свободные» значения
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    return Mp3FrameHeader(
+        version=version,
+        bitrate_kbps=_BITRATES[version][bitrate_index],
+        sample_rate=_SAMPLE_RATES[version][sample_rate_index],
+        padding=(b2 >> 1) & 0x01,
+        channels=1 if (b3 >> 6) == _CHANNEL_MODE_MONO else 2,
+        protected=not (b1 & 0x01),
+    )
+
+
+def _skip_id3v2(data: bytes) -> int:
+    """Смещение первого байта после тега ID3v2 (0, если тега нет)."""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _is_info_frame(frame: bytes, header: Mp3FrameHeader) -> bool:
+    """Кадр-заголовок Xing/Info/VBRI (не содержит звука)."""
+    offset = 4 + (2 if header.protected else 0) + header.side_info_size
+    return frame[offset:offset + 4] in (b'Xing', b'Info') or frame[36:40] == b'VBRI'
+
+
+def iter_frames(data: bytes) -> Iterator[Tuple[Mp3FrameHeader, bytes]]:
+    """Перебирает звуковые кадры MP3 (пропуская ID3 и кадры Xing/Info)."""
+    offset = _skip_id3v2(data)
+    first = True
+
+    while offset + 4 <= len(data):
+        header = parse_frame_header(data, offset)
+        if header is None:
+            # Мусор между кадрами или тег ID3v1 в конце: ищем следующую синхронизацию
+            offset = data.find(b'\xff', offset + 1)
+            if offset < 0:
+                break
+            continue
+
+        end = offset + header.frame_size
+        if end > len(data):
+            break
+        frame = data[offset:end]
+        offset = end
+
+        if first:
+            first = False
+            if _is_info_frame(frame, header):
+                continue
+        yield header, frame
+
+
+def mp3_duration_ms(path: Path) -> float:
+    """Длительность MP3-файла по числу кадров (без декодирования)."""
+    data = Path(path).read_bytes()
+    return sum(header.duration_ms for header, _ in iter_frames(data))
+
+
+def main_data_begin(header: Mp3FrameHeader, frame: bytes) -> int:
+    """На сколько байтов назад (в основных данных предыдущих кадров) начинаются данные кадра."""
+    offset = header.side_info_offset
+    if header.version == _MPEG1:
+        return (frame[offset] << 1) | (frame[offset + 1] >> 7)
+    return frame[offset]
+
+
+def _crc16(data: bytes) -> int:
+    """CRC-16 MPEG Audio (полином 0x8005, начальное значение 0xFFFF)."""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005) if crc & 0x8000 else crc << 1
+            crc &= 0xFFFF
+    return crc
+
+
+def _mute_frame(header: Mp3FrameHeader, frame: bytes) -> bytes:
+    """Кадр с нулевой побочной информацией: декодируется в тишину, основные данные на месте."""
+    offset = header.side_info_offset
+    muted = bytearray(frame)
+    muted[offset:offset + header.side_info_size] = bytes(header.side_info_size)
+    if header.protected:
+        muted[4:6] = _crc16(bytes(muted[2:4]) + bytes(header.side_info_size)).to_bytes(2, 'big')
+    return bytes(muted)
+
+
+def self_contained_frames(
+    frames: Iterable[Tuple[Mp3FrameHeader, bytes]]
+) -> Iterator[Tuple[Mp3FrameHeader, bytes]]:
+    """Кадры, которые декодируются без кадров, стоявших перед ними в исходном файле.
+
+    Основные данные кадра Layer III могут начинаться в предыдущих кадрах
+    (битовый резервуар: main_data_begin байт назад). Кадр, которому не хватает
+    байтов кадров перед ним в этой последовательности, заменяется тишиной:
+    побочная информация обнуляется, а основные данные остаются на месте,
+    потому что их используют следующие кадры. Обычно так заменяется только
+    первый кадр (несколько мс у края реплики).
+    """
+    reservoir = 0
+    for header, frame in frames:
+        if main_data_begin(header, frame) > reservoir:
+            frame = _mute_frame(header, frame)
+        reservoir += header.main_data_size
+        yield header, frame
+
+
+def split_frames(data: bytes, ranges_ms: List[Tuple[float, float]]) -> List[bytes]:
+    """Режет MP3 на куски по границам кадров, без декодирования.
+
+    Кадр относится к отрезку, в который попадает его середина, поэтому
+    граница куска отстоит от заданной не больше чем на половину кадра.
+    Кадры вне отрезков отбрасываются. Начальные кадры куска, ссылающиеся
+    на отброшенные байты резервуара, заменяются тишиной
+    (см. self_contained_frames), поэтому каждый кусок декодируется сам по себе.
+
+    Args:
+        data: Содержимое MP3-файла
+        ranges_ms: Непересекающиеся отрезки (начало, конец) в мс, по возрастанию
+
+    Returns:
+        List[bytes]: Кадры каждого отрезка (пустые байты, если кадров не нашлось)
+    """
+    chunks: List[List[Tuple[Mp3FrameHeader, bytes]]] = [[] for _ in ranges_ms]
+    index = 0
+    position_ms = 0.0
+    for header, frame in iter_frames(data):
+        middle_ms = position_ms + header.duration_ms / 2
+        position_ms += header.duration_ms
+        while index < len(ranges_ms) and middle_ms >= ranges_ms[index][1]:
+            index += 1
+        if index >= len(ranges_ms):
+            break
+        if middle_ms >= ranges_ms[index][0]:
+            chunks[index].append((header, frame))
+    return [b''.join(frame for _, frame in self_contained_frames(frames)) for frames in chunks]
+
+
+def parse_quality(quality: str) -> Tuple[int, int, int]:
+    """Параметры формата Edge TTS: (частота, битрейт кбит/с, каналы).
+
+    Raises:
+        ValueError: Если формат не является MP3
+    """
+    match = _QUALITY_RE.search(quality)
+    if not match:
+        raise ValueError(f"Неподдерживаемый формат MP3: {quality}")
+    khz, kbps, channels = match.groups()
+    sample_rate = _KHZ_TO_SAMPLE_RATE.get(int(khz))
+    if sample_rate is None:
+        raise ValueError(f"Неподдерживаемая частота: {khz} кГц")
+    return sample_rate, int(kbps), 1 if channels == 'mono' else 2
+
+
+def silent_frame(sample_rate: int, bitrate_kbps: int, channels: int = 1) -> Tuple[Mp3FrameHeader, bytes]:
+    """Собирает один кадр тишины для заданного формата.
+
+    Нулевая побочная информация (part2_3_length = 0) означает пустой спектр,
+    поэтому кадр декодируется в тишину любым декодером.
+
+    Raises:
+        ValueError: Если сочетание частоты и битрейта недопустимо для MP3
+    """
+    for version, rates in _SAMPLE_RATES.items():
+        if sample_rate in rates:
+            break
+    else:
+        raise ValueError(f"Недопустимая частота MP3: {sample_rate}")
+
+    try:
+        bitrate_index = _BITRATES[version].index(bitrate_kbps, 1)
+    except ValueError:
+        raise ValueError(f"Недопустимый битрейт {bitrate_kbps}k для {sample_rate} Гц") from None
+
+    header_bytes = bytes((
+        0xFF,
+        0xE0 | (version << 3) | (1 << 1) | 0x01,  # Layer III, без CRC
+        (bitrate_index << 4) | (rates.index(sample_rate) << 2),
+        (_CHANNEL_MODE_MONO if channels == 1 else 0) << 6,
+    ))
+    header = parse_frame_header(header_bytes)
+    return header, header_bytes + bytes(header.frame_size - 4)
+
+
+def concat_with_silence(
+    fragment_paths: List[Path],
+    pauses_ms: List[float],
+    output_path: str,
+    quality: str
+) -> bool:
+    """Склеивает MP3-фрагменты кадрами, заполняя паузы кадрами тишины.
+
+    Пауза после каждого фрагмента набирается целым числом кадров тишины;
+    ошибка округления не накапливается, а переносится на следующую паузу,
+    так что расхождение со шкалой субтитров не превышает половины кадра.
+    Кадры фрагмента, ссылающиеся на резервуар перед его началом, заменяются
+    тишиной (self_contained_frames): перед фрагментом стоят чужие кадры.
+
+    Args:
+        fragment_paths: MP3-фрагменты реплик по порядку
+        pauses_ms: Паузы после каждого фрагмента, мс
+        output_path: Путь итогового MP3
+        quality: Формат Edge TTS (частота, битрейт, каналы)
+
+    Returns:
+        bool: False, если формат задания не MP3 или формат какого-либо фрагмента
+        не совпал с ним (файл не создаётся, нужна склейка с перекодированием)
+    """
+    try:
+        sample_rate, bitrate_kbps, channels = parse_quality(quality)
+        silence_header, silence = silent_frame(sample_rate, bitrate_kbps, channels)
+    except ValueError as e:
+        logger.warning(f"Склейка без перекодирования недоступна: {e}")
+        return False
+    frame_ms = silence_header.duration_ms
+
+    written_ms = 0.0
+    target_ms = 0.0
+
+    with open(output_path, 'wb') as out:
+        for path, pause_ms in zip(fragment_paths, pauses_ms):
+            frames = 0
+            # Перед фрагментом — кадры тишины или другой реплики, а не его резервуар
+            for header, frame in self_contained_frames(iter_frames(Path(path).read_bytes())):
+                if header.sample_rate != sample_rate or header.channels != channels:
+                    logger.warning(
+                        f"Фрагмент {path} ({header.sample_rate} Гц, {header.channels} кан.) "
+                        f"не совпадает с форматом {quality}; склейка без перекодирования невозможна"
+                    )
+                    out.close()
+                    Path(output_path).unlink(missing_ok=True)
+                    return False
+                out.write(frame)
+                frames += 1
+
+            written_ms += frames * frame_ms
+            target_ms += frames * frame_ms + max(0.0, pause_ms)
+
+            count = max(0, round((target_ms - written_ms) / frame_ms))
+            out.write(silence * count)
+            written_ms += count * frame_ms
+
+    return True
@@ -3,15 +3,37 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+import re
 import tempfile
 from pathlib import Path
 from typing import List, Tuple, Callable, Optional
+from xml.sax.saxutils import escape
 
 import edge_tts
 from pydub import AudioSegment
 
+from app.ssml_client import SSMLCommunicate
 from app.voice_markers import parse_marked_text, get_voice_for_marker
 from app.srt_parser import SubtitleEntry
+from app.subtitle_table import CueTable
+from app.text_pipeline import GEMINI_JOB_TIMEOUT, prepare_cues_for_tts
+from app.duration_model import get_duration_model
+from app.srt_fragment_store import SrtFragmentStore
+from app.mp3_frames import concat_with_silence, mp3_duration_ms, split_frames
+
+logger = logging.getLogger(__name__)
+
+# Группировка реплик одного голоса в один SSML-запрос
+GROUP_MAX_BYTES = 3500   # Лимит SSML одного запроса в UTF-8 (запас до 4096 байт edge-tts)
+GROUP_MAX_CUES = 50      # Лимит реплик в одной группе
+GROUP_BREAK_MS = 400     # Пауза между репликами внутри группы
+GROUP_EDGE_MS = 150      # Тишина, оставляемая вокруг реплики при разрезании
+
+_BREAK_SSML = f'<break time="{GROUP_BREAK_MS}ms"/>'
+
+_WORD_RE = re.compile(r'\w+')
+_TAG_RE = re.compile(r'<[^>]+>')
 
 
 async def generate_audio_fragment(
@@ -85,6 +107,230 @@ def create_silence(duration_ms: int) -> AudioSegment:
     return AudioSegment.silent(duration=duration_ms)
 
 
+def _rate_to_str(rate: int) -> str:
+    """Форматирует скорость для Edge TTS (например, +10% или -5%)."""
+    return f"{rate:+d}%"
+
+
+def _cue_words(text: str) -> List[str]:
+    """Слова реплики в нижнем регистре (без SSML-тегов) для сопоставления с WordBoundary."""
+    return _WORD_RE.findall(_TAG_RE.sub('', text).lower())
+
+
+def group_same_voice_runs(
+    voices: List[str],
+    texts: List[str],
+    rates: Optional[List[int]] = None,
+    max_bytes: int = GROUP_MAX_BYTES,
+    max_cues: int = GROUP_MAX_CUES,
+    use_stress: bool = False
+) -> List[List[int]]:
+    """Разбивает реплики на серии подряд идущих реплик одного голоса.
+    
+    Реплики без слов (например, "♪" или "...") не попадают в группы:
+    их невозможно найти по WordBoundary, поэтому они озвучиваются отдельно.
+    
+    Args:
+        voices: Voice ID каждой реплики
+        texts: Тексты реплик
+        rates: Скорость каждой реплики (None — 0 для всех)
+        max_bytes: Максимальный размер SSML группы (build_group_ssml) в байтах UTF-8
+        max_cues: Максимальное количество реплик в группе
+        use_stress: Тексты содержат SSML-теги ударений (не экранируются)
+        
+    Returns:
+        List[List[int]]: Индексы реплик для каждой серии (по порядку)
+    """
+    if rates is None:
+        rates = [0] * len(texts)
+    break_bytes = len(_BREAK_SSML.encode('utf-8'))
+    
+    runs: List[List[int]] = []
+    current: List[int] = []
+    current_bytes = 0
+    
+    for i, (voice, text) in enumerate(zip(voices, texts)):
+        groupable = bool(_cue_words(text))
+        cue_bytes = len(_cue_ssml(text, rates[i], use_stress).encode('utf-8'))
+        fits = (
+            current
+            and voices[current[0]] == voice
+            and current_bytes + break_bytes + cue_bytes <= max_bytes
+            and len(current) < max_cues
+        )
+        
+        if groupable and fits:
+            current.append(i)
+            current_bytes += break_bytes + cue_bytes
+            continue
+        
+        if current:
+            runs.append(current)
+        
+        if groupable:
+            # Размер SSML серии: обёртка <speak><voice> плюс реплики и паузы между ними
+            envelope_bytes = len(build_group_ssml([], voice, [], use_stress).encode('utf-8'))
+            current, current_bytes = [i], envelope_bytes + cue_bytes
+        else:
+            runs.append([i])
+            current, current_bytes = [], 0
+    
+    if current:
+        runs.append(current)
+    
+    return runs
+
+
+def _cue_ssml(text: str, rate: int, use_stress: bool = False) -> str:
+    """SSML одной реплики внутри группы."""
+    content = text if use_stress else escape(text)
+    return f'<prosody rate="{_rate_to_str(rate)}" pitch="+0Hz">{content}</prosody>'
+
+
+def build_group_ssml(texts: List[str], voice: str, rates: List[int], use_stress: bool = False) -> str:
+    """Собирает один SSML-документ для серии реплик одного голоса.
+    
+    Каждая реплика получает свой <prosody rate>, между репликами
+    ставится <break>, по которому аудио потом режется на фрагменты.
+    """
+    parts = voice.split('-')
+    lang = '-'.join(parts[:2]) if len(parts) >= 2 else 'en-US'
+    
+    body = []
+    for i, (text, cue_rate) in enumerate(zip(texts, rates)):
+        if i > 0:
+            body.append(_BREAK_SSML)
+        body.append(_cue_ssml(text, cue_rate, use_stress))
+    
+    return (
+        f'<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="{lang}">'
+        f'<voice name="{escape(voice)}">'
+        f'{"".join(body)}'
+        f'</voice>'
+        f'</speak>'
+    )
+
+
+def group_cue_ranges(
+    texts: List[str],
+    boundaries: List[dict],
+    total_ms: float
+) -> Optional[List[Tuple[float, float]]]:
+    """Отрезки реплик в аудио группы по смещениям WordBoundary.
+    
+    Слова из WordBoundary по порядку сопоставляются со словами реплик.
+    Граница между репликами проходит посередине <break>, но не дальше
+    GROUP_EDGE_MS от первого/последнего слова реплики.
+    
+    Args:
+        texts: Тексты реплик группы
+        boundaries: События WordBoundary запроса группы
+        total_ms: Длительность аудио группы, мс
+    
+    Returns:
+        List[Tuple[float, float]] | None: (начало, конец) каждой реплики в мс
+        или None, если сопоставить слова с репликами не удалось
+    """
+    cue_words = [_cue_words(text) for text in texts]
+    first_start: List[Optional[float]] = [None] * len(texts)
+    last_end: List[Optional[float]] = [None] * len(texts)
+    
+    cue, pos = 0, 0
+    for boundary in boundaries:
+        words = _WORD_RE.findall(str(boundary["text"]).lower())
+        if not words:
+            continue
+        
+        # Переходим к следующей реплике, если слова текущей закончились
+        while cue < len(texts) and pos >= len(cue_words[cue]):
+            cue, pos = cue + 1, 0
+        if cue >= len(texts):
+            return None
+        
+        # Ищем слово в остатке текущей реплики, затем в начале следующей
+        remaining = cue_words[cue][pos:]
+        if words[0] in remaining:
+            pos += remaining.index(words[0])
+        elif cue + 1 < len(texts) and words[0] in cue_words[cue + 1]:
+            cue, pos = cue + 1, cue_words[cue + 1].index(words[0])
+        else:
+            return None
+        
+        start_ms = int(boundary["offset"]) / 10_000
+        end_ms = start_ms + int(boundary["duration"]) / 10_000
+        if first_start[cue] is None:
+            first_start[cue] = start_ms
+        last_end[cue] = end_ms
+        pos += len(words)
+    
+    if any(value is None for value in first_start):
+        return None
+    
+    ranges = []
+    prev_cut = 0.0
+    for i in range(len(texts)):
+        if i + 1 < len(texts):
+            cut = (last_end[i] + first_start[i + 1]) / 2
+        else:
+            cut = float(total_ms)
+        
+        seg_start = max(prev_cut, first_start[i] - GROUP_EDGE_MS)
+        seg_end = min(cut, last_end[i] + GROUP_EDGE_MS)
+        ranges.append((seg_start, seg_end))
+        prev_cut = cut
+    
+    return ranges
+
+
+async def generate_group_fragments(
+    texts: List[str],
+    voice: str,
+    rates: List[int],
+    quality: str,
+    output_path: str,
+    fragment_paths: List[Path],
+    use_stress: bool = False
+) -> Optional[List[AudioSegment]]:
+    """Озвучивает серию реплик одного голоса одним запросом.
+    
+    MP3 группы режется по границам кадров: кадры каждой реплики
+    записываются в её файл как есть, без повторного кодирования.
+    
+    Args:
+        texts: Тексты реплик
+        voice: Voice ID
+        rates: Скорость для каждой реплики
+        quality: Качество аудио
+        output_path: Путь для сохранения аудио группы
+        fragment_paths: Пути MP3-фрагментов реплик
+        
+    Returns:
+        List[AudioSegment] | None: Аудио реплик (для калибровки модели
+        длительности) или None, если аудио не удалось разрезать (тогда
+        реплики озвучиваются по одной, файлы фрагментов не создаются)
+    """
+    ssml = build_group_ssml(texts, voice, rates, use_stress=use_stress)
+    communicator = SSMLCommunicate(ssml, output_format=quality, word_boundary=True)
+    await communicator.save(output_path)
+    
+    audio = AudioSegment.from_mp3(output_path)
+    ranges = group_cue_ranges(texts, communicator.boundaries, len(audio))
+    if ranges is None:
+        logger.warning(
+            f"Не удалось сопоставить WordBoundary с репликами группы ({len(texts)} реплик)"
+        )
+        return None
+    
+    chunks = split_frames(Path(output_path).read_bytes(), ranges)
+    if not all(chunks):
+        logger.warning(f"Не удалось разрезать MP3 группы по кадрам ({len(texts)} реплик)")
+        return None
+    
+    for path, chunk in zip(fragment_paths, chunks):
+        Path(path).write_bytes(chunk)
+    return [audio[int(start):int(end)] for start, end in ranges]
+
+
 async def generate_srt_audio(
     marked_text: str,
     timings: List[Tuple[str, float]],  # [(text, pause_after), ...]
@@ -93,7 +339,15 @@ async def generate_srt_audio(
     rate: int = 0,
     progress_callback: Optional[Callable[[int, int, str], None]] = None,
     default_voice: Optional[str] = None,
-    use_stress: bool = False
+    use_stress: bool = False,
+    slots: Optional[List[int]] = None,
+    fit_rate: bool = True,
+    group_requests: bool = True,
+    fragment_store: Optional[SrtFragmentStore] = None,
+    gemini_enabled: bool = False,
+    thinking_mode: bool = False,
+    passthrough: bool = True,
+    gemini_timeout: Optional[float] = GEMINI_JOB_TIMEOUT
 ) -> None:
     """Генерирует единый MP3 из текста с метками и таймингами.
     
@@ -104,6 +358,17 @@ async def generate_srt_audio(
         quality: Качество аудио
         rate: Скорость речи (-50 до +50)
         progress_callback: Функция обратного вызова (current, total, status_text)
+        slots: Длительность окна каждой реплики в мс (end - start)
+        fit_rate: Подбирать скорость каждой реплики под её окно по модели длительности
+        group_requests: Озвучивать подряд идущие реплики одного голоса одним запросом
+        fragment_store: Хранилище фрагментов проекта: озвучиваются только
+            изменённые и новые реплики, остальные берутся из хранилища
+        gemini_enabled: Контекстная обработка реплик Gemini (пакетными запросами)
+        thinking_mode: Режим размышлений Gemini
+        passthrough: Склеивать MP3-кадры фрагментов напрямую, заполняя паузы
+            кадрами тишины, без декодирования и повторного кодирования
+        gemini_timeout: Бюджет времени Gemini-стадии (с); по его истечении
+            реплики озвучиваются после словаря и yoditor. None — без ограничения
         
     Raises:
         ValueError: Если количество меток не совпадает с количеством таймингов
@@ -118,53 +383,174 @@ async def generate_srt_audio(
             f"но {len(timings)} записей с таймингами"
         )
     
+    if slots is not None and len(slots) != len(timings):
+        raise ValueError(
+            f"Несоответствие: {len(slots)} окон реплик, "
+            f"но {len(timings)} записей с таймингами"
+        )
+    
+    duration_model = get_duration_model()
+    total = len(marked_entries)
+    
+    # Словарь замен, yoditor и Gemini (только реплики с триггерами, пакетами)
+    if progress_callback:
+        progress_callback(0, total, "Обработка текста реплик...")
+    cue_texts = await prepare_cues_for_tts(
+        [text for _, text in marked_entries],
+        gemini_enabled=gemini_enabled,
+        thinking_mode=thinking_mode,
+        timeout=gemini_timeout
+    )
+    
+    # Голос и скорость для каждой реплики
+    texts: List[str] = []
+    voices: List[str] = []
+    rates: List[int] = []
+    for i, ((marker, _), text) in enumerate(zip(marked_entries, cue_texts)):
+        # Получаем голос для метки
+        voice = get_voice_for_marker(marker)
+        
+        # Если передан дефолтный голос и метка [RU_M], используем его
+        if default_voice and marker == '[RU_M]':
+            voice = default_voice
+        
+        # Подбираем скорость, чтобы реплика уложилась в своё окно с первой попытки
+        cue_rate = rate
+        if fit_rate and slots:
+            cue_rate = duration_model.fit_rate(voice, text, slots[i], base_rate=rate)
+        
+        texts.append(text)
+        voices.append(voice)
+        rates.append(cue_rate)
+    
+    # Extract bitrate properly (e.g. "96kbitrate" -> "96k")
+    bitrate_str = quality.split('-')[2].replace("kbitrate", "k")
+    
+    # MP3-файлы фрагментов (для покадровой склейки)
+    fragment_files: List[Optional[Path]] = [None] * total
+    
+    # Ранее озвученные реплики берём из хранилища проекта
+    keys: List[str] = []
+    if fragment_store is not None:
+        keys = [
+            fragment_store.cue_key(voices[i], texts[i], rate, use_stress, quality, slots[i] if slots else 0)
+            for i in range(total)
+        ]
+        pending = fragment_store.diff(keys)
+        pending_set = set(pending)
+        for i in range(total):
+            if i not in pending_set:
+                fragment_files[i] = fragment_store.get(keys[i])
+    else:
+        pending = list(range(total))
+    
     # Временная директория для фрагментов
     with tempfile.TemporaryDirectory() as temp_dir:
         temp_path = Path(temp_dir)
-        fragments = []
+        done = total - len(pending)
         
-        total = len(marked_entries)
+        # 1. Серии подряд идущих реплик одного голоса — одним SSML-запросом
+        if group_requests:
+            pending_runs = group_same_voice_runs(
+                [voices[i] for i in pending],
+                [texts[i] for i in pending],
+                [rates[i] for i in pending],
+                use_stress=use_stress
+            )
+            for run in ([pending[j] for j in run] for run in pending_runs):
+                if len(run) < 2:
+                    continue
+                
+                first, last = run[0] + 1, run[-1] + 1
+                if progress_callback:
+                    progress_callback(done, total, f"Озвучивание реплик {first}-{last}/{total}...")
+                
+                group_path = temp_path / f"group_{first:04d}_{last:04d}.mp3"
+                if fragment_store is not None:
+                    run_files = [fragment_store.fragment_path(keys[i]) for i in run]
+                else:
+                    run_files = [temp_path / f"fragment_{i + 1:04d}.mp3" for i in run]
+                try:
+                    group_segments = await generate_group_fragments(
+                        [texts[i] for i in run],
+                        voices[run[0]],
+                        [rates[i] for i in run],
+                        quality,
+                        str(group_path),
+                        run_files,
+                        use_stress=use_stress
+                    )
+                except Exception as e:
+                    logger.warning(f"Групповой запрос для реплик {first}-{last} не удался: {e}")
+                    group_segments = None
+                
+                if group_segments is None:
+                    # Реплики группы будут озвучены по одной
+                    continue
+                
+                for i, path, segment in zip(run, run_files, group_segments):
+                    fragment_files[i] = path
+                    duration_model.observe(voices[i], texts[i], rates[i], len(segment))
+                done += len(run)
         
-        # Генерируем каждую реплику
-        for i, ((marker, text), (_, pause_after)) in enumerate(zip(marked_entries, timings), 1):
-            if progress_callback:
-                progress_callback(i, total, f"Озвучивание реплики {i}/{total}...")
+        # 2. Оставшиеся реплики — по одной
+        for i in pending:
+            if fragment_files[i] is not None:
+                continue
             
-            # Получаем голос для метки
-            voice = get_voice_for_marker(marker)
-            
-            # Если передан дефолтный голос и метка [RU_M], используем его
-            if default_voice and marker == '[RU_M]':
-                voice = default_voice
+            done += 1
+            if progress_callback:
+                progress_callback(done, total, f"Озвучивание реплики {i + 1}/{total}...")
             
             # Генерируем фрагмент
-            fragment_path = temp_path / f"fragment_{i:04d}.mp3"
-            await generate_audio_fragment(text, voice, rate, quality, str(fragment_path), use_stress=use_stress)
+            fragment_path = temp_path / f"fragment_{i + 1:04d}.mp3"
+            await generate_audio_fragment(texts[i], voices[i], rates[i], quality, str(fragment_path), use_stress=use_stress)
             
-            # Загружаем фрагмент
-            audio_fragment = AudioSegment.from_mp3(str(fragment_path))
-            fragments.append(audio_fragment)
+            fragment_files[i] = fragment_path
+            if fragment_store is not None:
+                fragment_store.put_file(keys[i], fragment_path)
             
-            # Добавляем паузу
-            if pause_after > 0:
-                silence = create_silence(int(pause_after * 1000))  # секунды -> миллисекунды
-                fragments.append(silence)
+            # Калибруем модель по фактической длительности (по числу кадров)
+            duration_model.observe(voices[i], texts[i], rates[i], mp3_duration_ms(fragment_path))
+        
+        duration_model.save()
         
         # Объединяем все фрагменты
         if progress_callback:
             progress_callback(total, total, "Склейка аудио...")
         
-        combined = fragments[0]
-        for fragment in fragments[1:]:
-            combined += fragment
+        # Покадровая склейка: паузы из кадров тишины, без перекодирования
+        assembled = False
+        if passthrough and all(path is not None for path in fragment_files):
+            assembled = concat_with_silence(
+                fragment_files,
+                [pause_after * 1000 for _, pause_after in timings],  # секунды -> миллисекунды
+                output_path,
+                quality
+            )
         
-        # Сохраняем результат
-        if progress_callback:
-            progress_callback(total, total, "Сохранение файла...")
+        if not assembled:
+            fragments = []
+            for i, (_, pause_after) in enumerate(timings):
+                fragments.append(AudioSegment.from_mp3(str(fragment_files[i])))
+                
+                # Добавляем паузу
+                if pause_after > 0:
+                    silence = create_silence(int(pause_after * 1000))  # секунды -> миллисекунды
+                    fragments.append(silence)
+            
+            combined = fragments[0]
+            for fragment in fragments[1:]:
+                combined += fragment
+            
+            # Сохраняем результат
+            if progress_callback:
+                progress_callback(total, total, "Сохранение файла...")
+            
+            combined.export(output_path, format="mp3", bitrate=bitrate_str)
         
-        # Extract bitrate properly (e.g. "96kbitrate" -> "96k")
-        bitrate_str = quality.split('-')[2].replace("kbitrate", "k")
-        combined.export(output_path, format="mp3", bitrate=bitrate_str)
+        if fragment_store is not None:
+            fragment_store.commit(keys)
         
         if progress_callback:
             progress_callback(total, total, "Готово!")
@@ -172,27 +558,43 @@ async def generate_srt_audio(
 
 async def generate_srt_audio_from_entries(
     marked_text: str,
-    entries: List[SubtitleEntry],
+    entries: List[SubtitleEntry] | CueTable,
     output_path: str,
     quality: str = "audio-24khz-96kbitrate-mono-mp3",
     rate: int = 0,
     progress_callback: Optional[Callable[[int, int, str], None]] = None,
     default_voice: Optional[str] = None,
-    use_stress: bool = False
+    use_stress: bool = False,
+    fit_rate: bool = True,
+    project_path: Optional[Path] = None,
+    gemini_enabled: bool = False,
+    thinking_mode: bool = False,
+    gemini_timeout: Optional[float] = GEMINI_JOB_TIMEOUT
 ) -> None:
     """Генерирует озвучку из SubtitleEntry списка.
     
     Args:
         marked_text: Текст с метками голосов
-        entries: Список субтитров с таймингами
+        entries: Список субтитров с таймингами (или таблица CueTable)
         output_path: Путь для сохранения итогового MP3
         quality: Качество аудио
         rate: Скорость речи
         progress_callback: Функция обратного вызова
+        fit_rate: Подбирать скорость каждой реплики под её окно
+        project_path: Путь к исходному .srt; если задан, фрагменты реплик
+            сохраняются между генерациями и переозвучиваются только изменённые
+        gemini_enabled: Контекстная обработка реплик Gemini
+        thinking_mode: Режим размышлений Gemini
+        gemini_timeout: Бюджет времени Gemini-стадии (с), None — без ограничения
     """
     # Извлекаем тайминги
     timings = [(entry.text, entry.pause_after) for entry in entries]
     
+    # Окна реплик (мс) для подгонки скорости
+    slots = [entry.end_ms - entry.start_ms for entry in entries]
+    
+    fragment_store = SrtFragmentStore.for_project(project_path) if project_path else None
+    
     # Генерируем аудио
     await generate_srt_audio(
         marked_text=marked_text,
@@ -202,7 +604,13 @@ async def generate_srt_audio_from_entries(
         rate=rate,
         progress_callback=progress_callback,
         default_voice=default_voice,
-        use_stress=use_stress
+        use_stress=use_stress,
+        slots=slots,
+        fit_rate=fit_rate,
+        fragment_store=fragment_store,
+        gemini_enabled=gemini_enabled,
+        thinking_mode=thinking_mode,
+        gemini_timeout=gemini_timeout
     )
 
 
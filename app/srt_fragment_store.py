@@ -0,0 +1,124 @@
+"""Хранилище озвученных фрагментов реплик SRT-проекта.
+
+Позволяет при повторной генерации озвучивать только изменённые реплики:
+каждый фрагмент сохраняется под ключом (голос, текст, скорость, режим
+ударений, качество, окно реплики), а манифест хранит ключи последней сборки.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Корневая папка хранилищ (по одной подпапке на SRT-файл)
+STORE_ROOT = Path(tempfile.gettempdir()) / "edge_tts_srt_fragments"
+
+MANIFEST_NAME = "manifest.json"
+
+
+class SrtFragmentStore:
+    """Фрагменты реплик одного SRT-проекта на диске."""
+
+    def __init__(self, store_dir: Path) -> None:
+        self.store_dir = store_dir
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.store_dir / MANIFEST_NAME
+
+    @classmethod
+    def for_project(cls, srt_path: Path) -> SrtFragmentStore:
+        """Хранилище для SRT-файла (папка определяется по его полному пути)."""
+        project_id = hashlib.sha1(str(Path(srt_path).resolve()).encode('utf-8')).hexdigest()[:16]
+        return cls(STORE_ROOT / project_id)
+
+    @staticmethod
+    def cue_key(
+        voice: str,
+        text: str,
+        rate: int,
+        use_stress: bool,
+        quality: str,
+        slot_ms: int = 0
+    ) -> str:
+        """Ключ фрагмента: меняется при любом изменении, влияющем на звук реплики."""
+        payload = json.dumps(
+            [voice, text, rate, bool(use_stress), quality, slot_ms],
+            ensure_ascii=False
+        )
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def fragment_path(self, key: str) -> Path:
+        """Путь к файлу фрагмента по ключу."""
+        return self.store_dir / f"{key}.mp3"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Вернуть путь к сохранённому фрагменту или None."""
+        path = self.fragment_path(key)
+        if path.exists() and path.stat().st_size > 0:
+            return path
+        return None
+
+    def put_file(self, key: str, source: Path) -> Path:
+        """Сохранить готовый MP3-файл фрагмента."""
+        path = self.fragment_path(key)
+        shutil.copyfile(source, path)
+        return path
+
+    def load_manifest(self) -> List[str]:
+        """Ключи реплик последней сборки."""
+        if not self.manifest_path.exists():
+            return []
+        try:
+            return json.loads(self.manifest_path.read_text(encoding='utf-8'))
+        except Exception as e:
+            logger.warning(f"Failed to read fragment manifest: {e}")
+            return []
+
+    def diff(self, keys: List[str]) -> List[int]:
+        """Индексы реплик, которые нужно озвучить заново (новые или изменённые).
+
+        Args:
+            keys: Ключи реплик текущей сборки
+
+        Returns:
+            List[int]: Индексы реплик без сохранённого фрагмента
+        """
+        previous = self.load_manifest()
+        changed = [i for i, key in enumerate(keys) if self.get(key) is None]
+
+        edited = sum(
+            1 for i, key in enumerate(keys)
+            if i >= len(previous) or previous[i] != key
+        )
+        logger.info(
+            f"SRT: изменено {edited} из {len(keys)} реплик, "
+            f"к озвучиванию {len(changed)}"
+        )
+        return changed
+
+    def commit(self, keys: List[str]) -> None:
+        """Сохранить манифест сборки и удалить фрагменты, на которые он не ссылается."""
+        try:
+            self.manifest_path.write_text(json.dumps(keys), encoding='utf-8')
+        except Exception as e:
+            logger.error(f"Failed to save fragment manifest: {e}")
+            return
+
+        referenced = set(keys)
+        for path in self.store_dir.glob("*.mp3"):
+            if path.stem not in referenced:
+                try:
+                    path.unlink()
+                except OSError as e:
+                    logger.warning(f"Failed to delete stale fragment {path}: {e}")
+
+    def clear(self) -> None:
+        """Удалить все фрагменты проекта."""
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
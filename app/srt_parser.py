@@ -2,11 +2,12 @@
 
 from __future__ import annotations
 
-import re
 from dataclasses import dataclass
-from pathlib import Path
 from typing import List, Tuple
 
+from app.subtitle_reader import iter_subtitles, format_timestamp, parse_timestamp
+from app.subtitle_table import CueTable
+
 
 @dataclass
 class SubtitleEntry:
@@ -16,6 +17,15 @@ class SubtitleEntry:
     end_time: str    # "00:00:03,500"
     text: str
     pause_after: float = 0.0  # в секундах
+    start_ms: int = 0
+    end_ms: int = 0
+
+    def __post_init__(self):
+        # Записи, созданные по строковым таймингам, получают и целые мс
+        if not self.start_ms and self.start_time:
+            self.start_ms = int(round(time_to_seconds(self.start_time) * 1000))
+        if not self.end_ms and self.end_time:
+            self.end_ms = int(round(time_to_seconds(self.end_time) * 1000))
 
 
 def time_to_seconds(time_str: str) -> float:
@@ -32,19 +42,17 @@ def time_to_seconds(time_str: str) -> float:
         1.5
     """
     # Формат: HH:MM:SS,mmm
-    time_str = time_str.strip()
-    h, m, rest = time_str.split(':')
-    s, ms = rest.split(',')
-    
-    total_seconds = int(h) * 3600 + int(m) * 60 + int(s) + int(ms) / 1000
-    return total_seconds
+    return parse_timestamp(time_str) / 1000
 
 
 def parse_srt_file(file_path: str) -> List[SubtitleEntry]:
-    """Парсит .srt файл и возвращает список записей.
+    """Парсит файл субтитров (.srt, .vtt, .ass) и возвращает список записей.
+    
+    Файл читается за один проход потоковым читателем
+    (см. app.subtitle_reader.iter_subtitles).
     
     Args:
-        file_path: Путь к .srt файлу
+        file_path: Путь к файлу субтитров
         
     Returns:
         List[SubtitleEntry]: Список субтитров
@@ -52,55 +60,22 @@ def parse_srt_file(file_path: str) -> List[SubtitleEntry]:
     Raises:
         ValueError: Если формат файла некорректен
     """
-    file_path = Path(file_path)
-    
-    if not file_path.exists():
-        raise FileNotFoundError(f"Файл не найден: {file_path}")
-    
-    # Попытка определить кодировку
-    encodings = ['utf-8', 'utf-8-sig', 'windows-1251', 'cp1252']
-    content = None
-    
-    for encoding in encodings:
-        try:
-            content = file_path.read_text(encoding=encoding)
-            break
-        except (UnicodeDecodeError, LookupError):
-            continue
-    
-    if content is None:
-        raise ValueError(f"Не удалось определить кодировку файла: {file_path}")
-    
-    # Паттерн для парсинга .srt
-    # Формат:
-    # <номер>
-    # <время начала> --> <время окончания>
-    # <текст>
-    # <пустая строка>
-    pattern = r'(\d+)\s*\n\s*(\d{2}:\d{2}:\d{2},\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2},\d{3})\s*\n(.*?)(?=\n\s*\n|\Z)'
-    
-    matches = re.findall(pattern, content, re.DOTALL)
+    entries = [
+        SubtitleEntry(
+            number=cue.number,
+            start_time=format_timestamp(cue.start_ms),
+            end_time=format_timestamp(cue.end_ms),
+            text=cue.text,
+            pause_after=cue.gap_ms / 1000,
+            start_ms=cue.start_ms,
+            end_ms=cue.end_ms,
+        )
+        for cue in iter_subtitles(file_path)
+    ]
     
-    if not matches:
+    if not entries:
         raise ValueError("Файл не содержит корректных .srt записей")
     
-    entries = []
-    for i, (num, start, end, text) in enumerate(matches):
-        entry = SubtitleEntry(
-            number=int(num),
-            start_time=start,
-            end_time=end,
-            text=text.strip()
-        )
-        
-        # Вычисляем паузу до следующей реплики
-        if i < len(matches) - 1:
-            next_start = matches[i + 1][1]
-            pause = time_to_seconds(next_start) - time_to_seconds(end)
-            entry.pause_after = max(0.0, pause)  # Не может быть отрицательной
-        
-        entries.append(entry)
-    
     return entries
 
 
@@ -118,11 +93,11 @@ def calculate_pause_duration(end_time: str, next_start_time: str) -> float:
     return max(0.0, pause)
 
 
-def extract_text_with_timings(entries: List[SubtitleEntry]) -> List[Tuple[str, float]]:
+def extract_text_with_timings(entries: List[SubtitleEntry] | CueTable) -> List[Tuple[str, float]]:
     """Извлекает текст и паузы для генерации аудио.
     
     Args:
-        entries: Список субтитров
+        entries: Список субтитров или таблица CueTable
         
     Returns:
         List[Tuple[str, float]]: Список кортежей (текст, пауза_после)
@@ -130,11 +105,11 @@ def extract_text_with_timings(entries: List[SubtitleEntry]) -> List[Tuple[str, f
     return [(entry.text, entry.pause_after) for entry in entries]
 
 
-def get_srt_stats(entries: List[SubtitleEntry]) -> dict:
+def get_srt_stats(entries: List[SubtitleEntry] | CueTable) -> dict:
     """Получить статистику по субтитрам.
     
     Args:
-        entries: Список субтитров
+        entries: Список субтитров или таблица CueTable
         
     Returns:
         dict: Статистика (количество реплик, общая длительность и т.д.)
@@ -146,9 +121,14 @@ def get_srt_stats(entries: List[SubtitleEntry]) -> dict:
             'total_text_length': 0
         }
     
-    last_entry = entries[-1]
-    total_duration = time_to_seconds(last_entry.end_time)
-    total_text_length = sum(len(e.text) for e in entries)
+    if isinstance(entries, CueTable):
+        # Колонки таблицы: без обхода реплик
+        total_duration = entries.duration_ms / 1000
+        total_text_length = entries.total_text_length
+    else:
+        last_entry = entries[-1]
+        total_duration = last_entry.end_ms / 1000
+        total_text_length = sum(len(e.text) for e in entries)
     
     return {
         'count': len(entries),
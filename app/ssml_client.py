@@ -8,9 +8,11 @@ import json
 import ssl
 import time
 import uuid
+from xml.sax.saxutils import unescape
 from typing import (
     AsyncGenerator,
     Dict,
+    List,
     Optional,
     Tuple,
     Union,
@@ -77,6 +79,7 @@ class SSMLCommunicate:
         connect_timeout: int = 10,
         receive_timeout: int = 60,
         output_format: str = "audio-24khz-48kbitrate-mono-mp3",
+        word_boundary: bool = False,
     ):
         self.ssml = ssml
         self.proxy = proxy
@@ -88,6 +91,9 @@ class SSMLCommunicate:
             sock_connect=connect_timeout,
             sock_read=receive_timeout,
         )
+        self.word_boundary = word_boundary
+        # WordBoundary events collected by save(): offsets/durations in 100ns ticks
+        self.boundaries: List[Dict[str, Union[int, str]]] = []
         self.state = {
             "stream_was_called": False,
         }
@@ -95,12 +101,13 @@ class SSMLCommunicate:
     async def __stream(self) -> AsyncGenerator[TTSChunk, None]:
         async def send_command_request() -> None:
             # We assume simple config for SSML
+            word_boundary = "true" if self.word_boundary else "false"
             await websocket.send_str(
                 f"X-Timestamp:{date_to_string()}\r\n"
                 "Content-Type:application/json; charset=utf-8\r\n"
                 "Path:speech.config\r\n\r\n"
                 '{"context":{"synthesis":{"audio":{"metadataoptions":{'
-                '"sentenceBoundaryEnabled":"false","wordBoundaryEnabled":"false"'
+                '"sentenceBoundaryEnabled":"false","wordBoundaryEnabled":"' + word_boundary + '"'
                 '},"outputFormat":"' + self.output_format + '"}}}}\r\n'
             )
 
@@ -142,6 +149,17 @@ class SSMLCommunicate:
                     
                     if path == b"turn.end":
                         break
+                    elif path == b"audio.metadata":
+                        for meta in json.loads(data).get("Metadata", []):
+                            if meta.get("Type") != "WordBoundary":
+                                continue
+                            meta_data = meta["Data"]
+                            yield {
+                                "type": "WordBoundary",
+                                "offset": meta_data["Offset"],
+                                "duration": meta_data["Duration"],
+                                "text": unescape(meta_data["text"]["Text"]),
+                            }
                     elif path not in (b"response", b"turn.start", b"audio.metadata"):
                         pass # Ignore unknown paths for now
 
@@ -198,3 +216,5 @@ class SSMLCommunicate:
             async for message in self.stream():
                 if message["type"] == "audio":
                     audio.write(message["data"])
+                elif message["type"] == "WordBoundary":
+                    self.boundaries.append(message)
@@ -0,0 +1,247 @@
+"""Потоковое чтение субтитров (.srt, .vtt, .ass/.ssa).
+
+Файл читается построчно за один проход: кодировка определяется один раз
+по BOM или образцу байтов, тайминги сразу переводятся в целые миллисекунды,
+а пауза до следующей реплики вычисляется с опережением на одну запись.
+В памяти одновременно находятся только текущая и следующая реплики.
+"""
+
+from __future__ import annotations
+
+import codecs
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+# Размер образца для определения кодировки
+_SAMPLE_SIZE = 64 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# HH:MM:SS,mmm | HH:MM:SS.mmm | MM:SS.mmm (WebVTT) | H:MM:SS.cc (ASS)
+_TIMESTAMP_RE = re.compile(r'(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{1,3})')
+_TIMING_LINE_RE = re.compile(
+    r'^\s*((?:\d+:)?\d{1,2}:\d{2}[,.]\d{1,3})\s*-->\s*((?:\d+:)?\d{1,2}:\d{2}[,.]\d{1,3})'
+)
+_VTT_TAG_RE = re.compile(r'<[^>]+>')
+_ASS_OVERRIDE_RE = re.compile(r'\{[^}]*\}')
+
+
+@dataclass
+class SubtitleCue:
+    """Реплика субтитров с таймингами в миллисекундах."""
+    number: int
+    start_ms: int
+    end_ms: int
+    text: str
+    gap_ms: int = 0  # пауза до следующей реплики
+
+
+def parse_timestamp(value: str) -> int:
+    """Переводит метку времени субтитров в миллисекунды.
+
+    Поддерживаются форматы SRT ("00:00:01,500"), WebVTT ("00:01.500")
+    и ASS ("0:00:01.50").
+
+    Example:
+        >>> parse_timestamp("00:00:01,500")
+        1500
+    """
+    match = _TIMESTAMP_RE.search(value)
+    if not match:
+        raise ValueError(f"Некорректная метка времени: {value!r}")
+
+    hours, minutes, seconds, fraction = match.groups()
+    ms = int(fraction.ljust(3, '0'))
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + ms
+
+
+def format_timestamp(ms: int) -> str:
+    """Переводит миллисекунды в формат SRT ("HH:MM:SS,mmm")."""
+    seconds, ms = divmod(max(0, ms), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def detect_encoding(file_path: Path) -> str:
+    """Определяет кодировку файла по BOM или образцу байтов.
+
+    Returns:
+        str: Имя кодировки для open()
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(_SAMPLE_SIZE)
+
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    # Образец может оборваться посреди многобайтового символа
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    # Однобайтовые кодировки: выбираем windows-1251, если в тексте есть кириллица
+    cyrillic = sum(1 for byte in sample if byte >= 0xC0)
+    return 'windows-1251' if cyrillic > len(sample) // 50 else 'cp1252'
+
+
+def detect_format(file_path: Path, first_line: str) -> str:
+    """Определяет формат субтитров: 'srt', 'vtt' или 'ass'."""
+    suffix = file_path.suffix.lower()
+    header = first_line.lstrip('\ufeff').strip()
+
+    if header.startswith('WEBVTT') or suffix == '.vtt':
+        return 'vtt'
+    if header.startswith('[Script Info]') or suffix in ('.ass', '.ssa'):
+        return 'ass'
+    return 'srt'
+
+
+def _tokenize_blocks(lines: Iterable[str], strip_tags: bool) -> Iterator[SubtitleCue]:
+    """Разбор блоков SRT/WebVTT: [номер/идентификатор] + строка таймингов + текст."""
+    number = 0
+    timing: Optional[re.Match] = None
+    text_lines: List[str] = []
+    skip_block = False
+
+    def flush() -> Optional[SubtitleCue]:
+        if timing is None:
+            return None
+        text = '\n'.join(text_lines).strip()
+        if strip_tags:
+            text = _VTT_TAG_RE.sub('', text).strip()
+        return SubtitleCue(
+            number=number,
+            start_ms=parse_timestamp(timing.group(1)),
+            end_ms=parse_timestamp(timing.group(2)),
+            text=text,
+        )
+
+    previous_line = ''
+    for raw_line in lines:
+        line = raw_line.rstrip('\r\n')
+
+        if not line.strip():
+            cue = flush()
+            if cue is not None:
+                yield cue
+            timing, text_lines, skip_block = None, [], False
+            previous_line = ''
+            continue
+
+        if skip_block:
+            continue
+
+        if timing is None:
+            match = _TIMING_LINE_RE.match(line)
+            if match:
+                timing = match
+                ident = previous_line.strip()
+                number = int(ident) if ident.isdigit() else number + 1
+            elif strip_tags and line.startswith(('WEBVTT', 'NOTE', 'STYLE', 'REGION')):
+                # Заголовок и служебные блоки WebVTT
+                skip_block = True
+            previous_line = line
+            continue
+
+        text_lines.append(line)
+
+    cue = flush()
+    if cue is not None:
+        yield cue
+
+
+def _tokenize_ass(lines: Iterable[str]) -> Iterator[SubtitleCue]:
+    """Разбор строк Dialogue из секции [Events] файла ASS/SSA."""
+    in_events = False
+    fields: List[str] = []
+    number = 0
+
+    for raw_line in lines:
+        line = raw_line.strip()
+
+        if line.startswith('['):
+            in_events = line.lower() == '[events]'
+            continue
+        if not in_events:
+            continue
+
+        if line.startswith('Format:'):
+            fields = [name.strip().lower() for name in line[len('Format:'):].split(',')]
+            continue
+
+        if not line.startswith('Dialogue:') or not fields:
+            continue
+
+        values = line[len('Dialogue:'):].split(',', len(fields) - 1)
+        if len(values) != len(fields):
+            continue
+        record = dict(zip(fields, values))
+
+        text = _ASS_OVERRIDE_RE.sub('', record.get('text', ''))
+        text = text.replace('\\N', '\n').replace('\\n', '\n').replace('\\h', ' ').strip()
+
+        number += 1
+        yield SubtitleCue(
+            number=number,
+            start_ms=parse_timestamp(record['start']),
+            end_ms=parse_timestamp(record['end']),
+            text=text,
+        )
+
+
+def _with_gaps(cues: Iterator[SubtitleCue]) -> Iterator[SubtitleCue]:
+    """Дополняет реплики паузой до следующей (опережение на одну запись)."""
+    current = next(cues, None)
+    for following in cues:
+        current.gap_ms = max(0, following.start_ms - current.end_ms)
+        yield current
+        current = following
+    if current is not None:
+        yield current
+
+
+def iter_subtitles(file_path: str | Path) -> Iterator[SubtitleCue]:
+    """Потоково читает файл субтитров и выдаёт реплики по одной.
+
+    Args:
+        file_path: Путь к .srt, .vtt или .ass/.ssa файлу
+
+    Yields:
+        SubtitleCue: Реплика с таймингами в мс и паузой до следующей
+
+    Raises:
+        FileNotFoundError: Если файл не найден
+    """
+    file_path = Path(file_path)
+
+    if not file_path.exists():
+        raise FileNotFoundError(f"Файл не найден: {file_path}")
+
+    encoding = detect_encoding(file_path)
+
+    with open(file_path, 'r', encoding=encoding, errors='replace') as f:
+        first_line = f.readline()
+        subtitle_format = detect_format(file_path, first_line)
+
+        def lines() -> Iterator[str]:
+            yield first_line.lstrip('\ufeff')
+            yield from f
+
+        if subtitle_format == 'ass':
+            cues = _tokenize_ass(lines())
+        else:
+            cues = _tokenize_blocks(lines(), strip_tags=(subtitle_format == 'vtt'))
+
+        yield from _with_gaps(cues)
@@ -0,0 +1,134 @@
+"""Компактное колоночное хранение реплик субтитров.
+
+CueTable хранит тайминги в массивах array('i') (мс), а тексты — одной
+строкой-блобом со смещениями. Вместо списка объектов SubtitleEntry
+(по объекту и четыре строки на реплику) таблица отдаёт лёгкие
+представления CueView, совместимые с SubtitleEntry по атрибутам,
+поэтому extract_text_with_timings, get_srt_stats и generate_marked_text
+работают с ней без копирования данных.
+"""
+
+from __future__ import annotations
+
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator, List
+
+from app.subtitle_reader import SubtitleCue, iter_subtitles, format_timestamp
+
+
+class CueView:
+    """Представление одной реплики CueTable (атрибуты как у SubtitleEntry)."""
+
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table: CueTable, index: int) -> None:
+        self._table = table
+        self._index = index
+
+    @property
+    def number(self) -> int:
+        return self._table.numbers[self._index]
+
+    @property
+    def start_ms(self) -> int:
+        return self._table.starts[self._index]
+
+    @property
+    def end_ms(self) -> int:
+        return self._table.ends[self._index]
+
+    @property
+    def start_time(self) -> str:
+        return format_timestamp(self.start_ms)
+
+    @property
+    def end_time(self) -> str:
+        return format_timestamp(self.end_ms)
+
+    @property
+    def pause_after(self) -> float:
+        return self._table.gaps[self._index] / 1000
+
+    @property
+    def text(self) -> str:
+        return self._table.text(self._index)
+
+    def __repr__(self) -> str:
+        return (
+            f"CueView(number={self.number}, start_time={self.start_time!r}, "
+            f"end_time={self.end_time!r}, text={self.text!r})"
+        )
+
+
+class CueTable:
+    """Таблица реплик: колонки array('i') и текстовый блоб со смещениями."""
+
+    __slots__ = ('numbers', 'starts', 'ends', 'gaps', '_offsets', '_blob')
+
+    def __init__(self) -> None:
+        self.numbers = array('i')
+        self.starts = array('i')
+        self.ends = array('i')
+        self.gaps = array('i')
+        self._offsets = array('q', [0])
+        self._blob = ''
+
+    @classmethod
+    def from_cues(cls, cues: Iterable[SubtitleCue]) -> CueTable:
+        """Собрать таблицу из потока реплик (например, iter_subtitles)."""
+        table = cls()
+        texts: List[str] = []
+        offset = 0
+
+        for cue in cues:
+            table.numbers.append(cue.number)
+            table.starts.append(cue.start_ms)
+            table.ends.append(cue.end_ms)
+            table.gaps.append(cue.gap_ms)
+            texts.append(cue.text)
+            offset += len(cue.text)
+            table._offsets.append(offset)
+
+        table._blob = ''.join(texts)
+        return table
+
+    @classmethod
+    def from_file(cls, file_path: str | Path) -> CueTable:
+        """Прочитать файл субтитров (.srt, .vtt, .ass) в таблицу.
+
+        Raises:
+            ValueError: Если файл не содержит реплик
+        """
+        table = cls.from_cues(iter_subtitles(file_path))
+        if not len(table):
+            raise ValueError("Файл не содержит корректных .srt записей")
+        return table
+
+    def text(self, index: int) -> str:
+        """Текст реплики по индексу."""
+        return self._blob[self._offsets[index]:self._offsets[index + 1]]
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __getitem__(self, index: int) -> CueView:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("CueTable index out of range")
+        return CueView(self, index)
+
+    def __iter__(self) -> Iterator[CueView]:
+        for index in range(len(self)):
+            yield CueView(self, index)
+
+    @property
+    def total_text_length(self) -> int:
+        """Суммарная длина текстов всех реплик."""
+        return len(self._blob)
+
+    @property
+    def duration_ms(self) -> int:
+        """Время окончания последней реплики."""
+        return self.ends[-1] if len(self) else 0
@@ -1,17 +1,100 @@
 import re
+import time
+import zlib
+import asyncio
 import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar
 from app.yo_processor import fix_yo_sure
 from app.yo_processor import fix_yo_sure
-from app.gemini_corrector import fix_text_with_gemini_async
+from app.gemini_corrector import (
+    fix_text_with_gemini_async,
+    fix_cues_with_gemini_async,
+    fix_sentences_with_gemini_async,
+    stream_text_with_gemini_async,
+    is_safe_correction,
+    get_cached_correction,
+    store_correction,
+)
 from app.custom_dictionary import apply_custom_dictionary
-from app.gemini_triggers import get_regex
+from app.correction_diff import diff_corrections
+from app.homograph_memory import get_memory
+from app.yo_disambiguator import CONFIDENCE_THRESHOLD as YO_MODEL_THRESHOLD, get_model
+from app.gemini_triggers import get_index
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 # Загрузка триггеров из файла
-_NEED_CONTEXT_RE = get_regex()
+_NEED_CONTEXT_INDEX = get_index()
+
+# Бюджет входных токенов на один пакетный запрос реплик к Gemini
+GEMINI_BATCH_TOKENS = 4000
+# Грубая оценка: символов на токен для кириллицы
+_CHARS_PER_TOKEN = 3
+# Одновременных пакетных запросов
+GEMINI_BATCH_CONCURRENCY = 3
+
+# Запрашивать у Gemini JSON-список правок вместо всего исправленного текста
+GEMINI_EDIT_MODE = True
+
+# Потоковый режим для длинного текста: текст уходит потоковыми запросами по частям,
+# а готовые предложения сразу передаются в синтез (см. correct_text_with_gemini_stream).
+# Включается настройкой gemini_stream (GEMINI_STREAM в .env)
+GEMINI_STREAM_MODE = False
+# Размер части текста в потоковом режиме (токенов): ответ повторяет весь текст части,
+# поэтому часть должна с запасом укладываться в лимит выходных токенов модели
+GEMINI_STREAM_SHARD_TOKENS = 4000
+
+# Бюджет времени всей Gemini-стадии для одного текста (набора реплик), с; по его
+# истечении озвучивается текст после словаря и yoditor (None — без ограничения).
+# Одну попытку запроса ограничивает GEMINI_REQUEST_TIMEOUT в gemini_corrector
+GEMINI_JOB_TIMEOUT = 180.0
+# Не прерывать опоздавшие запросы: их ответы попадут в кеш для следующего раза
+GEMINI_KEEP_LATE_RESULTS = True
+
+# Разрешать омографы по локальной памяти (homograph_memory) до обращения к Gemini
+# и пополнять её принятыми ответами
+HOMOGRAPH_MEMORY = True
 
-async def prepare_text_for_tts(text: str, gemini_enabled: bool = True, thinking_mode: bool = False) -> str:
+# Офлайн-модель «е/ё» и омографов (yo_disambiguator, файл yo_model.json):
+# уверенные выборы применяются без Gemini, неуверенные остаются ему
+YO_MODEL = True
+
+# Доля фрагментов, разрешённых памятью омографов и офлайн-моделью, которая всё равно
+# уходит в Gemini: его ответ пополняет память, и ошибочное решение перестаёт быть уверенным.
+# Выбор зависит только от текста фрагмента (CRC32), поэтому повторная обработка того же
+# текста даёт тот же результат (ключи хранилища фрагментов SRT не меняются)
+OFFLINE_AUDIT_RATE = 0.05
+
+# Опоздавшие Gemini-задачи (ссылки, чтобы задачи не собрал сборщик мусора)
+_late_tasks: Set[asyncio.Task] = set()
+
+# Граница абзацев: абзацы кешируются и отправляются в Gemini по отдельности
+_PARAGRAPH_SPLIT_RE = re.compile(r'(\n+)')
+# Граница предложений: пробелы после .!?… (и закрывающих кавычек/скобок) или перевод строки
+_SENTENCE_SPLIT_RE = re.compile(r'((?:(?<=[.!?…])|(?<=[.!?…][»"”)\']))\s+|\n+)')
+
+async def prepare_text_for_tts(
+    text: str,
+    gemini_enabled: bool = True,
+    thinking_mode: bool = False,
+    sentence_scope: bool = True,
+    edit_mode: bool = GEMINI_EDIT_MODE,
+    timeout: Optional[float] = GEMINI_JOB_TIMEOUT
+) -> str:
+    if not text:
+        return text
+
+    text = normalize_text_for_tts(text)
+    return await correct_text_with_gemini(text, gemini_enabled, thinking_mode, sentence_scope, edit_mode, timeout)
+
+
+def normalize_text_for_tts(text: str) -> str:
+    """Local (CPU-bound) stage of prepare_text_for_tts: dictionary and yoditor.
+
+    Safe to run in an executor thread.
+    """
     if not text:
         return text
 
@@ -28,138 +111,810 @@ async def prepare_text_for_tts(text: str, gemini_enabled: bool = True, thinking_
     except Exception as e:
         logger.error(f"Error in yoditor fix_yo_sure: {e}")
 
+    # 2b. Ambiguous "yo" cases the offline model is confident about
+    text = _recover_yo_offline(text)
+
+    return text
+
+
+async def correct_text_with_gemini(
+    text: str,
+    gemini_enabled: bool = True,
+    thinking_mode: bool = False,
+    sentence_scope: bool = True,
+    edit_mode: bool = GEMINI_EDIT_MODE,
+    timeout: Optional[float] = GEMINI_JOB_TIMEOUT
+) -> str:
+    """Network stage of prepare_text_for_tts: contextual Gemini pass over normalized text.
+
+    The whole stage is bounded by `timeout` seconds: when it runs out, the
+    normalized text is returned unchanged (see _run_with_deadline).
+    """
+    if not text:
+        return text
+
     # 3. Contextual processing (only if Gemini enabled and suspicious words are present)
     if not gemini_enabled:
         logger.info("Gemini отключён пользователем. Пропускаем контекстный анализ.")
         return text
     
-    # Reload triggers for each generation (allows editing without restart)
-    from app.gemini_triggers import reload_triggers, get_hints_for_matches
-    _NEED_CONTEXT_RE = reload_triggers()
+    # Pick up edits of the triggers file (recompiled only when its content changes)
+    from app.gemini_triggers import refresh_triggers
+    _NEED_CONTEXT_INDEX = refresh_triggers()
     
-    # Find all matches to pass to Gemini
-    matches = _NEED_CONTEXT_RE.findall(text)
+    # Find all matches (with their hints) to pass to Gemini
+    found = _NEED_CONTEXT_INDEX.find(text)
     
-    if matches:
-        # Get hints (original forms with stress) for matched words
-        hints = get_hints_for_matches(matches)
-        logger.info(f"Contextual ambiguity detected! Matched words: {matches}")
-        logger.info(f"Hints for Gemini: {hints}")
-        logger.info("Calling Gemini...")
-        
-        # Замер времени и подсчёт исправлений
-        import time
-        from app.gemini_stats import get_stats
-        
-        start = time.perf_counter()
-        original_text = text
-        
-        try:
-            # Pass matched triggers (hints) to helper
-            text = await fix_text_with_gemini_async(text, triggers=hints, thinking_mode=thinking_mode)
-            logger.info(f"Gemini response: {text}")
-            
-            # Подсчёт исправлений (грубая оценка: ё + phoneme tags)
-            corrections_yo = text.count('ё') - original_text.count('ё')
-            corrections_ipa = text.count('<phoneme')
-            total_corrections = max(0, corrections_yo) + corrections_ipa
-            
-            # Детальный анализ исправлений
-            from app.gemini_stats import CorrectionEntry
-            details = _analyze_corrections(original_text, text)
-            
-            # Замер времени
-            elapsed_ms = (time.perf_counter() - start) * 1000
-            
-            # Обновление статистики
-            stats = get_stats()
-            logger.info(f"Updating stats with {len(details)} details: {details}")
-            stats.increment_call(elapsed_ms, total_corrections, details)
-            stats.save()
-            
-            logger.info(f"Статистика: +{total_corrections} исправлений, {elapsed_ms:.0f}ms")
-            
-        except Exception as e:
-            logger.error(f"Error in Gemini fix_text_with_gemini_async: {e}")
-    else:
+    if not found:
         logger.info(f"No triggerwords found in text. Skipping Gemini.")
-
-    return text
-
-
-def _analyze_corrections(original: str, corrected: str) -> list:
-    """Сравнить два текста и найти изменения (ё или IPA)."""
-    from app.gemini_stats import CorrectionEntry
-    import re
+        return text
     
-    details = []
+    matches = [match.word for match in found]
+    logger.info(f"Contextual ambiguity detected! Matched words: {matches}")
     
-    # 1. Подготовка corrected текста: защищаем пробелы внутри тегов, чтобы split() их не разбил
-    # Ищем все теги <phoneme ...>...</phoneme>
-    # Используем placeholder для пробела
-    PLACEHOLDER = "___SPACE___"
+    from app.gemini_stats import get_stats
+    stats = get_stats()
     
-    def protect_tag(match):
-        return match.group(0).replace(" ", PLACEHOLDER)
-        
-    protected_corrected = re.sub(r'<phoneme[^>]*>.*?</phoneme>', protect_tag, corrected, flags=re.DOTALL)
+    if sentence_scope:
+        work = _fix_trigger_sentences(text, _NEED_CONTEXT_INDEX, thinking_mode, edit_mode, stats)
+    else:
+        work = _fix_trigger_paragraphs(text, _NEED_CONTEXT_INDEX, thinking_mode, edit_mode, stats)
+    
+    fixed = await _run_with_deadline(work, timeout, stats)
+    return text if fixed is None else fixed
+
+
+async def _fix_trigger_paragraphs(text: str, trigger_index, thinking_mode: bool, edit_mode: bool, stats) -> str:
+    """Контекстная обработка по абзацам (каждый абзац с триггерами — отдельный запрос)."""
+    # Paragraphs are cached and sent separately, so re-processing an edited
+    # chapter only calls Gemini for the paragraphs that actually changed
+    parts = _PARAGRAPH_SPLIT_RE.split(text)  # even: paragraphs, odd: line breaks
+    pending: List[Tuple[int, List[str]]] = []
     
-    # 2. Токенизация
-    words_orig = original.split()
-    words_corr = protected_corrected.split()
+    for index in range(0, len(parts), 2):
+        paragraph = parts[index]
+        # Hints: original forms (with stress) of matched triggers
+        hints = list(dict.fromkeys(match.hint for match in trigger_index.finditer(paragraph)))
+        if not hints:
+            continue
+        
+        cached = get_cached_correction(paragraph, hints, thinking_mode, edit_mode=edit_mode)
+        if cached is not None:
+            parts[index] = cached.text
+            stats.increment_cache_hit(cached.latency_ms)
+            continue
+        resolved = _resolve_offline(paragraph, trigger_index, stats)
+        if resolved is not None:
+            parts[index] = resolved
+            continue
+        pending.append((index, hints))
     
-    # 3. Выравнивание
-    # Поскольку Gemini может менять пунктуацию или склеивать что-то, 
-    # простого zip() может быть недостаточно, но с защитой тегов это будет намного точнее.
-    # Для статистики пока оставим zip/min-length, так как полноценный diff - это оверхед.
+    if not pending:
+        logger.info("All paragraphs with triggerwords resolved from cache or homograph memory.")
+        stats.save()
+        return ''.join(parts)
     
-    limit = min(len(words_orig), len(words_corr))
+    logger.info(f"Calling Gemini for {len(pending)} paragraph(s)...")
+    semaphore = asyncio.Semaphore(GEMINI_BATCH_CONCURRENCY)
     
-    for i in range(limit):
-        w_orig = words_orig[i]
-        # Восстанавливаем пробелы в токене
-        w_corr = words_corr[i].replace(PLACEHOLDER, " ")
+    async def fix_paragraph(index: int, hints: List[str]) -> None:
+        original_text = parts[index]
+        logger.info(f"Hints for Gemini: {hints}")
         
-        # Очистка от пунктуации для сравнения слов (чтобы "слово." == "слово")
-        # Но аккуратно, чтобы не сломать теги
-        w_orig_clean = w_orig.strip(".,!?;:()\"'")
+        # Замер времени и подсчёт исправлений
+        async with semaphore:
+            start = time.perf_counter()
+            # Pass matched triggers (hints) to helper
+            fixed = await fix_text_with_gemini_async(
+                original_text, triggers=hints, thinking_mode=thinking_mode, edit_mode=edit_mode
+            )
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Gemini response: {fixed}")
+        parts[index] = fixed
+        # Ответ принят, только если он сохранён в кеш (при ошибке и таймауте
+        # возвращается исходный абзац — его нельзя запоминать как решение)
+        if get_cached_correction(original_text, hints, thinking_mode, edit_mode=edit_mode) is not None:
+            _learn_resolutions(original_text, fixed, trigger_index)
         
-        # Если это тег, то внутри него слово тоже может быть с пунктуацией, но тег мы не стрипим
-        is_ipa = '<phoneme' in w_corr
+        # Детальный анализ исправлений (по одному на исправленное слово)
+        details = _analyze_corrections(original_text, fixed)
+        total_corrections = len(details)
         
-        if not is_ipa:
-            w_corr_clean = w_corr.strip(".,!?;:()\"'")
-            if w_orig_clean == w_corr_clean:
-                continue
+        # Обновление статистики
+        logger.info(f"Updating stats with {len(details)} details: {details}")
+        stats.increment_call(elapsed_ms, total_corrections, details)
         
-        # 1. Проверка на IPA тег
-        if is_ipa:
-            # Пытаемся извлечь само слово из тега для красивого отображения
-            # w_corr: <phoneme... ph='...'>замок</phoneme>
-            match = re.search(r'>([^<]+)</phoneme>', w_corr)
-            clean_word = match.group(1) if match else w_corr
-            
-            # Если слово внутри тега совпадает с оригиналом (игнорируя ударения/пунктуацию),
-            # то это точно наше исправление
-            # Но даже если не совпадает (Gemini исправил букву), всё равно логируем
-            
-            details.append(CorrectionEntry(
-                original=w_orig_clean, # Берем очищенное слово (без пунктуации)
-                corrected=clean_word + " (IPA)", 
-                type='ipa'
-            ))
+        logger.info(f"Статистика: +{total_corrections} исправлений, {elapsed_ms:.0f}ms")
+    
+    try:
+        await asyncio.gather(*(fix_paragraph(index, hints) for index, hints in pending))
+    except Exception as e:
+        logger.error(f"Error in Gemini fix_text_with_gemini_async: {e}")
+    finally:
+        stats.save()
+
+    return ''.join(parts)
+
+
+async def _run_with_deadline(work: Awaitable[T], timeout: Optional[float], stats) -> Optional[T]:
+    """Выполняет Gemini-стадию не дольше timeout секунд.
+
+    Если бюджет исчерпан, стадия учитывается в статистике как таймаут.
+    При GEMINI_KEEP_LATE_RESULTS задача продолжает работу в фоне (её ответы
+    сохраняются в кеш и пригодятся при следующей обработке), иначе отменяется.
+
+    Returns:
+        Результат стадии или None, если она не уложилась в бюджет
+    """
+    task = asyncio.ensure_future(work)
+    if timeout is None:
+        return await task
+
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if done:
+        return task.result()
+
+    stats.increment_timeout()
+    stats.save()
+    if GEMINI_KEEP_LATE_RESULTS:
+        logger.warning(
+            f"Gemini не уложился в {timeout:.0f} с: текст озвучивается без контекстной обработки, "
+            "ответы будут сохранены в кеш по готовности"
+        )
+        _late_tasks.add(task)
+        task.add_done_callback(_on_late_task_done)
+    else:
+        logger.warning(f"Gemini не уложился в {timeout:.0f} с: текст озвучивается без контекстной обработки")
+        task.cancel()
+    return None
+
+
+def _on_late_task_done(task: asyncio.Task) -> None:
+    _late_tasks.discard(task)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        logger.error(f"Late Gemini task failed: {task.exception()}")
+    else:
+        logger.info("Late Gemini task finished, answers saved to cache.")
+
+
+def _stream_shards(text: str, max_chars: int) -> List[str]:
+    """Splits text into shards of about max_chars, at paragraph boundaries where possible.
+
+    A paragraph longer than max_chars is split at sentence boundaries. Joined
+    together, the shards form the original text.
+    """
+    shards: List[str] = []
+    current: List[str] = []
+    size = 0
+    paragraph_end = 0  # pieces in `current` up to the last paragraph boundary
+    for leading, sentence, trailing in _split_sentence_units(text):
+        piece = f"{leading}{sentence}{trailing}"
+        if current and size + len(piece) > max_chars:
+            cut = paragraph_end or len(current)
+            shards.append(''.join(current[:cut]))
+            current = current[cut:]
+            size = sum(len(part) for part in current)
+            paragraph_end = 0
+        current.append(piece)
+        size += len(piece)
+        if '\n' in trailing:
+            paragraph_end = len(current)
+    if current:
+        shards.append(''.join(current))
+    return shards
+
+
+async def correct_text_with_gemini_stream(
+    text: str,
+    gemini_enabled: bool = True,
+    thinking_mode: bool = False,
+    timeout: Optional[float] = GEMINI_JOB_TIMEOUT
+) -> AsyncIterator[str]:
+    """Streaming variant of correct_text_with_gemini: yields the corrected text sentence by sentence.
+
+    The text is split into shards of up to GEMINI_STREAM_SHARD_TOKENS (at paragraph
+    boundaries), so a long text does not run into the output token limit. Shards are
+    processed in order: a shard without triggers is yielded as is, a cached shard or
+    one resolved by the homograph memory is yielded without a request, and the rest
+    go to Gemini one streamed request each (full-text prompt).
+    Complete sentences are cut out of the stream as soon as they arrive, checked
+    against the original sentence at the same position (only ё and <phoneme>
+    tags may differ) and yielded with the original whitespace around them.
+    If a stream fails or a sentence does not match, the rest of that shard is
+    yielded unchanged; once the `timeout` budget of the whole text runs out, so
+    are the remaining shards. Joined together, the yielded segments form the
+    corrected text.
+    """
+    if not text:
+        return
+
+    if not gemini_enabled:
+        logger.info("Gemini отключён пользователем. Пропускаем контекстный анализ.")
+        yield text
+        return
+
+    # Pick up edits of the triggers file (recompiled only when its content changes)
+    from app.gemini_triggers import refresh_triggers
+    trigger_index = refresh_triggers()
+
+    if next(iter(trigger_index.finditer(text)), None) is None:
+        logger.info(f"No triggerwords found in text. Skipping Gemini.")
+        yield text
+        return
+
+    from app.gemini_stats import get_stats
+    stats = get_stats()
+
+    shards = _stream_shards(text, GEMINI_STREAM_SHARD_TOKENS * _CHARS_PER_TOKEN)
+    if len(shards) > 1:
+        logger.info(f"Streaming text in {len(shards)} shards")
+    deadline = None if timeout is None else time.monotonic() + timeout
+    timed_out = False
+    for shard in shards:
+        if not timed_out and deadline is not None and time.monotonic() >= deadline:
+            logger.warning(f"Gemini не уложился в {timeout:.0f} с: остаток текста озвучивается без контекстной обработки")
+            stats.increment_timeout()
+            timed_out = True
+        if timed_out:
+            yield shard
+            continue
+        async for segment in _stream_shard(shard, trigger_index, thinking_mode, deadline, stats):
+            yield segment
+        stats.save()
+
+
+async def _stream_shard(
+    text: str,
+    trigger_index,
+    thinking_mode: bool,
+    deadline: Optional[float],
+    stats
+) -> AsyncIterator[str]:
+    """One shard of correct_text_with_gemini_stream (see there)."""
+    hints = list(dict.fromkeys(match.hint for match in trigger_index.finditer(text)))
+    if not hints:
+        yield text
+        return
+
+    # Same key as fix_text_with_gemini_async: the prompt is identical
+    cached = get_cached_correction(text, hints, thinking_mode)
+    if cached is not None:
+        logger.info("Text found in Gemini cache.")
+        stats.increment_cache_hit(cached.latency_ms)
+        yield cached.text
+        return
+    resolved = _resolve_offline(text, trigger_index, stats)
+    if resolved is not None:
+        yield resolved
+        return
+
+    units = _split_sentence_units(text)
+    logger.info(f"Streaming {len(units)} sentences through Gemini. Hints: {hints}")
+
+    start = time.perf_counter()
+    corrected: List[str] = []
+    buffer = ""
+    complete = diverged = False
+    stream = stream_text_with_gemini_async(text, triggers=hints, thinking_mode=thinking_mode)
+    try:
+        while not complete and not diverged:
+            try:
+                if deadline is None:
+                    delta = await stream.__anext__()
+                else:
+                    delta = await asyncio.wait_for(stream.__anext__(), max(0.0, deadline - time.monotonic()))
+            except StopAsyncIteration:
+                delta, complete = "", True
+            except asyncio.TimeoutError:
+                logger.error("Gemini stream timed out. Falling back to original text.")
+                stats.increment_timeout()
+                break
+            except Exception as e:
+                logger.error(f"Error in Gemini stream: {e}. Falling back to original text.")
+                break
+
+            sentences, buffer = _cut_sentences(buffer + delta, final=complete)
+            for sentence in sentences:
+                index = len(corrected)
+                if index >= len(units) or not is_safe_correction(units[index][1], sentence):
+                    logger.warning(
+                        f"Gemini stream diverged from the original at sentence {index + 1}. "
+                        "Rest of the text left unchanged."
+                    )
+                    diverged = True
+                    break
+                leading, original, trailing = units[index]
+                _learn_resolutions(original, sentence, trigger_index)
+                corrected.append(f"{leading}{sentence}{trailing}")
+                yield corrected[-1]
+    finally:
+        await stream.aclose()
+
+    complete = complete and not diverged
+    done = len(corrected)
+    if done < len(units):
+        if complete:
+            logger.warning(f"Gemini stream returned {done} of {len(units)} sentences. Rest left unchanged.")
+            complete = False
+        yield ''.join(f"{leading}{sentence}{trailing}" for leading, sentence, trailing in units[done:])
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    original_text = ''.join(f"{leading}{sentence}{trailing}" for leading, sentence, trailing in units[:done])
+    fixed = ''.join(corrected)
+    if complete:
+        store_correction(text, fixed, elapsed_ms, hints, thinking_mode)
+
+    details = _analyze_corrections(original_text, fixed)
+    total_corrections = len(details)
+    stats.increment_call(elapsed_ms, total_corrections, details)
+    logger.info(f"Gemini stream: {done}/{len(units)} sentences, +{total_corrections} исправлений, {elapsed_ms:.0f}ms")
+
+
+def _resolve_offline(text: str, trigger_index, stats) -> str | None:
+    """Разрешает все триггеры фрагмента по памяти омографов и офлайн-модели, без Gemini.
+
+    Returns:
+        Фрагмент с разрешёнными словами или None, если хотя бы одно слово
+        не разрешено уверенно или фрагмент выбран для проверки
+        (OFFLINE_AUDIT_RATE) — тогда он уходит в Gemini целиком
+    """
+    if not HOMOGRAPH_MEMORY:
+        return None
+    spans = list(dict.fromkeys((match.start, match.end) for match in trigger_index.finditer(text)))
+    if not spans:
+        return None
+    words = get_memory().resolve(text, spans)
+    unresolved = [span for span, word in zip(spans, words) if word is None]
+    model = get_model() if YO_MODEL and unresolved else None
+    if model is not None:
+        # Чего нет в памяти, решает офлайн-модель — только уверенно
+        confident = {
+            (candidate.start, candidate.end): candidate.replacement
+            for candidate in model.candidates(text, unresolved)
+            if candidate.confidence >= YO_MODEL_THRESHOLD
+        }
+        words = [confident.get(span) if word is None else word for span, word in zip(spans, words)]
+    resolved = all(word is not None for word in words)
+    if resolved and zlib.crc32(text.encode('utf-8')) % 100 < OFFLINE_AUDIT_RATE * 100:
+        logger.debug("Фрагмент, разрешённый офлайн, отправлен в Gemini для проверки")
+        resolved = False
+    stats.increment_offline(resolved)
+    if not resolved:
+        return None
+
+    parts: List[str] = []
+    last = 0
+    for (start, end), word in sorted(zip(spans, words)):
+        parts.append(text[last:start])
+        parts.append(word)
+        last = end
+    parts.append(text[last:])
+    return ''.join(parts)
+
+
+def _recover_yo_offline(text: str) -> str:
+    """Расставляет «ё» в неоднозначных словах, где офлайн-модель уверена.
+
+    Слова-триггеры не трогаются: их разрешают память омографов и Gemini.
+    """
+    if not YO_MODEL:
+        return text
+    try:
+        model = get_model()
+        if model is None:
+            return text
+        triggers = [(match.start, match.end) for match in get_index().finditer(text)]
+        text, replaced = model.recover_yo(text, YO_MODEL_THRESHOLD, exclude=triggers)
+        if replaced:
+            logger.info(f"Модель «ё»: {replaced} слов без Gemini")
+    except Exception as e:
+        logger.error(f"Error in offline yo model: {e}")
+    return text
+
+
+def _learn_resolutions(original: str, corrected: str, trigger_index) -> None:
+    """Пополняет память омографов принятым ответом Gemini."""
+    if not HOMOGRAPH_MEMORY:
+        return
+    spans = [(match.start, match.end) for match in trigger_index.finditer(original)]
+    if spans:
+        get_memory().learn(original, corrected, spans)
+
+
+def _split_sentence_units(text: str) -> List[Tuple[str, str, str]]:
+    """Разбивает текст на предложения с окружающими их пробелами и разделителями.
+
+    Returns:
+        List[Tuple[str, str, str]]: (пробелы до, предложение, пробелы и разделитель после);
+        склейка всех троек даёт исходный текст
+    """
+    units: List[List[str]] = []
+    leading = ""
+    for position, piece in enumerate(_SENTENCE_SPLIT_RE.split(text)):
+        sentence = piece.strip() if position % 2 == 0 else ""
+        if not sentence:
+            # Разделитель или пустой фрагмент — к предыдущему предложению
+            if units:
+                units[-1][2] += piece
+            else:
+                leading += piece
             continue
-            
-        # 2. Проверка на Ё
-        # Сравниваем clean версии
-        if 'ё' in w_corr_clean.lower() and 'е' in w_orig_clean.lower():
-            if w_corr_clean.lower().replace('ё', 'е') == w_orig_clean.lower():
-                details.append(CorrectionEntry(
-                    original=w_orig_clean,
-                    corrected=w_corr_clean,
-                    type='yo'
-                ))
+        offset = piece.index(sentence)
+        units.append([leading + piece[:offset], sentence, piece[offset + len(sentence):]])
+        leading = ""
+    if not units:
+        return [(leading, "", "")]
+    return [tuple(unit) for unit in units]
+
+
+def _cut_sentences(buffer: str, final: bool) -> Tuple[List[str], str]:
+    """Выделяет из начала потока законченные предложения.
+
+    Args:
+        buffer: Принятый, но ещё не разобранный текст ответа
+        final: Поток закончился (последнее предложение тоже законченное)
+
+    Returns:
+        Tuple[List[str], str]: Непустые законченные предложения и остаток буфера
+    """
+    pieces = _SENTENCE_SPLIT_RE.split(buffer)
+    # Последнее предложение ещё может дописываться
+    rest = "" if final else pieces.pop()
+    return [piece.strip() for piece in pieces[0::2] if piece.strip()], rest
+
+
+def _keep_whitespace(original: str, corrected: str) -> str:
+    """Возвращает исправленному предложению пробелы вокруг исходного (ответы обрезаны)."""
+    leading = original[:len(original) - len(original.lstrip())]
+    trailing = original[len(original.rstrip()):]
+    return f"{leading}{corrected.strip()}{trailing}"
+
+
+async def _fix_trigger_sentences(text: str, trigger_index, thinking_mode: bool, edit_mode: bool, stats) -> str:
+    """Контекстная обработка по предложениям: в Gemini уходят только предложения с триггерами.
+
+    Каждое такое предложение отправляется пронумерованной строкой вместе с
+    соседними (только как контекст), ответы вставляются обратно по индексам.
+    Остальной текст в запрос не попадает.
+    """
+    parts = _SENTENCE_SPLIT_RE.split(text)  # even: sentences, odd: separators
+    sentences = parts[0::2]
+    result = list(sentences)
+
+    # Paragraph number of each sentence: requests are sharded at paragraph boundaries
+    paragraphs: Dict[int, int] = {}
+    paragraph = 0
+    for index in range(len(sentences)):
+        if index and '\n' in parts[2 * index - 1]:
+            paragraph += 1
+        paragraphs[index] = paragraph
+
+    sentence_hints: Dict[int, List[str]] = {}
+    cache_texts: Dict[int, str] = {}
+    flagged: List[Tuple[int, str]] = []
+
+    for index, sentence in enumerate(sentences):
+        hints = list(dict.fromkeys(match.hint for match in trigger_index.finditer(sentence)))
+        if not hints:
+            continue
+        # The answer depends on the context sent with the sentence
+        before = sentences[index - 1] if index > 0 else ""
+        after = sentences[index + 1] if index + 1 < len(sentences) else ""
+        cache_text = f"{before}\n{sentence}\n{after}"
+
+        cached = get_cached_correction(cache_text, hints, thinking_mode, kind="sentence", edit_mode=edit_mode)
+        if cached is not None:
+            result[index] = _keep_whitespace(sentence, cached.text)
+            stats.increment_cache_hit(cached.latency_ms)
+            continue
+        resolved = _resolve_offline(sentence, trigger_index, stats)
+        if resolved is not None:
+            result[index] = resolved
+            continue
+        sentence_hints[index] = hints
+        cache_texts[index] = cache_text
+        flagged.append((index, sentence.strip()))
+
+    if flagged:
+        context = {
+            neighbour: sentences[neighbour]
+            for index, _ in flagged
+            for neighbour in (index - 1, index + 1)
+            if 0 <= neighbour < len(sentences) and sentences[neighbour].strip()
+        }
+        logger.info(
+            f"Calling Gemini for {len(flagged)} of {len(sentences)} sentences "
+            f"({len(context)} context sentences)..."
+        )
+        fixed = await _run_gemini_batches(
+            flagged,
+            sentence_hints,
+            cache_texts,
+            lambda batch, hints: fix_sentences_with_gemini_async(batch, context, hints, thinking_mode, edit_mode),
+            "sentence",
+            thinking_mode,
+            edit_mode,
+            stats,
+            groups=paragraphs,
+            trigger_index=trigger_index,
+        )
+        for index, corrected in fixed.items():
+            result[index] = _keep_whitespace(sentences[index], corrected)
+    else:
+        logger.info("All sentences with triggerwords resolved from cache or homograph memory.")
+
+    stats.save()
+    parts[0::2] = result
+    return ''.join(parts)
+
+
+async def _run_gemini_batches(
+    flagged: List[Tuple[int, str]],
+    item_hints: Dict[int, List[str]],
+    cache_texts: Dict[int, str],
+    fix_batch: Callable[[List[Tuple[int, str]], List[str]], Awaitable[Dict[int, str]]],
+    kind: str,
+    thinking_mode: bool,
+    edit_mode: bool,
+    stats,
+    groups: Dict[int, int] | None = None,
+    trigger_index=None
+) -> Dict[int, str]:
+    """Отправляет пронумерованные строки в Gemini пакетами и кеширует ответы.
+
+    Args:
+        flagged: Пары (индекс, текст) для обработки
+        item_hints: Подсказки каждой строки (ключ кеша строится по ним)
+        cache_texts: Текст ключа кеша для каждой строки
+        fix_batch: Запрос к Gemini для пакета (пакет, подсказки пакета)
+        kind: Вид промпта для ключа кеша ("cue" или "sentence")
+        thinking_mode: Режим размышлений модели
+        edit_mode: Ответы запрашиваются списком правок (статистика берётся из правок)
+        stats: Статистика Gemini
+        groups: Номер абзаца по индексу (пакеты режутся по границам абзацев)
+        trigger_index: Индекс триггеров; если задан, ответы пополняют память омографов
+
+    Returns:
+        Dict[int, str]: Исправленные тексты по индексам
+    """
+    batches = batch_cues_by_tokens(flagged, groups=groups)
+    logger.info(f"Gemini requests: {len(batches)}")
+    semaphore = asyncio.Semaphore(GEMINI_BATCH_CONCURRENCY)
+    fixed_all: Dict[int, str] = {}
+
+    async def run_batch(batch: List[Tuple[int, str]]) -> None:
+        hints = list(dict.fromkeys(hint for index, _ in batch for hint in item_hints[index]))
+        async with semaphore:
+            start = time.perf_counter()
+            fixed = await fix_batch(batch, hints)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if not fixed:
+            # No line came back (error or timeout, already logged): not a successful call
+            logger.warning(f"Gemini batch: no lines returned for {len(batch)} lines, {elapsed_ms:.0f}ms")
+            return
+
+        edits = getattr(fixed, 'edits', None)
+        total_corrections = 0
+        details = []
+        for index, original_text in batch:
+            if index not in fixed:
                 continue
-                
+            text = fixed[index]
+            fixed_all[index] = text
+            # Cached per line (with its own hints), so regrouping batches keeps hits
+            store_correction(
+                cache_texts[index], text, elapsed_ms / len(batch),
+                item_hints[index], thinking_mode, kind=kind, edit_mode=edit_mode
+            )
+            if trigger_index is not None:
+                _learn_resolutions(original_text, text, trigger_index)
+            if edits is not None:
+                # Exact stats: one accepted edit per corrected word
+                applied = edits.get(index, [])
+                total_corrections += len(applied)
+                details.extend(_edits_to_details(applied))
+            else:
+                found = _analyze_corrections(original_text, text)
+                total_corrections += len(found)
+                details.extend(found)
+
+        stats.increment_call(elapsed_ms, total_corrections, details)
+        logger.info(f"Gemini batch: {len(batch)} lines, +{total_corrections} исправлений, {elapsed_ms:.0f}ms")
+
+    # A failed shard keeps its original text; the others are still applied
+    results = await asyncio.gather(*(run_batch(batch) for batch in batches), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error in Gemini batch: {result}")
+
+    return fixed_all
+
+
+def batch_cues_by_tokens(
+    cues: List[Tuple[int, str]],
+    max_tokens: int = GEMINI_BATCH_TOKENS,
+    groups: Dict[int, int] | None = None
+) -> List[List[Tuple[int, str]]]:
+    """Разбивает реплики на пакеты, укладывающиеся в бюджет токенов.
+
+    Args:
+        cues: Пары (индекс реплики, текст)
+        max_tokens: Оценочный бюджет токенов на пакет
+        groups: Номер группы (абзаца) по индексу: подряд идущие строки одной
+            группы попадают в один пакет, если группа укладывается в бюджет
+
+    Returns:
+        Пакеты реплик в исходном порядке
+    """
+    # Неделимые единицы: подряд идущие строки одной группы
+    units: List[List[Tuple[int, str]]] = []
+    for index, text in cues:
+        if groups is not None and units and groups.get(units[-1][-1][0]) == groups.get(index):
+            units[-1].append((index, text))
+        else:
+            units.append([(index, text)])
+
+    batches: List[List[Tuple[int, str]]] = []
+    current: List[Tuple[int, str]] = []
+    current_tokens = 0
+
+    def add(items: List[Tuple[int, str]], tokens: int) -> None:
+        nonlocal current, current_tokens
+        if current and current_tokens + tokens > max_tokens:
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.extend(items)
+        current_tokens += tokens
+
+    for unit in units:
+        # + номер реплики и перевод строки
+        item_tokens = [len(text) // _CHARS_PER_TOKEN + 4 for _, text in unit]
+        if sum(item_tokens) <= max_tokens:
+            add(unit, sum(item_tokens))
+        else:
+            # Группа больше бюджета: делим её по строкам
+            for item, tokens in zip(unit, item_tokens):
+                add([item], tokens)
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def prepare_cues_for_tts(
+    texts: List[str],
+    gemini_enabled: bool = True,
+    thinking_mode: bool = False,
+    edit_mode: bool = GEMINI_EDIT_MODE,
+    timeout: Optional[float] = GEMINI_JOB_TIMEOUT
+) -> List[str]:
+    """Обрабатывает реплики субтитров тем же конвейером, что и prepare_text_for_tts.
+
+    Словарь замен и yoditor применяются к каждой реплике, а в Gemini
+    уходят только реплики с триггерными словами, которых нет в кеше, —
+    несколькими пронумерованными пакетами вместо запроса на каждую реплику.
+
+    Args:
+        texts: Тексты реплик
+        gemini_enabled: Использовать Gemini для контекстной обработки
+        thinking_mode: Режим размышлений модели
+        edit_mode: Запрашивать у Gemini список правок вместо текста реплик
+        timeout: Бюджет времени Gemini-стадии (с); по его истечении реплики
+            возвращаются после словаря и yoditor. None — без ограничения
+
+    Returns:
+        List[str]: Обработанные тексты в том же порядке
+    """
+    # Словарь замен и yoditor — тот же локальный этап, что и для текста
+    result: List[str] = []
+    for text in texts:
+        result.append(normalize_text_for_tts(text) if text else text)
+
+    if not gemini_enabled:
+        logger.info("Gemini отключён пользователем. Пропускаем контекстный анализ реплик.")
+        return result
+
+    from app.gemini_triggers import refresh_triggers
+    trigger_index = refresh_triggers()
+
+    from app.gemini_stats import get_stats
+    stats = get_stats()
+
+    # 3. Contextual processing: only cues with trigger words that are not cached yet
+    cue_hints: Dict[int, List[str]] = {}
+    flagged: List[Tuple[int, str]] = []
+    cache_hits = 0
+    for index, text in enumerate(result):
+        if not text:
+            continue
+        hints = list(dict.fromkeys(match.hint for match in trigger_index.finditer(text)))
+        if not hints:
+            continue
+        cached = get_cached_correction(text, hints, thinking_mode, kind="cue", edit_mode=edit_mode)
+        if cached is not None:
+            result[index] = cached.text
+            stats.increment_cache_hit(cached.latency_ms)
+            cache_hits += 1
+            continue
+        resolved = _resolve_offline(text, trigger_index, stats)
+        if resolved is not None:
+            result[index] = resolved
+            cache_hits += 1
+            continue
+        cue_hints[index] = hints
+        flagged.append((index, text))
+
+    if not flagged:
+        if cache_hits:
+            logger.info(f"All {cache_hits} cues with triggerwords resolved from cache or homograph memory.")
+            stats.save()
+        else:
+            logger.info("No triggerwords found in cues. Skipping Gemini.")
+        return result
+
+    logger.info(
+        f"Contextual ambiguity in {len(flagged) + cache_hits} of {len(result)} cues "
+        f"({cache_hits} from cache or homograph memory)"
+    )
+
+    try:
+        fixed = await _run_with_deadline(
+            _run_gemini_batches(
+                flagged,
+                cue_hints,
+                dict(flagged),
+                lambda batch, hints: fix_cues_with_gemini_async(
+                    batch, triggers=hints, thinking_mode=thinking_mode, edit_mode=edit_mode
+                ),
+                "cue",
+                thinking_mode,
+                edit_mode,
+                stats,
+                trigger_index=trigger_index,
+            ),
+            timeout,
+            stats,
+        )
+        for index, text in (fixed or {}).items():
+            result[index] = text
+    finally:
+        stats.save()
+
+    return result
+
+
+def _edits_to_details(edits: list) -> list:
+    """Записи статистики из принятых правок Gemini (точные, без сравнения текстов)."""
+    from app.gemini_stats import CorrectionEntry
+
+    details = []
+    for edit in edits:
+        if edit.type == 'ipa':
+            match = re.search(r'>([^<]+)</phoneme>', edit.replacement)
+            corrected = (match.group(1) if match else edit.replacement) + " (IPA)"
+        else:
+            corrected = edit.replacement
+        details.append(CorrectionEntry(original=edit.original, corrected=corrected, type=edit.type))
     return details
 
+
+def _analyze_corrections(original: str, corrected: str) -> list:
+    """Сравнить два текста и найти изменения (ё или IPA) по выравниванию слов."""
+    from app.gemini_stats import CorrectionEntry
+
+    return [
+        CorrectionEntry(
+            original=edit.original,
+            corrected=f"{edit.corrected} (IPA)" if edit.type == 'ipa' else edit.corrected,
+            type=edit.type
+        )
+        for edit in diff_corrections(original, corrected)
+    ]
+
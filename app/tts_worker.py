@@ -9,6 +9,7 @@ import re
 import tempfile
 import traceback
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, List, Tuple
 from xml.sax.saxutils import escape
@@ -17,11 +18,28 @@ import edge_tts
 from edge_tts.exceptions import NoAudioReceived
 from PySide6.QtCore import QThread, Signal
 
+from app.gemini_client import close_async_client
 from app.ssml_client import SSMLCommunicate
-from app.text_pipeline import prepare_text_for_tts
+from app.text_pipeline import (
+    GEMINI_JOB_TIMEOUT,
+    GEMINI_STREAM_MODE,
+    correct_text_with_gemini,
+    correct_text_with_gemini_stream,
+    normalize_text_for_tts,
+)
 from app.srt_audio_generator import generate_srt_audio_from_entries
 from app.srt_parser import SubtitleEntry
 
+# Batch stages (read → normalize → Gemini → chunk → synthesize → assemble → post-process)
+# are connected by bounded queues. How many files may be prepared ahead of synthesis:
+PREPARE_AHEAD = 2
+# Concurrent synthesis requests for the chunks of one file
+SYNTH_CONCURRENCY = 2
+# Max characters per synthesis request
+MAX_CHUNK_CHARS = 5000
+# Streaming mode: the first chunk is sent as soon as this much corrected text has arrived
+STREAM_FIRST_CHUNK_CHARS = 1000
+
 
 class TtsWorker(QThread):
     finished = Signal(str)  # Emits the path to the generated audio (last one or list)
@@ -42,6 +60,8 @@ class TtsWorker(QThread):
         self._loop_running = asyncio.Event() # Not thread-safe, used inside loop? No, need threading.Event
         import threading
         self._ready_event = threading.Event()
+        # Dictionary + yoditor (CPU-bound) run here, one text at a time; lives as long as run()
+        self._normalize_executor: Optional[ThreadPoolExecutor] = None
 
     def run(self) -> None:
         """Run the persistent event loop."""
@@ -51,6 +71,7 @@ class TtsWorker(QThread):
             
             self.loop = asyncio.new_event_loop()
             asyncio.set_event_loop(self.loop)
+            self._normalize_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-normalize")
             
             self.logger.info("Worker loop started.")
             self._ready_event.set()
@@ -69,9 +90,13 @@ class TtsWorker(QThread):
                         task.cancel()
                     
                     self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                    # Close the pooled Gemini client (its connection is bound to this loop)
+                    self.loop.run_until_complete(close_async_client())
                     self.loop.close()
                 except Exception as e:
                     self.logger.error(f"Error closing loop: {e}")
+            if self._normalize_executor:
+                self._normalize_executor.shutdown(wait=False)
             self.logger.info("Worker loop stopped.")
 
     def stop(self) -> None:
@@ -102,7 +127,9 @@ class TtsWorker(QThread):
         output_format: str,
         gemini_enabled: bool = True,  # Использовать Gemini для ё-фикации
         use_stress: bool = False,
-        thinking_mode: bool = False
+        thinking_mode: bool = False,
+        gemini_stream: bool = GEMINI_STREAM_MODE,
+        gemini_timeout: Optional[float] = GEMINI_JOB_TIMEOUT
     ) -> None:
         """Submit a processing request to the worker loop."""
         if not self._ready_event.is_set() or not self.loop:
@@ -112,7 +139,8 @@ class TtsWorker(QThread):
 
         # Prepare arguments for the coroutine
         coro = self._process_batch(
-            tasks, voice_id, rate, temp_prefix, timeout, proxy, pause_ms, output_format, gemini_enabled, use_stress, thinking_mode
+            tasks, voice_id, rate, temp_prefix, timeout, proxy, pause_ms, output_format, gemini_enabled, use_stress, thinking_mode,
+            gemini_stream, gemini_timeout
         )
         
         asyncio.run_coroutine_threadsafe(coro, self.loop)
@@ -125,7 +153,11 @@ class TtsWorker(QThread):
         quality: str,
         rate: int,
         voice_id: str = None,
-        use_stress: bool = False
+        use_stress: bool = False,
+        project_path: Optional[Path] = None,
+        gemini_enabled: bool = True,
+        thinking_mode: bool = False,
+        gemini_timeout: Optional[float] = GEMINI_JOB_TIMEOUT
     ) -> None:
         """Submit an SRT processing request."""
         if not self._ready_event.is_set() or not self.loop:
@@ -133,7 +165,10 @@ class TtsWorker(QThread):
             self.error.emit("Worker not ready.")
             return
 
-        coro = self._process_srt_request(marked_text, entries, output_path, quality, rate, voice_id, use_stress)
+        coro = self._process_srt_request(
+            marked_text, entries, output_path, quality, rate, voice_id, use_stress, project_path,
+            gemini_enabled, thinking_mode, gemini_timeout
+        )
         asyncio.run_coroutine_threadsafe(coro, self.loop)
 
     async def _process_srt_request(
@@ -144,7 +179,11 @@ class TtsWorker(QThread):
         quality: str,
         rate: int,
         voice_id: str = None,
-        use_stress: bool = False
+        use_stress: bool = False,
+        project_path: Optional[Path] = None,
+        gemini_enabled: bool = True,
+        thinking_mode: bool = False,
+        gemini_timeout: Optional[float] = GEMINI_JOB_TIMEOUT
     ) -> None:
         try:
             self.logger.info(f"Starting SRT generation: {output_path}")
@@ -171,7 +210,11 @@ class TtsWorker(QThread):
                 rate=rate,
                 progress_callback=progress_cb,
                 default_voice=voice_id,
-                use_stress=use_stress
+                use_stress=use_stress,
+                project_path=project_path,
+                gemini_enabled=gemini_enabled,
+                thinking_mode=thinking_mode,
+                gemini_timeout=gemini_timeout
             )
             
             self.finished.emit(output_path)
@@ -194,7 +237,9 @@ class TtsWorker(QThread):
         output_format: str,
         gemini_enabled: bool = True,
         use_stress: bool = False,
-        thinking_mode: bool = False
+        thinking_mode: bool = False,
+        gemini_stream: bool = GEMINI_STREAM_MODE,
+        gemini_timeout: Optional[float] = GEMINI_JOB_TIMEOUT
     ) -> None:
         # Store params for helper methods
         self.voice_id = voice_id
@@ -207,26 +252,77 @@ class TtsWorker(QThread):
         self.gemini_enabled = gemini_enabled
         self.use_stress = use_stress
         self.thinking_mode = thinking_mode
+        self.gemini_stream = gemini_stream
+        self.gemini_timeout = gemini_timeout
         
         total_files = len(tasks)
         last_generated_path = ""
-        
-        try:
+
+        # Bounded queues give backpressure: preparation (dictionary, yoditor, Gemini)
+        # runs at most PREPARE_AHEAD files ahead of synthesis, and synthesis at most
+        # one file ahead of assembly, so memory and temp files stay bounded while
+        # Gemini latency for the next files hides behind synthesis of the current one.
+        prepared: asyncio.Queue = asyncio.Queue(maxsize=PREPARE_AHEAD)
+        synthesized: asyncio.Queue = asyncio.Queue(maxsize=1)
+        prepare_tasks: List[asyncio.Task] = []
+
+        async def prepare_stage() -> None:
             for i, (text, output_path) in enumerate(tasks):
+                # Streaming mode: corrected sentences are handed to synthesis as they arrive
+                segments = asyncio.Queue() if self.gemini_stream else None
+                task = asyncio.ensure_future(self._prepare_text(text, segments))
+                prepare_tasks.append(task)
+                # Blocks while PREPARE_AHEAD files are waiting for synthesis
+                await prepared.put((i, output_path, task, segments))
+            await prepared.put(None)
+
+        async def synthesize_stage() -> None:
+            while (item := await prepared.get()) is not None:
+                i, output_path, text_task, segments = item
+
                 # Determine destination
                 final_destination = output_path or Path(self._temp_file_name())
                 filename = final_destination.name
-                last_generated_path = str(final_destination)
-                
+
                 # Emit batch progress
                 self.batch_progress.emit(i + 1, total_files, filename)
                 self.logger.info(f"Processing file {i+1}/{total_files}: {filename}")
 
-                # Generate audio for this file
-                await self._generate_single_file(text, final_destination)
-                
+                if segments is None:
+                    parts = await self._synthesize_file(await text_task, final_destination)
+                else:
+                    parts = await self._synthesize_stream(segments, final_destination)
+                    try:
+                        # Preparation errors surface here (the stream just ends early)
+                        await text_task
+                    except BaseException:
+                        self._remove_temp_files(parts)
+                        raise
+                await synthesized.put((final_destination, parts))
+            await synthesized.put(None)
+
+        async def assemble_stage() -> None:
+            nonlocal last_generated_path
+            while (item := await synthesized.get()) is not None:
+                final_destination, parts = item
+                if parts:
+                    try:
+                        self.progress.emit("Склейка аудиофайлов...")
+                        # ffmpeg is a blocking subprocess: keep the loop free for the other stages
+                        await asyncio.to_thread(self._merge_audio_files, parts, final_destination)
+                    finally:
+                        self._remove_temp_files(parts)
+
+                last_generated_path = str(final_destination)
                 # Emit file finished
                 self.file_finished.emit(str(final_destination))
+
+        stages = [
+            asyncio.ensure_future(stage())
+            for stage in (prepare_stage, synthesize_stage, assemble_stage)
+        ]
+        try:
+            await asyncio.gather(*stages)
             
             # Emit finished signal with the last file path
             self.finished.emit(last_generated_path)
@@ -235,32 +331,61 @@ class TtsWorker(QThread):
             tb = traceback.format_exc()
             self.logger.error("Worker failed: %s\n%s", exc, tb)
             self.error.emit(f"{exc}\n{tb}")
-
-    async def _generate_single_file(self, text: str, final_destination: Path) -> None:
-        # 0. Fix "yo" letter (Yoditor + Gemini)
-        # Note: prepare_text_for_tts calls Gemini. 
-        # Since we are in a persistent loop, we should ensure Gemini client is managed correctly.
-        # The previous "on-demand" fix in main_window might conflict if we don't init here?
-        # Actually, main_window calls init_client() before calling process_request.
-        # But since we are in a DIFFERENT THREAD, the global client in gemini_client.py 
-        # might be accessed from this thread.
-        # `gemini_client` uses a global variable. It is not thread-local.
-        # However, `create_client()` creates a NEW client instance.
-        # `yo_gemini_async.py` calls `create_client()`.
-        # So as long as `_api_key` is set in `gemini_client` (which is done by main thread),
-        # `create_client()` inside this thread will work and create a client bound to THIS loop.
-        # AND `yo_gemini_async` now has `finally: client.close()`.
-        # So this should be fine!
-        
-        # So this should be fine!
-        
-        text = await prepare_text_for_tts(text, self.gemini_enabled, self.thinking_mode)
+        finally:
+            for task in stages + prepare_tasks:
+                task.cancel()
+            await asyncio.gather(*stages, *prepare_tasks, return_exceptions=True)
+            # Parts synthesized but never assembled
+            while not synthesized.empty():
+                item = synthesized.get_nowait()
+                if item is not None:
+                    self._remove_temp_files(item[1])
+
+    async def _prepare_text(self, text: str, segments: Optional[asyncio.Queue] = None) -> str:
+        """Read → normalize → Gemini stage for one file.
+
+        Args:
+            text: Source text
+            segments: Streaming mode: corrected segments are put here as they
+                arrive from Gemini, followed by None (also on error)
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            # 0. Fix "yo" letter: dictionary + yoditor in the normalize executor (CPU-bound)
+            text = await loop.run_in_executor(self._normalize_executor, normalize_text_for_tts, text)
+            
+            # Gemini goes through the pooled client of this loop
+            # (gemini_client.get_async_client); main_window sets the key/proxy via
+            # init_client(); the client is rebuilt when they change and closed in run().
+            if segments is None:
+                text = await correct_text_with_gemini(
+                    text, self.gemini_enabled, self.thinking_mode, timeout=self.gemini_timeout
+                )
+            else:
+                parts = []
+                async for segment in correct_text_with_gemini_stream(
+                    text, self.gemini_enabled, self.thinking_mode, timeout=self.gemini_timeout
+                ):
+                    parts.append(segment)
+                    segments.put_nowait(segment)
+                text = ''.join(parts)
+        finally:
+            if segments is not None:
+                segments.put_nowait(None)
         # Use repr() to avoid UnicodeEncodeError in Windows console with IPA chars
         self.logger.info(f"Текст после обработки (Gemini+Yoditor): {repr(text)}")
-        
+        return text
+
+    async def _synthesize_file(self, text: str, final_destination: Path) -> List[Path]:
+        """Chunk → synthesize stage for one file.
+
+        Returns:
+            Chunk files to assemble into final_destination (empty if the audio
+            was written to final_destination directly or the text is empty)
+        """
         if not text or not text.strip():
             self.logger.warning("Text is empty after processing. Skipping generation.")
-            return
+            return []
 
         # Apply stress if enabled
         # Note: russtress removed. 'use_stress' now only controls raw_ssml for Gemini phonemes.
@@ -268,43 +393,105 @@ class TtsWorker(QThread):
         rate_str = f"{self.rate:+d}%"
 
         # 1. Chunk the text
-        chunks = self._chunk_text(text, max_chars=5000)
+        chunks = self._chunk_text(text, max_chars=MAX_CHUNK_CHARS)
         self.logger.info("Text split into %d chunks", len(chunks))
         
         if len(chunks) == 1:
             # Simple case: just one chunk
             self.progress.emit("Генерация аудио...")
             await self._generate_audio(final_destination, chunks[0], rate_str)
-            return
+            return []
 
-        # 2. Generate audio for each chunk
-        temp_files = []
-        try:
-            for i, chunk in enumerate(chunks):
+        # 2. Generate audio for each chunk (SYNTH_CONCURRENCY at a time)
+        temp_files = [Path(self._temp_file_name()) for _ in chunks]
+        semaphore = asyncio.Semaphore(SYNTH_CONCURRENCY)
+
+        async def synthesize_chunk(i: int, chunk: str, temp_file: Path) -> None:
+            async with semaphore:
                 self.progress.emit(f"Генерация части {i+1} из {len(chunks)}...")
-                temp_file = Path(self._temp_file_name())
                 await self._generate_audio(temp_file, chunk, rate_str)
-                temp_files.append(temp_file)
 
-            # 3. Merge audio files
-            self.progress.emit("Склейка аудиофайлов...")
-            # _merge_audio_files is synchronous (subprocess), so we run it in executor to not block loop?
-            # It uses subprocess.run, which blocks. 
-            # Ideally: await asyncio.to_thread(self._merge_audio_files, temp_files, final_destination)
-            # But for now, blocking the worker loop is acceptable as it's the only task.
-            self._merge_audio_files(temp_files, final_destination)
+        chunk_tasks = [
+            asyncio.ensure_future(synthesize_chunk(i, chunk, temp_file))
+            for i, (chunk, temp_file) in enumerate(zip(chunks, temp_files))
+        ]
+        try:
+            await asyncio.gather(*chunk_tasks)
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                self.logger.error(f"Error generating file {final_destination}: {e}")
+            for task in chunk_tasks:
+                task.cancel()
+            await asyncio.gather(*chunk_tasks, return_exceptions=True)
+            self._remove_temp_files(temp_files)
+            raise
+
+        return temp_files
+
+    async def _synthesize_stream(self, segments: asyncio.Queue, final_destination: Path) -> List[Path]:
+        """Chunk → synthesize stage for a file whose text arrives as a stream.
+
+        Segments are collected into chunks; each chunk is synthesized as soon as
+        it is complete. The first chunk is short (STREAM_FIRST_CHUNK_CHARS) so
+        audio generation starts right after the first sentences arrive.
+
+        Returns:
+            Chunk files to assemble into final_destination (empty if the text is empty)
+        """
+        rate_str = f"{self.rate:+d}%"
+        semaphore = asyncio.Semaphore(SYNTH_CONCURRENCY)
+        temp_files: List[Path] = []
+        chunk_tasks: List[asyncio.Task] = []
+
+        async def synthesize_chunk(n: int, chunk: str, temp_file: Path) -> None:
+            async with semaphore:
+                self.progress.emit(f"Генерация части {n}...")
+                await self._generate_audio(temp_file, chunk, rate_str)
+
+        def start_chunk(chunk: str) -> None:
+            if not chunk.strip():
+                return
+            temp_file = Path(self._temp_file_name())
+            temp_files.append(temp_file)
+            chunk_tasks.append(asyncio.ensure_future(synthesize_chunk(len(temp_files), chunk, temp_file)))
 
-        except Exception as e:
-            self.logger.error(f"Error generating file {final_destination}: {e}")
-            raise e
-        finally:
-            # 4. Cleanup temp files
-            for f in temp_files:
-                try:
-                    if f.exists():
-                        f.unlink()
-                except Exception as e:
-                    self.logger.warning(f"Failed to delete temp file {f}: {e}")
+        buffer = ""
+        limit = STREAM_FIRST_CHUNK_CHARS
+        try:
+            while (segment := await segments.get()) is not None:
+                if buffer and len(buffer) + len(segment) > MAX_CHUNK_CHARS:
+                    start_chunk(buffer)
+                    buffer, limit = "", MAX_CHUNK_CHARS
+                buffer += segment
+                if len(buffer) >= limit:
+                    for chunk in self._chunk_text(buffer, max_chars=MAX_CHUNK_CHARS):
+                        start_chunk(chunk)
+                    buffer, limit = "", MAX_CHUNK_CHARS
+            start_chunk(buffer)
+
+            if not temp_files:
+                self.logger.warning("Text is empty after processing. Skipping generation.")
+            else:
+                self.logger.info("Streamed text split into %d chunks", len(temp_files))
+            await asyncio.gather(*chunk_tasks)
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                self.logger.error(f"Error generating file {final_destination}: {e}")
+            for task in chunk_tasks:
+                task.cancel()
+            await asyncio.gather(*chunk_tasks, return_exceptions=True)
+            self._remove_temp_files(temp_files)
+            raise
+
+        return temp_files
+
+    def _remove_temp_files(self, files: List[Path]) -> None:
+        for f in files:
+            try:
+                if f.exists():
+                    f.unlink()
+            except Exception as e:
+                self.logger.warning(f"Failed to delete temp file {f}: {e}")
 
     def _chunk_text(self, text: str, max_chars: int) -> List[str]:
         """Split text into chunks of max_chars, respecting sentence boundaries."""
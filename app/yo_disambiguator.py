@@ -0,0 +1,377 @@
+"""Офлайн-модель выбора «е/ё» и произношения омографов по контексту.
+
+Для слов из yo_unsure (yobase) и слов-триггеров Gemini хранится компактная
+наивная байесовская модель: частоты форм слова (без изменений, с «ё»,
+с тегом <phoneme>) и частоты признаков контекста для каждой формы —
+соседние слова и пары слов слева и справа, знак препинания после слова.
+
+Модель обучается офлайн (см. main): на корпусе текстов с последовательно
+расставленной «ё» и на наблюдениях памяти омографов (ответы Gemini и
+ручной выбор IPA). В приложении все кандидаты документа оцениваются
+одним проходом, каждому выбору сопоставляется уверенность; в Gemini
+уходят только неуверенные случаи.
+
+Обучение из корня проекта:
+    python -m app.yo_disambiguator корпус.txt [...] [--memory homograph_memory.sqlite3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.file_watch import WatchedFile
+from app.homograph_memory import KEEP, HomographMemory, apply_resolution, resolution_for, tokenize, word_key
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = Path("yo_model.json")
+
+# Минимальная уверенность, с которой выбор модели применяется без Gemini
+CONFIDENCE_THRESHOLD = 0.95
+# Сглаживание частот (аддитивное)
+ALPHA = 1.0
+# Слова с меньшим числом примеров в модель не попадают
+MIN_WORD_SAMPLES = 20
+
+_PUNCTUATION = set('.,!?;:…—–-»"”)')
+# Виды признаков: слово слева/справа, пара слов слева/справа, знак после слова
+_FEATURE_KINDS = ("L", "R", "LL", "RR", "N")
+
+# Формы слова: частоты форм и частоты признаков для каждой формы
+WordTable = Dict[str, Dict[str, Dict[str, float]]]
+
+
+@dataclass
+class YoCandidate:
+    """Слово документа с выбранной формой и уверенностью выбора."""
+    start: int
+    end: int
+    word: str           # слово в тексте
+    resolution: str     # 'keep', 'yo:всё' или 'ipa:<транскрипция>'
+    replacement: str    # слово в выбранной форме
+    confidence: float   # вероятность выбранной формы (0..1)
+
+
+def _features(text: str, tokens: Sequence[Tuple[int, int, str, Optional[str]]], words: Sequence[str], i: int) -> List[str]:
+    """Признаки контекста слова: соседние слова, пары слов и знак после слова."""
+    padded = ["^", "^"] + list(words) + ["$", "$"]
+    at = i + 2
+    following = text[tokens[i][1]:tokens[i][1] + 1]
+    if following in _PUNCTUATION:
+        mark = following
+    else:
+        mark = "_" if not following or following.isspace() else "w"
+    return [
+        f"L:{padded[at - 1]}",
+        f"R:{padded[at + 1]}",
+        f"LL:{padded[at - 2]} {padded[at - 1]}",
+        f"RR:{padded[at + 1]} {padded[at + 2]}",
+        f"N:{mark}",
+    ]
+
+
+class YoModel:
+    """Наивная байесовская модель форм слов по контексту."""
+
+    def __init__(self, words: Dict[str, WordTable], alpha: float = ALPHA) -> None:
+        self.words = words
+        self.alpha = alpha
+
+    @classmethod
+    def load(cls, path: Path = MODEL_FILE) -> Optional[YoModel]:
+        """Загрузить модель (None, если файла нет или он повреждён)."""
+        try:
+            data = json.loads(Path(path).read_text(encoding='utf-8'))
+            return cls(data["words"], data.get("alpha", ALPHA))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Не удалось загрузить модель «ё» {path}: {e}")
+            return None
+
+    def save(self, path: Path = MODEL_FILE) -> None:
+        Path(path).write_text(
+            json.dumps({"alpha": self.alpha, "words": self.words}, ensure_ascii=False, separators=(',', ':')),
+            encoding='utf-8'
+        )
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def _score(self, table: WordTable, priors: Dict[str, float], features: Iterable[str]) -> Tuple[str, float]:
+        """Лучшая форма и её вероятность по признакам одного вхождения."""
+        scores = dict(priors)
+        known = table["features"]
+        for feature in features:
+            counts = known.get(feature)
+            if counts is None:
+                # Признак не встречался при обучении: информации о форме не несёт
+                continue
+            for form in scores:
+                scores[form] += math.log(counts.get(form, 0) + self.alpha)
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        return best, 1.0 / sum(math.exp(score - top) for score in scores.values())
+
+    def _priors(self, table: WordTable) -> Dict[str, float]:
+        """Априорные логарифмы форм с нормировкой частот признаков."""
+        classes = table["classes"]
+        total = sum(classes.values())
+        vocabulary = len(table["features"]) + 1
+        return {
+            form: math.log((count + self.alpha) / (total + self.alpha * len(classes)))
+            # Каждый пример даёт по одному признаку каждого вида: знаменатель P(признак | форма)
+            - len(_FEATURE_KINDS) * math.log(count + self.alpha * vocabulary)
+            for form, count in classes.items()
+        }
+
+    def candidates(self, text: str, spans: Optional[Sequence[Tuple[int, int]]] = None) -> List[YoCandidate]:
+        """Оценивает все известные модели слова документа за один проход.
+
+        Args:
+            text: Текст документа (или фрагмента)
+            spans: Оценить только слова на этих позициях (по умолчанию — все
+                слова текста, известные модели)
+
+        Returns:
+            List[YoCandidate]: Кандидаты в порядке следования в тексте
+            (слова, неизвестные модели, пропускаются)
+        """
+        tokens = tokenize(text)
+        words = [word_key(token[2]) for token in tokens]
+        if spans is None:
+            positions = [i for i, token in enumerate(tokens) if token[3] is None and words[i] in self.words]
+        else:
+            by_span = {(token[0], token[1]): i for i, token in enumerate(tokens) if token[3] is None}
+            positions = [by_span[span] for span in map(tuple, spans) if span in by_span and words[by_span[span]] in self.words]
+
+        # Вхождения одного слова оцениваются вместе: таблица и априорные веса — один раз
+        groups: Dict[str, List[int]] = defaultdict(list)
+        for i in positions:
+            groups[words[i]].append(i)
+
+        result: List[YoCandidate] = []
+        for key, group in groups.items():
+            table = self.words[key]
+            priors = self._priors(table)
+            for i in group:
+                start, end, word, _ = tokens[i]
+                resolution, confidence = self._score(table, priors, _features(text, tokens, words, i))
+                result.append(YoCandidate(start, end, word, resolution, apply_resolution(word, resolution), confidence))
+        result.sort(key=lambda candidate: candidate.start)
+        return result
+
+    def recover_yo(
+        self,
+        text: str,
+        threshold: float = CONFIDENCE_THRESHOLD,
+        exclude: Sequence[Tuple[int, int]] = ()
+    ) -> Tuple[str, int]:
+        """Расставляет «ё» там, где модель уверена (теги <phoneme> не добавляются).
+
+        Args:
+            text: Текст
+            threshold: Минимальная уверенность
+            exclude: Позиции слов, которые не трогать (например, триггеры Gemini)
+
+        Returns:
+            Tuple[str, int]: Текст и число заменённых слов
+        """
+        skip = set(map(tuple, exclude))
+        parts: List[str] = []
+        last = 0
+        for candidate in self.candidates(text):
+            if (
+                candidate.confidence < threshold
+                or not candidate.resolution.startswith("yo:")
+                or candidate.replacement == candidate.word
+                or (candidate.start, candidate.end) in skip
+            ):
+                continue
+            parts.append(text[last:candidate.start])
+            parts.append(candidate.replacement)
+            last = candidate.end
+        if not parts:
+            return text, 0
+        parts.append(text[last:])
+        return ''.join(parts), len(parts) // 2
+
+
+
+class YoModelTrainer:
+    """Сбор примеров из корпуса и памяти омографов и построение YoModel."""
+
+    def __init__(self, vocabulary: Dict[str, List[str]], holdout_every: int = 0) -> None:
+        """
+        Args:
+            vocabulary: Слова yo_unsure: форма с «е» → формы с «ё»
+            holdout_every: Каждый N-й пример корпуса откладывается для оценки (0 — не откладывать)
+        """
+        self.vocabulary = vocabulary
+        self.holdout_every = holdout_every
+        self.holdout: List[Tuple[str, str, List[str]]] = []
+        self._classes: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._features: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+        self._seen = 0
+
+    def add(self, key: str, resolution: str, features: Iterable[str], weight: float = 1.0) -> None:
+        self._classes[key][resolution] += weight
+        for feature in features:
+            self._features[key][feature][resolution] += weight
+
+    def add_text(self, text: str, trigger_index=None) -> int:
+        """Добавить примеры из текста с правильно расставленной «ё».
+
+        Args:
+            text: Текст корпуса
+            trigger_index: Индекс триггеров Gemini (их слова тоже становятся примерами)
+
+        Returns:
+            int: Число добавленных примеров
+        """
+        tokens = tokenize(text)
+        words = [word_key(token[2]) for token in tokens]
+        triggers = set()
+        if trigger_index is not None:
+            triggers = {(match.start, match.end) for match in trigger_index.finditer(text)}
+
+        added = 0
+        for i, (start, end, word, ipa) in enumerate(tokens):
+            if words[i] not in self.vocabulary and (start, end) not in triggers:
+                continue
+            resolution = resolution_for(word, ipa)
+            features = _features(text, tokens, words, i)
+            self._seen += 1
+            if self.holdout_every and self._seen % self.holdout_every == 0:
+                self.holdout.append((words[i], resolution, features))
+                continue
+            self.add(words[i], resolution, features)
+            added += 1
+        return added
+
+    def add_memory(self, memory: HomographMemory) -> int:
+        """Добавить наблюдения памяти омографов (ответы Gemini и ручной выбор IPA).
+
+        Returns:
+            int: Число добавленных наблюдений
+        """
+        added = 0
+        for word, context, resolution, weight in memory.observations("l2r2"):
+            before, _, after = context.split(":", 1)[1].partition("|")
+            left, right = before.split(" "), after.split(" ")
+            if len(left) != 2 or len(right) != 2:
+                continue
+            self.add(word, resolution, [
+                f"L:{left[1]}",
+                f"R:{right[0]}",
+                f"LL:{left[0]} {left[1]}",
+                f"RR:{right[0]} {right[1]}",
+            ], weight)
+            added += 1
+        return added
+
+    def build(self, min_count: float = 2, min_samples: float = MIN_WORD_SAMPLES) -> YoModel:
+        """Построить модель, отбросив редкие признаки и слова с малым числом примеров."""
+        words: Dict[str, WordTable] = {}
+        for key, classes in self._classes.items():
+            if sum(classes.values()) < min_samples:
+                continue
+            forms = dict(classes)
+            # Альтернативные формы есть у слова всегда, даже если в корпусе не встретились
+            forms.setdefault(KEEP, 0.0)
+            for form in self.vocabulary.get(key, []):
+                forms.setdefault(f"yo:{form}", 0.0)
+            features = {
+                feature: dict(counts)
+                for feature, counts in self._features[key].items()
+                if sum(counts.values()) >= min_count
+            }
+            words[key] = {"classes": forms, "features": features}
+        return YoModel(words)
+
+
+def evaluate(model: YoModel, samples: Sequence[Tuple[str, str, List[str]]], threshold: float) -> Tuple[float, float]:
+    """Покрытие (доля уверенных выборов) и точность уверенных выборов на отложенных примерах."""
+    confident = correct = 0
+    known = [sample for sample in samples if sample[0] in model.words]
+    for key, expected, features in known:
+        table = model.words[key]
+        resolution, confidence = model._score(table, model._priors(table), features)
+        if confidence >= threshold:
+            confident += 1
+            correct += resolution == expected
+    coverage = confident / len(known) if known else 0.0
+    accuracy = correct / confident if confident else 0.0
+    return coverage, accuracy
+
+
+def yo_unsure_vocabulary() -> Dict[str, List[str]]:
+    """Слова yo_unsure: форма с «е» → формы с «ё»."""
+    from app.yo_processor import yoditor
+
+    vocabulary: Dict[str, List[str]] = defaultdict(list)
+    if yoditor is None:
+        return vocabulary
+    for word in yoditor.yo_unsure:
+        word = word.lower()
+        vocabulary[word_key(word)].append(word)
+    return vocabulary
+
+
+# Глобальный экземпляр (перечитывается при изменении файла модели)
+_model: Optional[YoModel] = None
+_watch = WatchedFile(MODEL_FILE)
+
+
+def get_model() -> Optional[YoModel]:
+    """Получить модель (None, если она не обучена)."""
+    global _model
+    if _watch.check():
+        _model = YoModel.load(MODEL_FILE)
+        if _model is not None:
+            logger.info(f"Модель «ё» загружена: {len(_model)} слов")
+    return _model
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Обучение офлайн-модели «е/ё» и омографов")
+    parser.add_argument("corpus", nargs="*", help="UTF-8 тексты с последовательно расставленной «ё»")
+    parser.add_argument("--memory", default=None, help="память омографов (homograph_memory.sqlite3)")
+    parser.add_argument("--out", default=str(MODEL_FILE), help="файл модели")
+    parser.add_argument("--min-count", type=float, default=2, help="минимальная частота признака")
+    parser.add_argument("--holdout", type=int, default=10, help="каждый N-й пример корпуса — для оценки (0 — без оценки)")
+    args = parser.parse_args()
+
+    from app.gemini_triggers import refresh_triggers
+
+    trainer = YoModelTrainer(yo_unsure_vocabulary(), holdout_every=args.holdout)
+    trigger_index = refresh_triggers()
+    for path in args.corpus:
+        text = Path(path).read_text(encoding='utf-8')
+        if 'ё' not in text.lower():
+            print(f"{path}: в тексте нет «ё», пропущен (примеры «е» были бы ложными)")
+            continue
+        print(f"{path}: {trainer.add_text(text, trigger_index)} примеров")
+    if args.memory:
+        print(f"{args.memory}: {trainer.add_memory(HomographMemory(Path(args.memory)))} наблюдений")
+
+    model = trainer.build(min_count=args.min_count)
+    model.save(Path(args.out))
+    features = sum(len(table["features"]) for table in model.words.values())
+    print(f"Модель: {len(model)} слов, {features} признаков, {Path(args.out).stat().st_size / 1024:.0f} КБ → {args.out}")
+
+    if trainer.holdout:
+        coverage, accuracy = evaluate(model, trainer.holdout, CONFIDENCE_THRESHOLD)
+        print(f"Отложенные примеры: покрытие {coverage:.1%}, точность {accuracy:.1%} "
+              f"(порог уверенности {CONFIDENCE_THRESHOLD})")
+
+
+if __name__ == "__main__":
+    main()
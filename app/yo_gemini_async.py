@@ -27,9 +27,10 @@ async def fix_yo_with_gemini_async(text: str) -> str:
     if not text:
         return text
     
-    from app.gemini_client import create_client
+    from app.gemini_client import get_async_client
     
-    client = create_client()
+    # Pooled client of the worker loop: reused across requests, closed on worker shutdown
+    client = get_async_client()
     if not client:
         logger.warning("Gemini client not initialized (no key). Skipping contextual yo-fication.")
         return text
@@ -62,10 +63,3 @@ async def fix_yo_with_gemini_async(text: str) -> str:
     except Exception as e:
         logger.error(f"Error calling Gemini for yo-fication: {e}")
         return text
-    finally:
-        # Explicitly close the client to release resources (sockets, etc.)
-        # This is critical for compiled apps where loop restarts might occur or resources are tighter.
-        try:
-            client.close()
-        except Exception as close_err:
-            logger.warning(f"Error closing Gemini client: {close_err}")
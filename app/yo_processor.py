@@ -23,11 +23,12 @@ except ImportError:
 def fix_yo_sure(text: str) -> str:
     """Restore all unambiguous cases of the letter 'ё'.
 
-    Uses yoditor.recover_yo_sure, which:
-    - finds words in the text that always contain 'ё' according to the dictionary;
+    Uses yoditor.recover_yo_sure_indexed (same result as recover_yo_sure), which:
+    - finds words in the text that always contain 'ё' according to the dictionary
+      (one pass over the text with a hash index of the dictionary);
     - replaces 'е' with 'ё' in them;
     - does not touch ambiguous cases (все/всё, etc.).
     """
     if not text or not yoditor:
         return text
-    return yoditor.recover_yo_sure(text)
+    return yoditor.recover_yo_sure_indexed(text)
@@ -0,0 +1,102 @@
+"""Бенчмарк: выравнивание слов (correction_diff) против попарного zip-сравнения.
+
+Синтетический документ: в исправленном тексте расставлены «ё» и теги
+<phoneme>, а в начале вставлено одно слово (Gemini иногда добавляет или
+теряет слово). zip-сравнение после вставки сравнивает несовпадающие слова,
+выравнивание находит все исправления.
+
+Запуск из корня проекта:
+    python benchmarks/bench_correction_diff.py [число_слов]
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.correction_diff import diff_corrections  # noqa: E402
+
+_SENTENCE = "Он сделал все что мог и замок на двери был заперт а еще звезды светили".split()
+_IPA = "<phoneme alphabet='ipa' ph='zɐˈmok'>замок</phoneme>"
+
+
+def make_texts(count: int):
+    """Исходный текст и ответ Gemini: все → всё, еще → ещё, замок → тег, плюс одно вставленное слово."""
+    original, corrected = [], []
+    for i in range(count):
+        word = _SENTENCE[i % len(_SENTENCE)]
+        original.append(word)
+        if word == "все":
+            corrected.append("всё")
+        elif word == "еще":
+            corrected.append("ещё")
+        elif word == "замок":
+            corrected.append(_IPA)
+        else:
+            corrected.append(word)
+    corrected.insert(1, "вот")
+    return " ".join(original), " ".join(corrected)
+
+
+def zip_analyze(original: str, corrected: str) -> list:
+    """Прежний алгоритм: теги защищаются, тексты сравниваются по позиции слова."""
+    placeholder = "___SPACE___"
+    protected = re.sub(
+        r'<phoneme[^>]*>.*?</phoneme>',
+        lambda match: match.group(0).replace(" ", placeholder),
+        corrected,
+        flags=re.DOTALL,
+    )
+    words_orig = original.split()
+    words_corr = protected.split()
+    details = []
+    for i in range(min(len(words_orig), len(words_corr))):
+        w_orig = words_orig[i].strip(".,!?;:()\"'")
+        w_corr = words_corr[i].replace(placeholder, " ")
+        if '<phoneme' in w_corr:
+            match = re.search(r'>([^<]+)</phoneme>', w_corr)
+            details.append(('ipa', w_orig, match.group(1) if match else w_corr))
+            continue
+        w_corr = w_corr.strip(".,!?;:()\"'")
+        if w_orig == w_corr:
+            continue
+        if 'ё' in w_corr.lower() and w_corr.lower().replace('ё', 'е') == w_orig.lower():
+            details.append(('yo', w_orig, w_corr))
+    return details
+
+
+def is_correct(kind: str, original: str, corrected: str) -> bool:
+    """Исправление относится к тому же слову: «е» → «ё» или тег с тем же словом."""
+    if kind == 'yo':
+        return 'ё' in corrected and corrected.replace('ё', 'е') == original
+    return original == corrected
+
+
+def measure(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    original, corrected = make_texts(count)
+    expected = sum(word in ("все", "еще", "замок") for word in original.split())
+
+    zipped, zip_time = measure(zip_analyze, original, corrected)
+    aligned, diff_time = measure(diff_corrections, original, corrected)
+    zip_correct = sum(is_correct(kind, orig, corr) for kind, orig, corr in zipped)
+    diff_correct = sum(is_correct(edit.type, edit.original, edit.corrected) for edit in aligned)
+
+    print(f"Слов: {count}, исправлений в ответе: {expected}")
+    print(f"{'':24}{'время, мс':>12}{'найдено':>12}{'верных':>12}")
+    print(f"{'zip по позиции':24}{zip_time * 1000:>12.1f}{len(zipped):>12}{zip_correct:>12}")
+    print(f"{'выравнивание слов':24}{diff_time * 1000:>12.1f}{len(aligned):>12}{diff_correct:>12}")
+
+
+if __name__ == "__main__":
+    main()
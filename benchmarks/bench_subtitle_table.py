@@ -0,0 +1,94 @@
+"""Бенчмарк: список SubtitleEntry против колоночной таблицы CueTable.
+
+Сравнивает пиковую память и время построения, а также время
+extract_text_with_timings / get_srt_stats / generate_marked_text.
+
+Запуск из корня проекта:
+    python benchmarks/bench_subtitle_table.py [количество_реплик]
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.srt_parser import SubtitleEntry, extract_text_with_timings, get_srt_stats  # noqa: E402
+from app.subtitle_reader import SubtitleCue, format_timestamp  # noqa: E402
+from app.subtitle_table import CueTable  # noqa: E402
+from app.voice_markers import generate_marked_text  # noqa: E402
+
+
+def make_cues(count: int):
+    """Синтетические реплики: 2 с речи и 0.5 с паузы."""
+    for i in range(count):
+        start = i * 2500
+        yield SubtitleCue(
+            number=i + 1,
+            start_ms=start,
+            end_ms=start + 2000,
+            text=f"Реплика номер {i}: всё идёт по плану, ещё немного.",
+            gap_ms=500,
+        )
+
+
+def build_entries(count: int):
+    return [
+        SubtitleEntry(
+            number=cue.number,
+            start_time=format_timestamp(cue.start_ms),
+            end_time=format_timestamp(cue.end_ms),
+            text=cue.text,
+            pause_after=cue.gap_ms / 1000,
+            start_ms=cue.start_ms,
+            end_ms=cue.end_ms,
+        )
+        for cue in make_cues(count)
+    ]
+
+
+def build_table(count: int):
+    return CueTable.from_cues(make_cues(count))
+
+
+def measure_build(builder, count: int):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = builder(count)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current
+
+
+def measure(func, data) -> float:
+    started = time.perf_counter()
+    func(data)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    print(f"Реплик: {count}")
+    print(f"{'':28}{'SubtitleEntry':>16}{'CueTable':>16}")
+
+    entries, entries_time, entries_mem = measure_build(build_entries, count)
+    table, table_time, table_mem = measure_build(build_table, count)
+
+    print(f"{'Память (МБ)':28}{entries_mem / 1e6:>16.1f}{table_mem / 1e6:>16.1f}")
+    print(f"{'Построение (с)':28}{entries_time:>16.3f}{table_time:>16.3f}")
+
+    for name, func in (
+        ("get_srt_stats (с)", get_srt_stats),
+        ("extract_text_with_timings (с)", extract_text_with_timings),
+        ("generate_marked_text (с)", generate_marked_text),
+    ):
+        print(f"{name:28}{measure(func, entries):>16.3f}{measure(func, table):>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Бенчмарк: recover_yo_sure против индексного recover_yo_sure_indexed.
+
+Печатает скорость (символов в секунду) обеих реализаций и проверяет,
+что результаты совпадают.
+
+Запуск из корня проекта:
+    python benchmarks/bench_yoditor.py [путь_к_роману.txt] [--limit СИМВОЛОВ]
+
+Без файла используется синтетический текст из слов yobase. Исходная
+реализация медленная, поэтому для неё текст обрезается до --limit
+символов (по умолчанию 200 000).
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "libs"))
+
+import yoditor  # noqa: E402
+
+
+def synthetic_text(chars: int, seed: int = 0) -> str:
+    """Текст из слов yobase (без «ё») вперемешку с обычными словами."""
+    rng = random.Random(seed)
+    filler = ["и", "в", "не", "на", "он", "она", "что", "было", "сказал", "дом", "день", "все", "ещё"]
+    pool = [word.replace('ё', 'е') for word in rng.sample(yoditor.yo_sure, 5000)]
+    parts = []
+    size = 0
+    while size < chars:
+        word = rng.choice(pool) if rng.random() < 0.15 else rng.choice(filler)
+        if rng.random() < 0.1:
+            word = word.capitalize()
+        word += rng.choice([" ", " ", " ", " ", ", ", ". ", "! ", "… "])
+        parts.append(word)
+        size += len(word)
+    return ''.join(parts)
+
+
+def chars_per_second(func, text: str) -> tuple[float, str]:
+    started = time.perf_counter()
+    result = func(text)
+    elapsed = time.perf_counter() - started
+    return len(text) / elapsed, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", help="UTF-8 текст романа")
+    parser.add_argument("--limit", type=int, default=200_000, help="символов для исходной реализации")
+    args = parser.parse_args()
+
+    if args.path:
+        text = Path(args.path).read_text(encoding='utf-8')
+    else:
+        text = synthetic_text(1_000_000)
+
+    sample = text[:args.limit]
+
+    # Загрузка (или первое построение) индекса — однократная стоимость, измеряем отдельно
+    started = time.perf_counter()
+    yoditor.get_yo_sure_index()
+    index_ms = (time.perf_counter() - started) * 1000
+
+    old_speed, old_result = chars_per_second(yoditor.recover_yo_sure, sample)
+    new_speed, new_result = chars_per_second(yoditor.recover_yo_sure_indexed, sample)
+    full_speed, _ = chars_per_second(yoditor.recover_yo_sure_indexed, text)
+
+    print(f"Текст: {len(text)} символов (исходная реализация: {len(sample)})")
+    print(f"Загрузка индекса: {index_ms:.0f} мс")
+    print(f"recover_yo_sure:          {old_speed:>12,.0f} символов/с")
+    print(f"recover_yo_sure_indexed:  {new_speed:>12,.0f} символов/с "
+          f"(весь текст: {full_speed:,.0f} символов/с)")
+    print(f"Ускорение: x{new_speed / old_speed:.0f}")
+    print(f"Результаты совпадают: {'да' if old_result == new_result else 'НЕТ'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Проверка: MP3 группы реплик, разрезанный по кадрам и склеенный с паузами,
+декодируется без ошибок.
+
+Основные данные кадра Layer III могут начинаться в предыдущих кадрах
+(битовый резервуар). Если кусок начинается с кадра, ссылающегося на
+отброшенные байты, декодер пропускает или искажает этот кадр — на стыке
+реплик слышен щелчок. Скрипт режет MP3 группы (split_frames), склеивает
+куски с паузами (concat_with_silence) и проверяет результат:
+    - каждый кусок декодируется сам по себе: кадры ссылаются только на байты
+      резервуара, которые есть в куске перед ними (в склейке перед куском
+      стоят кадры тишины или другой реплики);
+    - ffmpeg (если установлен) декодирует склеенный файл без ошибок.
+
+Без аргументов группа озвучивается через Edge TTS (нужна сеть), и режется
+по WordBoundary, как при озвучке субтитров. С путём к MP3 файл режется на
+равные части.
+
+Запуск из корня проекта:
+    python benchmarks/check_group_split.py [group.mp3 [число_частей]]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.mp3_frames import (  # noqa: E402
+    concat_with_silence,
+    iter_frames,
+    main_data_begin,
+    split_frames,
+)
+
+QUALITY = "audio-24khz-96kbitrate-mono-mp3"
+VOICE = "ru-RU-DmitryNeural"
+TEXTS = [
+    "Я думал, что ты уже не придёшь.",
+    "Поезд опоздал на целый час, а потом ещё и такси не было.",
+    "Ну ничего, главное — ты здесь.",
+    "Давай сначала выпьем чаю, а потом всё обсудим.",
+]
+PAUSE_MS = 500
+
+
+async def synthesize_group(path: Path):
+    """Озвучивает TEXTS одним запросом и возвращает отрезки реплик (мс)."""
+    from app.srt_audio_generator import build_group_ssml, group_cue_ranges
+    from app.ssml_client import SSMLCommunicate
+
+    ssml = build_group_ssml(TEXTS, VOICE, [0] * len(TEXTS))
+    communicator = SSMLCommunicate(ssml, output_format=QUALITY, word_boundary=True)
+    await communicator.save(str(path))
+    total_ms = sum(header.duration_ms for header, _ in iter_frames(path.read_bytes()))
+    ranges = group_cue_ranges(TEXTS, communicator.boundaries, total_ms)
+    if ranges is None:
+        raise RuntimeError("WordBoundary не сопоставлены с репликами")
+    return ranges
+
+
+def equal_ranges(data: bytes, parts: int):
+    total_ms = sum(header.duration_ms for header, _ in iter_frames(data))
+    step = total_ms / parts
+    return [(i * step, (i + 1) * step) for i in range(parts)]
+
+
+def broken_frames(data: bytes) -> int:
+    """Кадры, чьи основные данные начинаются раньше начала файла (в чужих байтах)."""
+    broken = 0
+    reservoir = 0
+    for header, frame in iter_frames(data):
+        if main_data_begin(header, frame) > reservoir:
+            broken += 1
+        reservoir += header.main_data_size
+    return broken
+
+
+def decode_errors(path: Path):
+    """Ошибки декодирования ffmpeg или None, если ffmpeg не установлен."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return None
+    result = subprocess.run(
+        [ffmpeg, "-v", "error", "-i", str(path), "-f", "null", "-"],
+        capture_output=True, text=True
+    )
+    return [line for line in result.stderr.splitlines() if line.strip()]
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        if len(sys.argv) > 1:
+            group_path = Path(sys.argv[1])
+            parts = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+            ranges = equal_ranges(group_path.read_bytes(), parts)
+        else:
+            group_path = temp_path / "group.mp3"
+            ranges = asyncio.run(synthesize_group(group_path))
+
+        fragments = []
+        for i, chunk in enumerate(split_frames(group_path.read_bytes(), ranges)):
+            fragment = temp_path / f"fragment_{i + 1:04d}.mp3"
+            fragment.write_bytes(chunk)
+            fragments.append(fragment)
+
+        joined = temp_path / "joined.mp3"
+        if not concat_with_silence(fragments, [PAUSE_MS] * len(fragments), str(joined), QUALITY):
+            print("Склейка без перекодирования не удалась (формат не совпал)")
+            return 1
+
+        broken = sum(broken_frames(fragment.read_bytes()) for fragment in fragments)
+        errors = decode_errors(joined)
+
+        print(f"Реплик: {len(fragments)}, кадров с недостающим резервуаром: {broken}")
+        if errors is None:
+            print("ffmpeg не найден: декодирование не проверено")
+        else:
+            print(f"Ошибок декодирования ffmpeg: {len(errors)}")
+            for line in errors[:10]:
+                print(f"  {line}")
+        return 1 if broken or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Compiled Yobase index: a memory-mapped hash table of `yo_sure` words.
+
+The index file `yobase/yobase.idx` is generated from the Yobase text files and
+stores the SHA-256 of their contents, so it is rebuilt automatically whenever
+the word lists change. Lookups read the mapped file directly: nothing is parsed
+at startup and the pages stay shared with the OS file cache.
+
+File layout (little-endian):
+    magic (8 bytes) | sources SHA-256 (32 bytes) | record count, slot count,
+    meta length, records length (4 x uint32) | slots (uint32 each, record number + 1,
+    0 = empty) | record offsets (uint32 each) | meta (UTF-8 JSON) | records.
+Record: key length (uint8) | key (UTF-8, <е> form) | <Ё> count (uint8) | <Ё> positions (uint8 each).
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+YOBASE_DIR = os.path.join(SCRIPT_DIR, 'yobase')
+INDEX_PATH = os.path.join(YOBASE_DIR, 'yobase.idx')
+
+# Source files in the order they are hashed
+SOURCE_FILES = (
+    'yo_sure.txt',
+    'yo_unsure.txt',
+    'yo_sure_collocations.txt',
+    'yo_sure_compound.txt',
+    'ye_sure.txt',
+    'ye_sure_first_words.txt',
+)
+
+MAGIC = b'YOIDX\x00\x01\x00'
+_HEADER = struct.Struct('<8s32sIIII')
+
+
+def sources_hash(yobase_dir: str = YOBASE_DIR) -> bytes:
+    """
+    Hash the Yobase source files (names and contents).
+
+    str `yobase_dir` - directory with the Yobase text files;
+    return bytes - SHA-256 digest.
+    """
+
+    digest = hashlib.sha256()
+    for name in SOURCE_FILES:
+        digest.update(name.encode('utf-8') + b'\x00')
+        with open(os.path.join(yobase_dir, name), 'rb') as file:
+            digest.update(file.read())
+    return digest.digest()
+
+
+def _read_lines(path: str) -> list[str]:
+    with open(path, 'r', encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def build_index(yobase_dir: str = YOBASE_DIR, index_path: str = INDEX_PATH) -> None:
+    """
+    Compile the Yobase text files into the index file.
+
+    str `yobase_dir` - directory with the Yobase text files;
+    str `index_path` - where to write the index (replaced atomically).
+    """
+
+    records = bytearray()
+    offsets = []
+    keys = []
+    seen = set()
+
+    # The first word wins if two words share the <е> form (as in `recover_yo_sure`)
+    for word in _read_lines(os.path.join(yobase_dir, 'yo_sure.txt')):
+        word = word.lower()
+        key = word.replace('ё', 'е')
+        key_bytes = key.encode('utf-8')
+        if key in seen or len(key_bytes) > 255:
+            continue
+        seen.add(key)
+        positions = [i for i, char in enumerate(word) if char == 'ё']
+        offsets.append(len(records))
+        keys.append(key)
+        records += bytes((len(key_bytes),)) + key_bytes + bytes((len(positions),)) + bytes(positions)
+
+    slot_count = 1
+    while slot_count < len(keys) * 3 // 2:
+        slot_count *= 2
+    slots = [0] * slot_count
+    mask = slot_count - 1
+    for number, key in enumerate(keys, start=1):
+        slot = zlib.crc32(key.encode('utf-8')) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = number
+
+    meta = json.dumps({
+        'yo_unsure': _read_lines(os.path.join(yobase_dir, 'yo_unsure.txt')),
+        'yo_sure_collocations': _read_lines(os.path.join(yobase_dir, 'yo_sure_collocations.txt')),
+        'yo_sure_compound': _read_lines(os.path.join(yobase_dir, 'yo_sure_compound.txt')),
+        'ye_sure': _read_lines(os.path.join(yobase_dir, 'ye_sure.txt')),
+        'ye_sure_first_words': _read_lines(os.path.join(yobase_dir, 'ye_sure_first_words.txt')),
+    }, ensure_ascii=False).encode('utf-8')
+
+    header = _HEADER.pack(MAGIC, sources_hash(yobase_dir), len(keys), slot_count, len(meta), len(records))
+
+    temp_path = f'{index_path}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(header)
+        file.write(struct.pack(f'<{slot_count}I', *slots))
+        file.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        file.write(meta)
+        file.write(records)
+    os.replace(temp_path, index_path)
+
+
+class YobaseIndex:
+    """
+    Read-only view of the index file, mapped into memory.
+
+    `get` mirrors dict.get: <е> form (lower case) -> <Ё> form or None.
+    """
+
+    def __init__(self, index_path: str = INDEX_PATH):
+        self._view = self._slots = self._offsets = None
+        self._file = open(index_path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        magic, self.sources_hash, count, slot_count, meta_len, records_len = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f'Not a Yobase index: {index_path}')
+
+        self._view = memoryview(self._mm)
+        start = _HEADER.size
+        self._slots = self._view[start:start + slot_count * 4].cast('I')
+        start += slot_count * 4
+        self._offsets = self._view[start:start + count * 4].cast('I')
+        start += count * 4
+        self._meta_range = (start, start + meta_len)
+        self._records_start = start + meta_len
+        self._mask = slot_count - 1
+        self._meta = None
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def get(self, key: str, default=None):
+        """
+        Look up the <Ё> form of the word.
+
+        str `key` - lower case word with <е>;
+        return str - word with <Ё> restored, or `default` if the word is not in `yo_sure`.
+        """
+
+        key_bytes = key.encode('utf-8')
+        mm = self._mm
+        slot = zlib.crc32(key_bytes) & self._mask
+        while True:
+            number = self._slots[slot]
+            if not number:
+                return default
+            offset = self._records_start + self._offsets[number - 1]
+            key_end = offset + 1 + mm[offset]
+            if mm[offset + 1:key_end] == key_bytes:
+                chars = list(key)
+                for position in mm[key_end + 1:key_end + 1 + mm[key_end]]:
+                    chars[position] = 'ё'
+                return ''.join(chars)
+            slot = (slot + 1) & self._mask
+
+    def meta(self) -> dict:
+        """
+        Small word lists stored with the index (collocations, compounds, <Е> escapes, `yo_unsure`).
+
+        return dict - list name -> list of str.
+        """
+
+        if self._meta is None:
+            start, end = self._meta_range
+            self._meta = json.loads(self._mm[start:end].decode('utf-8'))
+        return self._meta
+
+    def close(self) -> None:
+        # The map cannot be closed while memoryviews into it are alive
+        for view in (self._slots, self._offsets, self._view):
+            if view is not None:
+                view.release()
+        self._view = self._slots = self._offsets = None
+        self._mm.close()
+        self._file.close()
+
+
+def load_index(index_path: str = INDEX_PATH, yobase_dir: str = YOBASE_DIR):
+    """
+    Map the index, rebuilding it first if it is missing or older than the Yobase files.
+
+    str `index_path` - index file path;
+    str `yobase_dir` - directory with the Yobase text files;
+    return YobaseIndex or None - None if the index cannot be built or mapped
+    (e.g. read-only install without a prebuilt index, big-endian platform).
+    """
+
+    if sys.byteorder != 'little':
+        return None
+
+    try:
+        expected = sources_hash(yobase_dir) if os.path.isdir(yobase_dir) else None
+    except OSError:
+        expected = None
+
+    index = None
+    try:
+        index = YobaseIndex(index_path)
+        if expected is None or index.sources_hash == expected:
+            return index
+        index.close()
+    except (OSError, ValueError, struct.error):
+        if index is not None:
+            index.close()
+
+    if expected is None:
+        return None
+
+    try:
+        build_index(yobase_dir, index_path)
+        return YobaseIndex(index_path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+if __name__ == '__main__':
+    build_index()
+    print(f'Yobase index written: {INDEX_PATH}')
@@ -2,10 +2,14 @@ import os
 import re
 from tqdm import tqdm
 
+import yobase_index
+
 """
-Uploading two lists of Russian words:
+Two lists of Russian words (loaded lazily on first access):
 list `yo_sure` - words where <Ё> letter is 100% certain;
 list `yo_unsure` - words with uncertianty about <Ё> letters.
+The indexed functions use the compiled index `yobase/yobase.idx` (see `yobase_index`)
+and do not parse the text files at all.
 """
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -24,10 +28,43 @@ assert os.path.isfile(YO_UNSURE_PATH), \
     f'\nFile with words not always spelled with the <Ё> letter not found!' + \
     f'\nФайл со словами, которые не всегда пишутся с буквой <Ё>, не найден!\n\033[1m{YO_UNSURE_PATH}\033[0m'
 
-with open(YO_SURE_PATH, 'r', encoding='UTF-8') as file:
-    yo_sure = file.read().split()
-with open(YO_UNSURE_PATH, 'r', encoding='UTF-8') as file:
-    yo_unsure = file.read().split()
+_word_lists = {}
+_compiled_index = False
+
+
+def _get_compiled_index():
+    """Map the compiled Yobase index once (None if it is unavailable)."""
+
+    global _compiled_index
+
+    if _compiled_index is False:
+        _compiled_index = yobase_index.load_index()
+    return _compiled_index
+
+
+def _get_word_list(name: str) -> list[str]:
+    """
+    Load a Yobase word list once: from the compiled index if possible, else from its text file.
+
+    str `name` - list name, e.g. "yo_sure_collocations" for `yobase/yo_sure_collocations.txt`;
+    return list of str - words (or collocations) of the list.
+    """
+
+    if name not in _word_lists:
+        index = _get_compiled_index()
+        if index is not None and name in index.meta():
+            _word_lists[name] = index.meta()[name]
+        else:
+            with open(os.path.join(SCRIPT_DIR, f'yobase/{name}.txt'), 'r', encoding='utf-8') as file:
+                _word_lists[name] = [line.strip() for line in file if line.strip()]
+    return _word_lists[name]
+
+
+def __getattr__(name: str):
+    # Backward compatible module attributes `yo_sure` and `yo_unsure`
+    if name in ('yo_sure', 'yo_unsure'):
+        return _get_word_list(name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def replace_by_regex(text: str, regex: str, old: str, new: str) -> str:
@@ -84,11 +121,7 @@ def recover_yo_sure_compound_adjective(text: str) -> str:
     return str - text with the <Ё> letters recovered in the first parts of the compound adjectives.
     """
 
-    path = os.path.join(SCRIPT_DIR, 'yobase/yo_sure_compound.txt')
-    with open(path, 'r', encoding='utf-8') as file:
-        yo_sure_compound = [line.strip() for line in file.readlines()]
-    
-    for word in yo_sure_compound:
+    for word in _get_word_list('yo_sure_compound'):
         for word in (word.lower(), word.upper(), word.capitalize()):
             word_with_ye = word.replace('ё', 'е').replace('Ё', 'Е')
             regex = rf'\b{word_with_ye}-\w+[{AFTER_WORD}]'
@@ -108,10 +141,7 @@ def escape_ye_sure_first_words(text: str) -> str:
     return str - text with the <Е> letters escaped.
     """
     
-    with open(YE_SURE_FIRST_WORDS_PATH, 'r', encoding='utf-8') as file:
-        ye_sure_first_words = [line.strip() for line in file.readlines()]
-
-    for word in ye_sure_first_words:
+    for word in _get_word_list('ye_sure_first_words'):
         for word_with_escape in (word.lower(), word.upper(), word.capitalize()):
             word_wo_escape = word_with_escape.replace('<', '').replace('>', '')
             regex = rf'[{SENTENCE_ENDS}]\s{word_wo_escape}[{AFTER_WORD}]'
@@ -133,10 +163,7 @@ def escape_ye_sure(text: str) -> str:
     
     text = escape_ye_sure_first_words(text)
 
-    with open(YE_SURE_PATH, 'r', encoding='utf-8') as file:
-        ye_sure = [line.strip() for line in file.readlines()]
-    
-    for word in ye_sure:
+    for word in _get_word_list('ye_sure'):
         for word_with_escape in (word.lower(), word.upper(), word.capitalize()):
             word_wo_escape = word_with_escape.replace('<', '').replace('>', '')
             regex = rf'\s{word_wo_escape}[{AFTER_WORD}]'
@@ -167,10 +194,8 @@ def recover_yo_sure(text: str) -> str:
     
     text = recover_yo_sure_compound_adjective(text)
 
-    yo_sure_words = yobase_text_intersection(yo_sure, text)
-
-    with open(YO_SURE_COLLOCATIONS_PATH, 'r', encoding='utf-8') as file:
-        yo_sure_words += [line.strip() for line in file.readlines()]
+    yo_sure_words = yobase_text_intersection(_get_word_list('yo_sure'), text)
+    yo_sure_words += _get_word_list('yo_sure_collocations')
 
     for word in tqdm(yo_sure_words):
         for w_yo in (word.lower(), word.upper(), word.capitalize()):
@@ -180,6 +205,100 @@ def recover_yo_sure(text: str) -> str:
     return text
 
 
+_yo_sure_index = None
+
+
+def get_yo_sure_index() -> dict:
+    """
+    Build (once) the lookup maps for the indexed <Ё> recovery.
+
+    return dict - maps "words", "collocations" and "compound": lower case form with <е> -> form with <Ё>.
+    """
+
+    global _yo_sure_index
+
+    if _yo_sure_index is None:
+        def to_map(words: list[str]) -> dict[str, str]:
+            index = {}
+            for word in words:
+                index.setdefault(word.lower().replace('ё', 'е'), word.lower())
+            return index
+
+        # The 58k words are looked up in the memory-mapped index instead of a dict
+        words = _get_compiled_index()
+        _yo_sure_index = {
+            'words': words if words is not None else to_map(_get_word_list('yo_sure')),
+            'collocations': to_map(_get_word_list('yo_sure_collocations')),
+            'compound': to_map(_get_word_list('yo_sure_compound')),
+        }
+
+    return _yo_sure_index
+
+
+def _restore_case(word: str, index: dict[str, str]) -> str:
+    """
+    Look up the word case-insensitively and return the <Ё> form in the word's case.
+
+    Only lower case, upper case and capitalized words are recovered (as in `recover_yo_sure`).
+    """
+
+    lower = word.lower()
+    word_yo = index.get(lower)
+    if word_yo is None:
+        return word
+    if word == lower:
+        return word_yo
+    if word == word.upper():
+        return word_yo.upper()
+    if word == lower.capitalize():
+        return word_yo.capitalize()
+    return word
+
+
+_after_word = re.escape(AFTER_WORD)
+# Word after text start or whitespace, followed by punctuation or space (same context as `recover_yo_sure`)
+_YE_WORD_REGEX = re.compile(rf'(?:^|(?<=\s))\w*[еЕ]\w*(?=[{_after_word}])')
+_yo_sure_patterns = None
+
+
+def _get_yo_sure_patterns() -> tuple:
+    """Compile (once) the single-pass regexes for compound adjectives and collocations."""
+
+    global _yo_sure_patterns
+
+    if _yo_sure_patterns is None:
+        index = get_yo_sure_index()
+        compound = '|'.join(re.escape(word) for word in sorted(index['compound'], key=len, reverse=True))
+        collocations = '|'.join(re.escape(word) for word in sorted(index['collocations'], key=len, reverse=True))
+        _yo_sure_patterns = (
+            re.compile(rf'\b(?:{compound})(?=-\w+[{_after_word}])', re.IGNORECASE),
+            re.compile(rf'(?:^|(?<=\s))(?:{collocations})(?=[{_after_word}])', re.IGNORECASE),
+        )
+
+    return _yo_sure_patterns
+
+
+def recover_yo_sure_indexed(text: str) -> str:
+    """
+    Recover all certain <Ё> in the text in a single pass over the words.
+
+    Same result as `recover_yo_sure`, but words are looked up in a hash index
+    built once instead of scanning the whole Yobase and the text for every word.
+
+    str `text` - text where to find and recover certain <Ё> letters;
+    return - str: text with certain <Ё> letters recovered.
+    """
+
+    index = get_yo_sure_index()
+    compound_regex, collocations_regex = _get_yo_sure_patterns()
+
+    text = compound_regex.sub(lambda hit: _restore_case(hit.group(0), index['compound']), text)
+    text = _YE_WORD_REGEX.sub(lambda hit: _restore_case(hit.group(0), index['words']), text)
+    text = collocations_regex.sub(lambda hit: _restore_case(hit.group(0), index['collocations']), text)
+
+    return text
+
+
 def recover_yo_unsure(text: str, print_width: int=100, yes_reply: str='ё') -> str:
     """
     Recover all uncertain <Ё> in the text in the interaction mode.
@@ -190,7 +309,7 @@ def recover_yo_unsure(text: str, print_width: int=100, yes_reply: str='ё') -> s
     return - str: text with uncertain <Ё> letters recovered.
     """
 
-    yo_unsure_words = yobase_text_intersection(yo_unsure, text)
+    yo_unsure_words = yobase_text_intersection(_get_word_list('yo_unsure'), text)
     
     text = escape_ye_sure(text)
 